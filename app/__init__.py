@@ -1,32 +1,83 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_apscheduler import APScheduler
 from config import config
+from app.utils.cert_cache import cert_cache
+from app.utils.executor import BackgroundExecutor
+from app.utils.rate_limit import whois_rate_limiter
 
 db = SQLAlchemy()
-migrate = Migrate()
 scheduler = APScheduler()
+executor = BackgroundExecutor()
 
-def create_app(config_name='default', init_scheduler=True):
+def create_app(config_name='default', init_scheduler=False, web=True):
+    """
+    创建应用
+    :param init_scheduler: 是否作为工作进程运行（定时任务、任务队列、集群），
+                           Web进程保持默认值False，只由 worker.py 启动调度
+    :param web: 是否加载Web部分（蓝图、视图依赖的服务、数据库迁移命令），
+                工作进程和命令行工具传入False以加快启动
+    """
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
     # 初始化扩展
     db.init_app(app)
-    migrate.init_app(app, db)
+    executor.init_app(app)
+    cert_cache.init_app(app)
+    whois_rate_limiter.init_app(app)
     
-    # 只在主线程中初始化调度器
+    # 导入全部模型，保证不加载蓝图时模型间的关系也能完整映射
+    import_models()
+    
+    # 只在工作进程中初始化调度器
     if init_scheduler:
         scheduler.init_app(app)
     
-    # 注册蓝图
+    if web:
+        # flask db 迁移命令（alembic 导入较慢，只在Web应用中加载）
+        from flask_migrate import Migrate
+        Migrate(app, db)
+        register_blueprints(app)
+    
+    # 统计数据库写入耗时
+    from app.utils.metrics import instrument_database
+    with app.app_context():
+        instrument_database(db.engine)
+    
+    # 只在工作进程中注册定时任务
+    if init_scheduler:
+        # 集群模式：加入集群后按一致性哈希分担定时检查
+        if app.config['CLUSTER_ENABLED']:
+            from app.services.cluster import cluster
+            cluster.start(app)
+        
+        register_scheduled_jobs(app)
+        
+        # 预先加载WHOIS服务器缓存（内置快照与数据库中的查询结果）
+        from app.services.whois_referrals import whois_referrals
+        with app.app_context():
+            whois_referrals.warm()
+        
+        # 启动持久化任务队列的工作线程
+        from app.services.task_queue import task_worker
+        task_worker.start(app)
+    
+    return app
+
+def import_models():
+    """导入全部模型"""
+    from app.models import domain, url, certificate, notification, proxy, check_task, cluster
+
+def register_blueprints(app):
+    """注册蓝图"""
     from app.views.dashboard import dashboard_bp
     from app.views.domains import domains_bp
     from app.views.urls import urls_bp
     from app.views.notifications import notifications_bp
     from app.views.proxies import proxies_bp
     from app.views.api import api_bp
+    from app.views.metrics import metrics_bp
     
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(domains_bp)
@@ -34,29 +85,37 @@ def create_app(config_name='default', init_scheduler=True):
     app.register_blueprint(notifications_bp)
     app.register_blueprint(proxies_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
-    
-    # 只在主线程中注册定时任务
-    if init_scheduler:
-        register_scheduled_jobs(app)
-    
-    return app
+    app.register_blueprint(metrics_bp)
 
 def register_scheduled_jobs(app):
     """注册定时任务"""
-    from app.services.ssl_checker import check_all_certificates
-    from app.services.whois_checker import check_all_whois
+    from importlib import import_module
     
-    # 创建带应用上下文的URL检查函数
-    def check_urls_with_context():
-        with app.app_context():
-            from app.services.url_checker import check_urls_by_interval
-            check_urls_by_interval()
+    # 调度器线程中没有应用上下文，所有定时任务都在同一应用的上下文中执行；
+    # 任务以 '模块:函数' 指定，第一次执行时才导入对应的检查模块
+    def with_app_context(target):
+        module_name, func_name = target.split(':')
+        
+        def wrapper():
+            func = import_module(module_name)
+            for name in func_name.split('.'):
+                func = getattr(func, name)
+            with app.app_context():
+                try:
+                    return func()
+                finally:
+                    db.session.remove()
+        wrapper.__name__ = func_name.replace('.', '_')
+        return wrapper
+    
+    # 记录定时任务的调度延迟与执行结果
+    register_scheduler_metrics()
     
     with app.app_context():
         # 每天凌晨2点检查所有证书
         scheduler.add_job(
             id='check_certificates',
-            func=check_all_certificates,
+            func=with_app_context('app.services.ssl_checker:check_all_certificates'),
             trigger='cron',
             hour=2,
             minute=0,
@@ -66,22 +125,71 @@ def register_scheduled_jobs(app):
         # 每天凌晨3点检查所有WHOIS
         scheduler.add_job(
             id='check_whois',
-            func=check_all_whois,
+            func=with_app_context('app.services.whois_checker:check_all_whois'),
             trigger='cron',
             hour=3,
             minute=0,
             replace_existing=True
         )
         
+        # 每天清理不再被证书记录引用的证书/私钥文件
+        scheduler.add_job(
+            id='collect_certificate_files',
+            func=with_app_context('app.services.cert_store:CertificateStore.collect_garbage'),
+            trigger='cron',
+            hour=app.config['CERT_STORE_GC_HOUR'],
+            minute=0,
+            replace_existing=True
+        )
+        
         # 每分钟检查需要检查的URL（根据每个URL的check_interval设置）
         scheduler.add_job(
             id='check_urls',
-            func=check_urls_with_context,
+            func=with_app_context('app.services.url_checker:check_urls_by_interval'),
             trigger='interval',
             minutes=1,
             replace_existing=True
         )
+        
+        # 集群模式下定期续约并刷新成员
+        if app.config['CLUSTER_ENABLED']:
+            scheduler.add_job(
+                id='cluster_heartbeat',
+                func=with_app_context('app.services.cluster:cluster.heartbeat'),
+                trigger='interval',
+                seconds=app.config['CLUSTER_HEARTBEAT_SECONDS'],
+                replace_existing=True
+            )
+            
+            # 定期补查无人领取或领取者已退出的目标
+            scheduler.add_job(
+                id='cluster_sweep',
+                func=with_app_context('app.services.cluster:cluster.sweep'),
+                trigger='interval',
+                seconds=app.config['CLUSTER_SWEEP_SECONDS'],
+                replace_existing=True
+            )
     
     # 只在主线程中启动调度器
     if not scheduler.running:
         scheduler.start()
+
+def register_scheduler_metrics():
+    """监听调度器事件，统计调度延迟与任务执行结果"""
+    from datetime import datetime
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+    from app.utils.metrics import SCHEDULER_LAG, SCHEDULER_JOBS_TOTAL
+    
+    def on_job_event(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            for run_time in event.scheduled_run_times:
+                lag = (datetime.now(run_time.tzinfo) - run_time).total_seconds()
+                SCHEDULER_LAG.observe(max(lag, 0), job_id=event.job_id)
+        elif event.code == EVENT_JOB_EXECUTED:
+            SCHEDULER_JOBS_TOTAL.inc(job_id=event.job_id, result='success')
+        elif event.code == EVENT_JOB_ERROR:
+            SCHEDULER_JOBS_TOTAL.inc(job_id=event.job_id, result='error')
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_JOBS_TOTAL.inc(job_id=event.job_id, result='missed')
+    
+    scheduler.add_listener(on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
@@ -1,6 +1,11 @@
 from app import db
 from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session
+from app.utils.expiry import DaysUntil, days_until
+from app.utils.hostnames import hostname_keys, match_keys, normalize_hostname, parent_domain
 
 class Certificate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,8 +14,7 @@ class Certificate(db.Model):
     subject = db.Column(db.String(255))
     serial_number = db.Column(db.String(255))
     not_before = db.Column(db.DateTime)
-    not_after = db.Column(db.DateTime)
-    days_until_expiry = db.Column(db.Integer)
+    not_after = db.Column(db.DateTime, index=True)  # 到期时间（UTC），剩余天数由 days_until_expiry 在读取时计算
     is_valid = db.Column(db.Boolean, default=True)
     last_checked = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -20,15 +24,34 @@ class Certificate(db.Model):
     key_file_path = db.Column(db.String(500))   # 私钥文件路径
     cert_file_name = db.Column(db.String(255))  # 证书文件名
     key_file_name = db.Column(db.String(255))   # 私钥文件名
+    cert_sha256 = db.Column(db.String(64), index=True)  # 证书文件内容的SHA-256，对应内容寻址存储中的文件
+    key_sha256 = db.Column(db.String(64), index=True)   # 私钥文件内容的SHA-256
     
     # 证书域名信息
     cert_domains = db.Column(db.Text)  # 证书中包含的域名列表，JSON格式存储
     common_name = db.Column(db.String(255))  # 证书的通用名称
     san_domains = db.Column(db.Text)  # 主题备用名称(SAN)域名列表，JSON格式存储
     
+    # 在线检查取得的证书详情
+    fingerprint_sha256 = db.Column(db.String(64), index=True)  # 证书DER编码的SHA-256指纹
+    key_type = db.Column(db.String(50))  # 公钥类型，例如 RSA 2048、EC secp256r1
+    signature_algorithm = db.Column(db.String(100))  # 签名算法
+    chain = db.Column(db.Text)  # 服务器返回的证书链，JSON格式存储
+    verify_error = db.Column(db.String(500))  # 校验失败原因，通过校验时为空
+    ip_drift = db.Column(db.Boolean, default=False)  # 多IP模式下各IP返回的证书不一致
+    
     def __repr__(self):
         return f'<Certificate {self.subject}>'
     
+    @hybrid_property
+    def days_until_expiry(self):
+        """剩余天数（按当前时间计算，已过期为负数）"""
+        return days_until(self.not_after)
+    
+    @days_until_expiry.expression
+    def days_until_expiry(cls):
+        return DaysUntil(cls.not_after)
+    
     @property
     def is_expired(self):
         return datetime.utcnow() > self.not_after if self.not_after else True
@@ -39,9 +62,24 @@ class Certificate(db.Model):
             return datetime.utcnow() + timedelta(days=current_app.config['NOTIFICATION_DAYS_BEFORE']) > self.not_after
         return False
     
+    @property
+    def chain_list(self):
+        """获取证书链列表"""
+        import json
+        try:
+            return json.loads(self.chain) if self.chain else []
+        except (json.JSONDecodeError, TypeError):
+            return []
+    
     @property
     def domain_list(self):
-        """获取证书中的域名列表"""
+        """获取证书中的域名列表（读取证书域名索引，尚未建立索引的记录解析JSON字段）"""
+        if self.hostnames:
+            return [row.name for row in self.hostnames]
+        return self.parse_domain_list()
+    
+    def parse_domain_list(self):
+        """从通用名称、SAN与cert_domains字段解析证书中的域名列表"""
         import json
         domains = []
         
@@ -69,29 +107,132 @@ class Certificate(db.Model):
         
         return list(set(domains))  # 去重
     
+    def sync_hostnames(self):
+        """按证书域名字段增量更新证书域名索引（保留未变化的行，避免先删后插触发唯一约束）"""
+        keys = hostname_keys(self.parse_domain_list())
+        current = {(row.hostname, row.is_wildcard): row for row in self.hostnames}
+        for key, row in current.items():
+            if key not in keys:
+                self.hostnames.remove(row)
+        for hostname, is_wildcard in sorted(keys - set(current)):
+            self.hostnames.append(CertificateHostname(hostname=hostname, is_wildcard=is_wildcard))
+    
     @property
     def domain_match_status(self):
-        """检查证书域名是否与关联的域名匹配"""
-        if not self.domain_list:
-            return "unknown"
-        
+        """检查证书域名是否与关联的域名匹配：exact / wildcard / mismatch / unknown"""
         domain_obj = self.domain
         if not domain_obj:
             return "unknown"
+        domain_name = normalize_hostname(domain_obj.name)
         
-        # 检查域名是否在证书域名列表中
-        domain_name = domain_obj.name.lower()
-        cert_domains = [d.lower() for d in self.domain_list]
+        # 索引行未加载时直接按索引查询覆盖关联域名的行，不必加载证书的全部域名
+        state = inspect(self)
+        if state.persistent and 'hostnames' in state.unloaded:
+            matched = db.session.query(CertificateHostname.is_wildcard).filter(
+                CertificateHostname.certificate_id == self.id,
+                CertificateHostname.covers(domain_name)
+            ).order_by(CertificateHostname.is_wildcard).first()
+            if matched is not None:
+                return "wildcard" if matched.is_wildcard else "exact"
+            if self.hostnames:
+                return "mismatch"
         
-        # 精确匹配
-        if domain_name in cert_domains:
-            return "exact"
-        
-        # 通配符匹配
-        for cert_domain in cert_domains:
-            if cert_domain.startswith('*.'):
-                wildcard_domain = cert_domain[2:]  # 去掉 *.
-                if domain_name.endswith('.' + wildcard_domain):
-                    return "wildcard"
-        
-        return "mismatch"
+        keys = hostname_keys(self.domain_list)
+        if not keys:
+            return "unknown"
+        return match_keys(keys, domain_name) or "mismatch"
+
+class CertificateHostname(db.Model):
+    """证书域名索引：证书CN/SAN中的每个域名一行，用于按主机名反查覆盖它的证书"""
+    __tablename__ = 'certificate_hostname'
+    __table_args__ = (
+        db.UniqueConstraint('certificate_id', 'hostname', 'is_wildcard', name='uq_certificate_hostname'),
+        db.Index('ix_certificate_hostname_lookup', 'hostname', 'is_wildcard'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    certificate_id = db.Column(db.Integer, db.ForeignKey('certificate.id', ondelete='CASCADE'), nullable=False)
+    hostname = db.Column(db.String(255), nullable=False)  # 小写主机名，通配符域名去掉 *. 前缀
+    is_wildcard = db.Column(db.Boolean, nullable=False, default=False)
+    
+    certificate = db.relationship('Certificate', backref=db.backref('hostnames', lazy=True, cascade='all, delete-orphan',
+                                                                    order_by='CertificateHostname.hostname'))
+    
+    @property
+    def name(self):
+        """证书中的原始写法"""
+        return f'*.{self.hostname}' if self.is_wildcard else self.hostname
+    
+    @classmethod
+    def covers(cls, hostname):
+        """覆盖主机名的索引行条件：精确匹配，或上一级域名的通配符"""
+        hostname = normalize_hostname(hostname)
+        criteria = [db.and_(cls.hostname == hostname, cls.is_wildcard == False)]
+        parent = parent_domain(hostname)
+        if parent:
+            criteria.append(db.and_(cls.hostname == parent, cls.is_wildcard == True))
+        return db.or_(*criteria)
+    
+    def __repr__(self):
+        return f'<CertificateHostname {self.certificate_id} {self.name}>'
+
+_HOSTNAME_SOURCE_FIELDS = ('common_name', 'san_domains', 'cert_domains')
+
+@event.listens_for(Session, 'before_flush')
+def _sync_certificate_hostnames(session, flush_context, instances):
+    """证书新增或域名字段变化时在同一次flush中更新证书域名索引"""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Certificate) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if state.pending or any(state.attrs[field].history.has_changes() for field in _HOSTNAME_SOURCE_FIELDS):
+            obj.sync_hostnames()
+
+class CertificateEndpoint(db.Model):
+    """多IP扫描模式下域名每个IP返回的证书，用于发现负载均衡后证书不一致的节点"""
+    __tablename__ = 'certificate_endpoint'
+    __table_args__ = (
+        db.UniqueConstraint('domain_id', 'ip_address', name='uq_certificate_endpoint_ip'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    domain_id = db.Column(db.Integer, db.ForeignKey('domain.id', ondelete='CASCADE'), nullable=False, index=True)
+    ip_address = db.Column(db.String(45), nullable=False)  # IPv4或IPv6地址
+    fingerprint_sha256 = db.Column(db.String(64))
+    not_after = db.Column(db.DateTime)
+    is_valid = db.Column(db.Boolean, default=False)
+    error = db.Column(db.String(500))  # 握手失败或校验失败的原因
+    last_checked = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    domain = db.relationship('Domain', backref=db.backref('certificate_endpoints', lazy=True, cascade='all, delete-orphan',
+                                                           order_by='CertificateEndpoint.ip_address'))
+    
+    def __repr__(self):
+        return f'<CertificateEndpoint {self.domain_id} {self.ip_address}>'
+
+class CertificateChange(db.Model):
+    """证书变更记录：在线检查发现服务器返回的证书指纹变化时写入"""
+    __tablename__ = 'certificate_change'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    domain_id = db.Column(db.Integer, db.ForeignKey('domain.id', ondelete='CASCADE'), nullable=False, index=True)
+    certificate_id = db.Column(db.Integer, db.ForeignKey('certificate.id', ondelete='CASCADE'), nullable=False)
+    change_type = db.Column(db.String(20), nullable=False)  # rotated（更换证书）/ issuer_changed（更换颁发机构）
+    old_fingerprint = db.Column(db.String(64))
+    new_fingerprint = db.Column(db.String(64))
+    old_issuer = db.Column(db.String(255))
+    new_issuer = db.Column(db.String(255))
+    old_not_after = db.Column(db.DateTime)
+    new_not_after = db.Column(db.DateTime)
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    domain = db.relationship('Domain', backref=db.backref('certificate_changes', lazy=True, cascade='all, delete-orphan'))
+    certificate = db.relationship('Certificate')
+    
+    @property
+    def is_renewal(self):
+        """新证书的到期时间晚于旧证书"""
+        return bool(self.old_not_after and self.new_not_after and self.new_not_after > self.old_not_after)
+    
+    def __repr__(self):
+        return f'<CertificateChange {self.domain_id} {self.change_type}>'
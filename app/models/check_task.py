@@ -0,0 +1,55 @@
+from app import db
+from datetime import datetime
+
+class CheckTask(db.Model):
+    """持久化的检查任务，进程重启后未完成的任务会继续执行"""
+    __tablename__ = 'check_task'
+    __table_args__ = (
+        db.Index('ix_check_task_claim', 'status', 'next_run_at'),
+        db.Index('ix_check_task_target', 'check_type', 'target_id', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), nullable=False, index=True)  # 所属批量任务
+    check_type = db.Column(db.String(20), nullable=False)  # ssl/whois/access/url
+    target_id = db.Column(db.Integer, nullable=False)  # 域名ID或URL监控项ID
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/done/failed/skipped
+    # 未完成时为 检查类型:目标ID，完成后清空；唯一约束保证同一检查项在所有进程中只有一个未完成任务
+    active_key = db.Column(db.String(64), unique=True)
+    
+    # 重试配置
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已执行次数
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)  # 最多执行次数
+    next_run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 最早可执行时间（UTC）
+    
+    # 租约：执行中的任务由 lease_owner 持有，过期未续约的任务会被其他工作进程回收
+    lease_owner = db.Column(db.String(64))
+    lease_expires_at = db.Column(db.DateTime)
+    
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @staticmethod
+    def make_active_key(check_type, target_id):
+        return f"{check_type}:{target_id}"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed', 'skipped')
+    
+    def to_dict(self):
+        return {
+            'check_type': self.check_type,
+            'target_id': self.target_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.last_error,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<CheckTask {self.check_type}:{self.target_id} {self.status}>'
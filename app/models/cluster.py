@@ -0,0 +1,40 @@
+from app import db
+from datetime import datetime
+
+class WorkerNode(db.Model):
+    """集群中的工作进程，通过租约判断是否存活"""
+    __tablename__ = 'worker_node'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.String(64), nullable=False, unique=True)  # 主机名:进程号:随机后缀
+    hostname = db.Column(db.String(255))
+    pid = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+    lease_expires_at = db.Column(db.DateTime, nullable=False, index=True)  # 超过该时间未续约视为已退出（UTC）
+    
+    def __repr__(self):
+        return f'<WorkerNode {self.worker_id}>'
+
+class CheckClaim(db.Model):
+    """
+    定时检查的周期领取记录
+    同一检查在同一周期内只能被一个工作进程领取，保证集群内每个周期只执行一次；
+    领取带租约，检查完成后记录完成时间，租约过期或领取者已退出集群的未完成记录可被其他进程接管
+    """
+    __tablename__ = 'check_claim'
+    __table_args__ = (
+        db.UniqueConstraint('check_type', 'target_id', 'slot', name='uq_check_claim_slot'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    check_type = db.Column(db.String(20), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    slot = db.Column(db.BigInteger, nullable=False)  # 周期序号：时间戳 // 检查间隔
+    worker_id = db.Column(db.String(64), nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    lease_expires_at = db.Column(db.DateTime)  # 领取租约到期时间（UTC），到期仍未完成可被接管
+    completed_at = db.Column(db.DateTime)  # 检查完成时间（UTC），为空表示尚未完成
+    
+    def __repr__(self):
+        return f'<CheckClaim {self.check_type}:{self.target_id}@{self.slot}>'
@@ -1,5 +1,7 @@
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.ext.hybrid import hybrid_property
 
 class Domain(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -21,7 +23,7 @@ class Domain(db.Model):
     website_url = db.relationship('URL', backref='domain', foreign_keys=[website_url_id])  # 关联的官网URL监控项
     notification_config = db.relationship('NotificationConfig', backref='domains')
     
-    @property
+    @hybrid_property
     def status(self):
         """根据WHOIS信息确定域名状态"""
         if not self.whois_records:
@@ -41,6 +43,33 @@ class Domain(db.Model):
         else:
             return "unknown"  # 无法获取到期时间，状态未知
     
+    @status.expression
+    def status(cls):
+        """域名状态的SQL表达式，与Python属性保持相同的判定规则，便于在数据库中过滤、排序和统计"""
+        from app.models.notification import WhoisRecord
+        
+        # 与 whois_records[0] 对应：取该域名最早的一条WHOIS记录
+        first_record_id = db.select(db.func.min(WhoisRecord.id)).where(
+            WhoisRecord.domain_id == cls.id
+        ).correlate(cls).scalar_subquery()
+        is_valid = db.select(WhoisRecord.is_valid).where(
+            WhoisRecord.id == first_record_id
+        ).scalar_subquery()
+        expiration_date = db.select(WhoisRecord.expiration_date).where(
+            WhoisRecord.id == first_record_id
+        ).scalar_subquery()
+        
+        now = datetime.utcnow()
+        days_before = current_app.config['NOTIFICATION_DAYS_BEFORE']
+        
+        return db.case(
+            (db.or_(is_valid.is_(None), is_valid == False, expiration_date.is_(None)), "unknown"),
+            (expiration_date < now, "expired"),
+            # 剩余天数（向下取整）<= days_before 等价于 到期时间 < now + (days_before + 1) 天
+            (expiration_date < now + timedelta(days=days_before + 1), "expiring_soon"),
+            else_="active"
+        )
+    
     @property
     def status_display(self):
         """状态显示文本"""
@@ -1,17 +1,20 @@
 from app import db
 from datetime import datetime
+from flask import current_app
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.utils.timezone import get_current_beijing_time
+from app.utils.expiry import DaysUntil, days_until
 
 class URLCheck(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    url_id = db.Column(db.Integer, db.ForeignKey('url.id'), nullable=False)
+    url_id = db.Column(db.Integer, db.ForeignKey('url.id'), nullable=False, index=True)
     
     # 基本检查结果
     status_code = db.Column(db.Integer)
     response_time = db.Column(db.Float)
     is_available = db.Column(db.Boolean, default=True)
     error_message = db.Column(db.Text)
-    checked_at = db.Column(db.DateTime, default=get_current_beijing_time)
+    checked_at = db.Column(db.DateTime, default=get_current_beijing_time, index=True)
     
     # 详细检查结果
     response_size = db.Column(db.Integer)  # 响应大小（字节）
@@ -50,14 +53,13 @@ class DomainAccessCheck(db.Model):
 
 class WhoisRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    domain_id = db.Column(db.Integer, db.ForeignKey('domain.id'), nullable=False)
+    domain_id = db.Column(db.Integer, db.ForeignKey('domain.id'), nullable=False, index=True)
     registrar = db.Column(db.String(255))
     creation_date = db.Column(db.DateTime)
-    expiration_date = db.Column(db.DateTime)
+    expiration_date = db.Column(db.DateTime, index=True)  # 到期时间（UTC），剩余天数由 days_until_expiry 在读取时计算
     updated_date = db.Column(db.DateTime)
     status = db.Column(db.String(255))
     name_servers = db.Column(db.Text)
-    days_until_expiry = db.Column(db.Integer)
     last_checked = db.Column(db.DateTime, default=get_current_beijing_time)
     
     # 新增字段
@@ -66,6 +68,15 @@ class WhoisRecord(db.Model):
     is_valid = db.Column(db.Boolean, default=True)  # 查询是否成功
     raw_data = db.Column(db.Text)  # 原始WHOIS数据
     
+    @hybrid_property
+    def days_until_expiry(self):
+        """剩余天数（按当前时间计算，已过期为负数）"""
+        return days_until(self.expiration_date)
+    
+    @days_until_expiry.expression
+    def days_until_expiry(cls):
+        return DaysUntil(cls.expiration_date)
+    
     @property
     def is_expired(self):
         return datetime.utcnow() > self.expiration_date if self.expiration_date else True
@@ -74,12 +85,25 @@ class WhoisRecord(db.Model):
     def is_expiring_soon(self):
         if not self.expiration_date:
             return True
-        days_left = (self.expiration_date - datetime.utcnow()).days
-        return days_left <= 30
+        return self.days_until_expiry <= current_app.config['NOTIFICATION_DAYS_BEFORE']
+
+class WhoisReferral(db.Model):
+    """域名后缀的WHOIS服务器（IANA referral）缓存，server 为空表示IANA没有返回服务器（否定缓存）"""
+    __tablename__ = 'whois_referral'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    suffix = db.Column(db.String(63), nullable=False, unique=True)  # 域名后缀，不含开头的点，例如 com、co.uk
+    server = db.Column(db.String(255))
+    source = db.Column(db.String(20), default='iana')  # iana（在线查询）/ snapshot（随程序发布的快照）
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)  # 过期后继续使用，同时在后台刷新
+    
+    def __repr__(self):
+        return f'<WhoisReferral {self.suffix} {self.server}>'
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String(50))  # 'cert_expiry', 'url_down', 'whois_expiry', 'domain_inaccessible'
+    type = db.Column(db.String(50))  # 'cert_expiry', 'cert_changed', 'cert_drift', 'url_down', 'whois_expiry', 'domain_inaccessible'
     domain_id = db.Column(db.Integer, db.ForeignKey('domain.id'), nullable=True)
     url_id = db.Column(db.Integer, db.ForeignKey('url.id'), nullable=True)
     message = db.Column(db.Text)
@@ -0,0 +1,268 @@
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models.domain import Domain
+from app.models.certificate import Certificate
+from app.services.cert_parser import CertParser
+from app.services.cert_store import CertificateStore
+from app.utils.expiry import to_utc
+
+class CertBundleError(ValueError):
+    """证书包无法读取（格式错误或超过大小限制）"""
+
+class CertBundleImporter:
+    """
+    证书包批量导入
+    接受zip压缩包或包含多个证书/私钥的PEM文件：在进程池中解析各PEM块，
+    按公钥配对证书与私钥，按证书域名（含通配符）匹配已有域名，在一个事务中写入证书记录；
+    证书与私钥文件按内容保存，多个域名共用的证书只写入一次
+    """
+    
+    # PEM块少于该数量时直接在当前进程中解析：spawn 方式的子进程需重新导入应用模块，进程池启动约需数秒
+    PARALLEL_MIN_BLOCKS = 512
+    
+    # 证书链最多追溯的层数
+    MAX_CHAIN_DEPTH = 8
+    
+    @staticmethod
+    def read_bundle(filename, data):
+        """
+        读取上传的证书包
+        :return: [(来源文件名, 文件内容bytes)]，非zip文件按单个PEM文件处理
+        """
+        max_bytes = current_app.config['CERT_BUNDLE_MAX_BYTES']
+        if len(data) > max_bytes:
+            raise CertBundleError(f'证书包超过大小限制（{max_bytes // 1024 // 1024}MB）')
+        if not zipfile.is_zipfile(io.BytesIO(data)):
+            return [(filename, data)]
+        
+        files = []
+        total = 0
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                members = [info for info in archive.infolist()
+                           if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                           and not os.path.basename(info.filename).startswith('.')]
+                if len(members) > current_app.config['CERT_BUNDLE_MAX_FILES']:
+                    raise CertBundleError(f"压缩包中的文件数超过限制（{current_app.config['CERT_BUNDLE_MAX_FILES']}）")
+                
+                for info in members:
+                    # 按实际解压的字节数限制总大小，不信任压缩包中记录的文件大小
+                    with archive.open(info) as member:
+                        content = member.read(max_bytes - total + 1)
+                    total += len(content)
+                    if total > max_bytes:
+                        raise CertBundleError(f'解压后的内容超过大小限制（{max_bytes // 1024 // 1024}MB）')
+                    files.append((info.filename, content))
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, RuntimeError) as e:
+            # 加密的压缩包在读取时抛出 RuntimeError
+            raise CertBundleError(f'压缩包无法读取: {str(e)}')
+        return files
+    
+    @staticmethod
+    def parse_files(files):
+        """
+        拆分并解析所有PEM块，数量较多时在进程池中并行解析
+        :return: CertParser.parse_pem_block 的结果列表，每项附带来源文件名 source
+        """
+        blocks = [(source, block) for source, data in files for block in CertParser.split_pem_blocks(data)]
+        workers = current_app.config['CERT_BUNDLE_WORKERS']
+        
+        if workers > 1 and len(blocks) >= CertBundleImporter.PARALLEL_MIN_BLOCKS:
+            chunksize = max(len(blocks) // (workers * 4), 1)
+            # 使用 spawn 启动子进程：Web进程是多线程的，fork 会复制其他线程持有的锁，子进程可能死锁
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                parsed = list(pool.map(CertParser.parse_pem_block, [block for _, block in blocks], chunksize=chunksize))
+        else:
+            parsed = [CertParser.parse_pem_block(block) for _, block in blocks]
+        
+        for (source, _), item in zip(blocks, parsed):
+            item['source'] = source
+        return parsed
+    
+    @staticmethod
+    def _domain_index():
+        """
+        已有域名的匹配索引
+        :return: (域名 -> 域名ID, 上级域名 -> [域名ID])，后者用于通配符匹配（只匹配一级子域名）
+        """
+        exact = {}
+        parents = {}
+        for domain_id, name in db.session.query(Domain.id, Domain.name):
+            name = name.lower().rstrip('.')
+            exact[name] = domain_id
+            if '.' in name:
+                parents.setdefault(name.split('.', 1)[1], []).append(domain_id)
+        return exact, parents
+    
+    @staticmethod
+    def _match_domains(cert_domains, exact, parents):
+        """
+        证书域名匹配到的域名
+        :return: {域名ID: 是否精确匹配}
+        """
+        matched = {}
+        for cert_domain in cert_domains:
+            cert_domain = cert_domain.lower().rstrip('.')
+            if cert_domain.startswith('*.'):
+                for domain_id in parents.get(cert_domain[2:], []):
+                    matched.setdefault(domain_id, False)
+            elif cert_domain in exact:
+                matched[exact[cert_domain]] = True
+        return matched
+    
+    @staticmethod
+    def _build_chain(leaf, issuers):
+        """按颁发者名称在包内的CA证书中追溯证书链（不含叶子证书）"""
+        chain = []
+        current = leaf
+        seen = {leaf['fingerprint_sha256']}
+        while len(chain) < CertBundleImporter.MAX_CHAIN_DEPTH:
+            parent = issuers.get(current['issuer'])
+            if parent is None or parent['fingerprint_sha256'] in seen:
+                break
+            chain.append(parent)
+            seen.add(parent['fingerprint_sha256'])
+            current = parent
+        return chain
+    
+    @staticmethod
+    def import_bundle(files):
+        """
+        导入证书包
+        :param files: read_bundle 的返回值
+        :return: 导入结果统计
+        """
+        parsed = CertBundleImporter.parse_files(files)
+        
+        errors = [(item['source'], item['error']) for item in parsed if item.get('error')]
+        certificates = [item for item in parsed if item['kind'] == 'certificate' and not item.get('error')]
+        keys = {item['public_key_id']: item for item in parsed if item['kind'] == 'key' and not item.get('error')}
+        
+        # CA证书只用于构建证书链；同一主题保留到期最晚的一张
+        issuers = {}
+        for item in certificates:
+            if item['is_ca'] and (item['subject'] not in issuers
+                                  or item['not_after'] > issuers[item['subject']]['not_after']):
+                issuers[item['subject']] = item
+        leaves = {}
+        for item in certificates:
+            if not item['is_ca']:
+                leaves.setdefault(item['fingerprint_sha256'], item)
+        
+        result = {
+            'files': len(files),
+            'certificates': len(leaves),
+            'ca_certificates': len(certificates) - sum(1 for item in certificates if not item['is_ca']),
+            'keys': len(keys),
+            'paired': sum(1 for leaf in leaves.values() if leaf['public_key_id'] in keys),
+            'matched_domains': 0,
+            'unmatched': [],
+            'errors': errors
+        }
+        
+        # 每个域名选择一张证书：精确匹配优先于通配符，其次选到期最晚的证书
+        exact, parents = CertBundleImporter._domain_index()
+        selected = {}
+        for leaf in leaves.values():
+            cert_domains = json.loads(leaf['cert_domains']) if leaf.get('cert_domains') else []
+            matched = CertBundleImporter._match_domains(cert_domains, exact, parents)
+            if not matched:
+                result['unmatched'].append(leaf['common_name'] or leaf['subject'])
+                continue
+            for domain_id, is_exact in matched.items():
+                rank = (is_exact, leaf['not_after'])
+                if domain_id not in selected or rank > selected[domain_id][0]:
+                    selected[domain_id] = (rank, leaf)
+        if not selected:
+            return result
+        
+        domain_ids = list(selected)
+        batch_size = current_app.config['IMPORT_BATCH_SIZE']
+        domains = {}
+        existing = {}
+        for start in range(0, len(domain_ids), batch_size):
+            batch = domain_ids[start:start + batch_size]
+            domains.update({domain.id: domain for domain in Domain.query.filter(Domain.id.in_(batch))})
+            # 与 domain.certificates[0] 一致：每个域名更新ID最小的证书记录
+            for certificate in Certificate.query.filter(Certificate.domain_id.in_(batch)).order_by(Certificate.id.desc()):
+                existing[certificate.domain_id] = certificate
+        
+        now = datetime.utcnow()
+        stored = {}  # (类型, 证书指纹) -> 存储结果，同一张证书/私钥只写入一次
+        try:
+            for domain_id, (_, leaf) in selected.items():
+                domain = domains[domain_id]
+                chain = CertBundleImporter._build_chain(leaf, issuers)
+                key = keys.get(leaf['public_key_id'])
+                
+                certificate = existing.get(domain_id)
+                if certificate is None:
+                    certificate = Certificate(domain_id=domain_id)
+                    db.session.add(certificate)
+                
+                # 证书文件包含叶子证书与包内找到的中间证书
+                cert_key = ('certificate', leaf['fingerprint_sha256'])
+                if cert_key not in stored:
+                    stored[cert_key] = CertificateStore.put(
+                        'certificate', b'\n'.join(item['pem'] for item in [leaf] + chain) + b'\n')
+                cert_file = stored[cert_key]
+                certificate.cert_file_path = cert_file['file_path']
+                certificate.cert_file_name = cert_file['file_name']
+                certificate.cert_sha256 = cert_file['sha256']
+                if key is not None:
+                    key_key = ('private_key', leaf['public_key_id'])
+                    if key_key not in stored:
+                        stored[key_key] = CertificateStore.put('private_key', key['pem'] + b'\n')
+                    key_file = stored[key_key]
+                    certificate.key_file_path = key_file['file_path']
+                    certificate.key_file_name = key_file['file_name']
+                    certificate.key_sha256 = key_file['sha256']
+                else:
+                    certificate.key_file_path = None
+                    certificate.key_file_name = None
+                    certificate.key_sha256 = None
+                
+                certificate.issuer = leaf['issuer']
+                certificate.subject = leaf['subject']
+                certificate.serial_number = leaf['serial_number']
+                certificate.not_before = to_utc(leaf['not_before'])
+                certificate.not_after = to_utc(leaf['not_after'])
+                certificate.common_name = leaf.get('common_name')
+                certificate.san_domains = leaf.get('san_domains')
+                certificate.cert_domains = leaf.get('cert_domains')
+                certificate.fingerprint_sha256 = leaf['fingerprint_sha256']
+                certificate.key_type = leaf['key_type']
+                certificate.signature_algorithm = leaf['signature_algorithm']
+                certificate.chain = json.dumps([{
+                    'subject': item['subject'],
+                    'issuer': item['issuer'],
+                    'not_after': item['not_after'].isoformat(),
+                    'fingerprint_sha256': item['fingerprint_sha256']
+                } for item in [leaf] + chain], ensure_ascii=False)
+                certificate.verify_error = None
+                certificate.is_valid = True
+                certificate.last_checked = now
+                
+                # 上传了证书的域名自动启用SSL检查
+                domain.check_ssl = True
+            
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            CertificateStore.discard(stored.values())
+            raise
+        
+        # 被替换的旧文件可能仍被其他证书引用，不再引用后由垃圾回收清理
+        
+        result['matched_domains'] = len(selected)
+        print(f"证书包导入完成: 证书 {result['certificates']} 张，私钥配对 {result['paired']} 张，"
+              f"匹配域名 {result['matched_domains']} 个，未匹配证书 {len(result['unmatched'])} 张，"
+              f"解析失败 {len(errors)} 个")
+        return result
@@ -0,0 +1,81 @@
+from app import db
+from app.models.domain import Domain
+from app.models.certificate import Certificate, CertificateHostname
+from app.utils.hostnames import ParentDomain
+
+class CertificateCoverage:
+    """
+    基于证书域名索引（certificate_hostname）的覆盖查询
+    主机名反查证书、查找未被证书覆盖的域名都只做索引等值查找，不再逐张解析证书的域名JSON
+    """
+    
+    @staticmethod
+    def covering(hostname):
+        """
+        覆盖主机名的所有证书，精确匹配在前，同类按到期时间从晚到早排列
+        :return: [(证书, 'exact'/'wildcard')]
+        """
+        rows = db.session.query(Certificate, CertificateHostname.is_wildcard).join(
+            CertificateHostname, CertificateHostname.certificate_id == Certificate.id
+        ).options(
+            db.joinedload(Certificate.domain)
+        ).filter(
+            CertificateHostname.covers(hostname)
+        ).order_by(
+            CertificateHostname.is_wildcard, Certificate.not_after.desc(), Certificate.id
+        ).all()
+        
+        # 同一张证书同时以精确域名和通配符覆盖时只保留精确匹配
+        results = {}
+        for certificate, is_wildcard in rows:
+            results.setdefault(certificate.id, (certificate, 'wildcard' if is_wildcard else 'exact'))
+        return list(results.values())
+    
+    @staticmethod
+    def _covered_by(is_wildcard, hostname, own_certificate):
+        """域名被证书域名索引覆盖的 EXISTS 条件（与 Domain 关联）"""
+        subquery = db.select(CertificateHostname.id).where(
+            CertificateHostname.hostname == hostname,
+            CertificateHostname.is_wildcard == is_wildcard
+        )
+        if own_certificate:
+            subquery = subquery.join(Certificate, Certificate.id == CertificateHostname.certificate_id).where(
+                Certificate.domain_id == Domain.id
+            )
+        return subquery.correlate(Domain).exists()
+    
+    @staticmethod
+    def uncovered_query(own_certificate=True):
+        """
+        未被证书覆盖的域名查询（select Domain.id，调用方可继续追加条件与字段）
+        :param own_certificate: True 只检查域名自己的证书（证书与域名不匹配或没有证书），
+                                False 检查系统中的所有证书（没有任何一张证书覆盖该域名）
+        """
+        name = db.func.lower(Domain.name)
+        exact = CertificateCoverage._covered_by(False, name, own_certificate)
+        wildcard = db.and_(
+            Domain.name.contains('.'),
+            CertificateCoverage._covered_by(True, ParentDomain(name), own_certificate)
+        )
+        return db.select(Domain.id).where(~exact, ~wildcard)
+    
+    @staticmethod
+    def rebuild_index(batch_size=500):
+        """
+        按证书域名字段重建全部证书的域名索引（用于旧数据补建索引）
+        :return: 处理的证书数量
+        """
+        count = 0
+        last_id = 0
+        while True:
+            certificates = Certificate.query.options(
+                db.selectinload(Certificate.hostnames)
+            ).filter(Certificate.id > last_id).order_by(Certificate.id).limit(batch_size).all()
+            if not certificates:
+                break
+            for certificate in certificates:
+                certificate.sync_hostnames()
+            last_id = certificates[-1].id
+            count += len(certificates)
+            db.session.commit()
+        return count
@@ -1,11 +1,15 @@
-import os
-import tempfile
+import re
+import binascii
+import hashlib
 import json
-from datetime import datetime
 from cryptography import x509
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519, ed448, dsa
 from cryptography.hazmat.backends import default_backend
+from app.utils.cert_cache import ParsedCertificate, cert_cache
+
+# PEM块（证书、私钥等），用于拆分多证书合并文件
+PEM_BLOCK_PATTERN = re.compile(rb'-----BEGIN ([A-Z0-9 ]+)-----\r?\n.*?-----END \1-----', re.S)
 
 class CertParser:
     @staticmethod
@@ -16,31 +20,179 @@ class CertParser:
             cert_data = cert_file.read()
             cert_file.seek(0)  # 重置文件指针
             
-            # 解析证书
-            cert = x509.load_pem_x509_certificate(cert_data, default_backend())
+            # 解析证书（同一张证书复用解析缓存）
+            record = CertParser.load_certificate(cert_data)
             
             # 提取证书信息
             cert_info = {
-                'issuer': CertParser._format_name(cert.issuer),
-                'subject': CertParser._format_name(cert.subject),
-                'serial_number': str(cert.serial_number),
-                'not_before': cert.not_valid_before,
-                'not_after': cert.not_valid_after,
+                'issuer': record.issuer,
+                'subject': record.subject,
+                'serial_number': record.serial_number,
+                'not_before': record.not_before,
+                'not_after': record.not_after,
+                'fingerprint_sha256': record.fingerprint_sha256,
                 'is_valid': True
             }
             
             # 提取域名信息
-            domain_info = CertParser._extract_domain_info(cert)
-            cert_info.update(domain_info)
+            cert_info.update(record.domain_info())
             
             return cert_info
-            
+        
         except Exception as e:
             return {
                 'error': str(e),
                 'is_valid': False
             }
     
+    @staticmethod
+    def load_certificate(data):
+        """
+        解析PEM（取第一张证书）或DER编码的证书
+        先按DER内容计算指纹查询解析缓存，只有未缓存的证书才调用 cryptography 解码
+        :return: ParsedCertificate
+        """
+        der = CertParser._pem_to_der(data) if b'-----BEGIN' in data else data
+        fingerprint = hashlib.sha256(der).hexdigest()
+        return cert_cache.get_or_parse(
+            fingerprint,
+            lambda: CertParser._build_record(x509.load_der_x509_certificate(der, default_backend()), fingerprint)
+        )
+    
+    @staticmethod
+    def _pem_to_der(data):
+        """取出PEM内容中第一个证书块的DER编码"""
+        for block_type, block in CertParser.split_pem_blocks(data):
+            if block_type == 'CERTIFICATE':
+                body = block.split(b'-----', 2)[2].rsplit(b'-----BEGIN', 1)[0].rsplit(b'-----END', 1)[0]
+                return binascii.a2b_base64(body)
+        raise ValueError('未找到PEM格式的证书')
+    
+    @staticmethod
+    def _build_record(cert, fingerprint):
+        """从 cryptography 证书对象提取缓存记录"""
+        domain_info = CertParser._extract_domain_info(cert)
+        return ParsedCertificate(
+            fingerprint_sha256=fingerprint,
+            issuer=CertParser._format_name(cert.issuer),
+            subject=CertParser._format_name(cert.subject),
+            issuer_dict=CertParser._name_dict(cert.issuer),
+            subject_dict=CertParser._name_dict(cert.subject),
+            serial_number=str(cert.serial_number),
+            serial_hex=CertParser._format_serial(cert.serial_number),
+            not_before=cert.not_valid_before,
+            not_after=cert.not_valid_after,
+            key_type=CertParser._key_type(cert.public_key()),
+            signature_algorithm=cert.signature_algorithm_oid._name,
+            common_name=domain_info['common_name'],
+            san_domains=tuple(json.loads(domain_info['san_domains'])) if domain_info['san_domains'] else (),
+            cert_domains=tuple(json.loads(domain_info['cert_domains'])) if domain_info['cert_domains'] else (),
+            is_ca=CertParser._is_ca(cert),
+            public_key_id=CertParser.public_key_id(cert.public_key())
+        )
+    
+    @staticmethod
+    def describe_certificate(record):
+        """
+        提取证书的完整信息（用于在线检查获取的证书）
+        :param record: load_certificate 返回的 ParsedCertificate
+        """
+        info = {
+            'issuer': dict(record.issuer_dict),
+            'subject': dict(record.subject_dict),
+            'serial_number': record.serial_hex,
+            'not_before': record.not_before,
+            'not_after': record.not_after,
+            'fingerprint_sha256': record.fingerprint_sha256,
+            'key_type': record.key_type,
+            'signature_algorithm': record.signature_algorithm
+        }
+        info.update(record.domain_info())
+        return info
+    
+    @staticmethod
+    def split_pem_blocks(data):
+        """
+        拆分PEM内容中的各个块
+        :return: [(块类型, 块内容bytes)]，例如 ('CERTIFICATE', b'-----BEGIN CERTIFICATE-----...')
+        """
+        return [(match.group(1).decode('ascii'), match.group(0)) for match in PEM_BLOCK_PATTERN.finditer(data)]
+    
+    @staticmethod
+    def parse_pem_block(block):
+        """
+        解析单个PEM块（证书或私钥），可在进程池中执行
+        :param block: split_pem_blocks 返回的 (块类型, 块内容)
+        :return: 证书返回 kind='certificate' 及证书信息，私钥返回 kind='key'；
+                 两者都包含 public_key_id 用于配对，解析失败时包含 error
+        """
+        block_type, data = block
+        try:
+            if block_type == 'CERTIFICATE':
+                record = CertParser.load_certificate(data)
+                info = CertParser.describe_certificate(record)
+                info.update({
+                    'kind': 'certificate',
+                    'pem': data,
+                    'issuer': record.issuer,
+                    'subject': record.subject,
+                    'serial_number': record.serial_number,
+                    'is_ca': record.is_ca,
+                    'public_key_id': record.public_key_id
+                })
+                return info
+            if block_type.endswith('PRIVATE KEY'):
+                if block_type == 'ENCRYPTED PRIVATE KEY' or b'Proc-Type: 4,ENCRYPTED' in data:
+                    return {'kind': 'key', 'pem': data, 'error': '私钥已加密，无法导入'}
+                private_key = serialization.load_pem_private_key(data, password=None, backend=default_backend())
+                return {
+                    'kind': 'key',
+                    'pem': data,
+                    'public_key_id': CertParser.public_key_id(private_key.public_key())
+                }
+            return {'kind': 'other', 'block_type': block_type}
+        except Exception as e:
+            return {'kind': 'key' if 'PRIVATE KEY' in block_type else 'certificate', 'pem': data, 'error': str(e)}
+    
+    @staticmethod
+    def public_key_id(public_key):
+        """公钥（SubjectPublicKeyInfo DER编码）的SHA-256，证书与私钥按此配对"""
+        digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
+        digest.update(public_key.public_bytes(serialization.Encoding.DER,
+                                              serialization.PublicFormat.SubjectPublicKeyInfo))
+        return digest.finalize().hex()
+    
+    @staticmethod
+    def _is_ca(cert):
+        """是否为CA证书（中间证书或根证书）"""
+        try:
+            return cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+        except x509.ExtensionNotFound:
+            return cert.issuer == cert.subject and not CertParser._extract_domain_info(cert)['cert_domains']
+    
+    @staticmethod
+    def fingerprint_sha256(cert):
+        """证书DER编码的SHA-256指纹（小写十六进制）"""
+        return cert.fingerprint(hashes.SHA256()).hex()
+    
+    @staticmethod
+    def match_hostname(cert_domains, hostname):
+        """
+        判断证书域名是否覆盖主机名
+        :return: 'exact' / 'wildcard'，不匹配返回None
+        """
+        hostname = hostname.lower().rstrip('.')
+        for cert_domain in cert_domains:
+            cert_domain = cert_domain.lower().rstrip('.')
+            if cert_domain == hostname:
+                return 'exact'
+        for cert_domain in cert_domains:
+            cert_domain = cert_domain.lower().rstrip('.')
+            # 通配符只匹配一级子域名
+            if cert_domain.startswith('*.') and '.' in hostname and hostname.split('.', 1)[1] == cert_domain[2:]:
+                return 'wildcard'
+        return None
+    
     @staticmethod
     def _extract_domain_info(cert):
         """从证书中提取域名信息"""
@@ -73,7 +225,7 @@ class CertParser:
                 'san_domains': json.dumps(san_domains) if san_domains else None,
                 'cert_domains': json.dumps(domains) if domains else None
             }
-            
+        
         except Exception as e:
             return {
                 'common_name': None,
@@ -100,7 +252,7 @@ class CertParser:
                 'is_valid': True,
                 'key_type': type(private_key).__name__
             }
-            
+        
         except Exception as e:
             return {
                 'error': str(e),
@@ -108,61 +260,60 @@ class CertParser:
             }
     
     @staticmethod
-    def save_certificate_file(cert_file, domain_name):
-        """保存证书文件到服务器"""
-        try:
-            # 创建证书存储目录
-            cert_dir = os.path.join('uploads', 'certificates', domain_name)
-            os.makedirs(cert_dir, exist_ok=True)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            cert_filename = f"cert_{timestamp}.crt"
-            cert_path = os.path.join(cert_dir, cert_filename)
-            
-            # 保存文件
-            cert_file.save(cert_path)
-            
-            return {
-                'file_path': cert_path,
-                'file_name': cert_filename,
-                'is_saved': True
-            }
-            
-        except Exception as e:
-            return {
-                'error': str(e),
-                'is_saved': False
-            }
+    def save_certificate_file(cert_file, domain_name=None):
+        """
+        保存证书文件到内容寻址存储，相同内容的证书只保存一份
+        :return: {'file_path', 'file_name', 'sha256', 'created', 'is_saved'}
+        """
+        return CertParser._save_to_store('certificate', cert_file)
+    
+    @staticmethod
+    def save_private_key_file(key_file, domain_name=None):
+        """保存私钥文件到内容寻址存储，返回值同 save_certificate_file"""
+        return CertParser._save_to_store('private_key', key_file)
     
     @staticmethod
-    def save_private_key_file(key_file, domain_name):
-        """保存私钥文件到服务器"""
+    def _save_to_store(kind, file_storage):
+        # 存储依赖应用上下文与数据库，只在保存时导入（解析函数会在进程池中使用）
+        from app.services.cert_store import CertificateStore
+        
         try:
-            # 创建私钥存储目录
-            key_dir = os.path.join('uploads', 'private_keys', domain_name)
-            os.makedirs(key_dir, exist_ok=True)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            key_filename = f"key_{timestamp}.key"
-            key_path = os.path.join(key_dir, key_filename)
-            
-            # 保存文件
-            key_file.save(key_path)
-            
-            return {
-                'file_path': key_path,
-                'file_name': key_filename,
-                'is_saved': True
-            }
-            
+            result = CertificateStore.save_upload(kind, file_storage)
+            result['is_saved'] = True
+            return result
+        
         except Exception as e:
             return {
                 'error': str(e),
                 'is_saved': False
             }
     
+    @staticmethod
+    def _name_dict(name):
+        """证书名称转换为字典，键名与 ssl.getpeercert() 一致"""
+        return {attr.oid._name: attr.value for attr in name}
+    
+    @staticmethod
+    def _format_serial(serial_number):
+        """序列号格式化为大写十六进制，与 ssl.getpeercert() 一致"""
+        serial = f'{serial_number:X}'
+        return serial if len(serial) % 2 == 0 else '0' + serial
+    
+    @staticmethod
+    def _key_type(public_key):
+        """公钥类型与长度，例如 RSA 2048、EC secp256r1"""
+        if isinstance(public_key, rsa.RSAPublicKey):
+            return f'RSA {public_key.key_size}'
+        if isinstance(public_key, ec.EllipticCurvePublicKey):
+            return f'EC {public_key.curve.name}'
+        if isinstance(public_key, dsa.DSAPublicKey):
+            return f'DSA {public_key.key_size}'
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            return 'Ed25519'
+        if isinstance(public_key, ed448.Ed448PublicKey):
+            return 'Ed448'
+        return type(public_key).__name__
+    
     @staticmethod
     def _format_name(name):
         """格式化证书名称"""
@@ -172,13 +323,17 @@ class CertParser:
         return ", ".join(parts)
     
     @staticmethod
-    def validate_certificate_files(cert_file, key_file=None):
-        """验证证书文件的有效性"""
+    def validate_certificate_files(cert_file, key_file=None, cert_info=None):
+        """
+        验证证书文件的有效性
+        :param cert_info: 已解析的证书信息（parse_certificate_file 的返回值），提供时不再重复解析
+        """
         errors = []
         
         # 验证证书文件
         if cert_file:
-            cert_info = CertParser.parse_certificate_file(cert_file)
+            if cert_info is None:
+                cert_info = CertParser.parse_certificate_file(cert_file)
             if not cert_info.get('is_valid'):
                 errors.append(f"证书文件无效: {cert_info.get('error', '未知错误')}")
         else:
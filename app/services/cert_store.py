@@ -0,0 +1,179 @@
+import hashlib
+import os
+import tempfile
+import time
+from flask import current_app
+from app import db
+from app.models.certificate import Certificate
+
+class CertificateStore:
+    """
+    按内容寻址的证书/私钥文件存储
+    文件按内容的SHA-256保存在 uploads/store/<类型>/<前两位>/<摘要>.<扩展名>，相同内容只保存一份；
+    证书记录通过 cert_sha256/key_sha256 引用文件，引用计数即引用该摘要的证书记录数。
+    删除或替换证书时只修改数据库记录，不再引用的文件由 collect_garbage 统一清理
+    """
+    
+    ROOT = os.path.join('uploads', 'store')
+    
+    # 单个上传时的旧目录结构（每个域名一份文件），垃圾回收时一并清理不再引用的文件
+    LEGACY_DIRS = (os.path.join('uploads', 'certificates'), os.path.join('uploads', 'private_keys'))
+    
+    KINDS = {
+        'certificate': ('certificates', 'crt', 'cert_sha256', 'cert_file_path'),
+        'private_key': ('private_keys', 'key', 'key_sha256', 'key_file_path')
+    }
+    
+    @staticmethod
+    def path_for(kind, digest):
+        """摘要对应的存储路径"""
+        subdir, extension, _, _ = CertificateStore.KINDS[kind]
+        return os.path.join(CertificateStore.ROOT, subdir, digest[:2], f'{digest}.{extension}')
+    
+    @staticmethod
+    def put(kind, data):
+        """
+        保存文件内容，内容已存在时直接复用
+        先写入同目录下的临时文件并刷盘，再原子替换为目标文件，进程中断不会留下不完整的文件
+        :return: {'kind', 'sha256', 'file_path', 'file_name', 'created'}，created 表示本次新写入了文件
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = CertificateStore.path_for(kind, digest)
+        result = {
+            'kind': kind,
+            'sha256': digest,
+            'file_path': path,
+            'file_name': os.path.basename(path),
+            'created': False
+        }
+        
+        if os.path.exists(path):
+            # 刷新修改时间，避免刚被复用的文件在提交引用前被垃圾回收
+            os.utime(path)
+            return result
+        
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if kind == 'private_key':
+                os.chmod(temp_path, 0o600)
+            else:
+                os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        result['created'] = True
+        return result
+    
+    @staticmethod
+    def save_upload(kind, file_storage):
+        """保存上传的文件（读取后重置文件指针）"""
+        data = file_storage.read()
+        file_storage.seek(0)
+        return CertificateStore.put(kind, data)
+    
+    @staticmethod
+    def discard(results):
+        """事务回滚时删除本次新写入且仍未被引用的文件"""
+        for result in results:
+            if result and result['created'] and CertificateStore.ref_count(result['kind'], result['sha256']) == 0:
+                if os.path.exists(result['file_path']):
+                    os.remove(result['file_path'])
+    
+    @staticmethod
+    def ref_count(kind, digest):
+        """引用该文件的证书记录数（按摘要列的索引计数）"""
+        column = getattr(Certificate, CertificateStore.KINDS[kind][2])
+        return db.session.query(db.func.count(Certificate.id)).filter(column == digest).scalar()
+    
+    @staticmethod
+    def _referenced_paths():
+        """所有证书记录引用的文件路径（内容寻址文件按摘要计算，旧文件按记录中的路径）"""
+        referenced = set()
+        for kind, (_, _, digest_field, path_field) in CertificateStore.KINDS.items():
+            digest_column = getattr(Certificate, digest_field)
+            path_column = getattr(Certificate, path_field)
+            for digest, path in db.session.query(digest_column, path_column).filter(
+                db.or_(digest_column.is_not(None), path_column.is_not(None))
+            ).distinct():
+                if digest:
+                    referenced.add(os.path.normpath(CertificateStore.path_for(kind, digest)))
+                if path:
+                    referenced.add(os.path.normpath(path))
+        return referenced
+    
+    @staticmethod
+    def adopt_legacy(batch_size=500):
+        """
+        把旧目录结构中的文件迁入内容寻址存储并更新证书记录，原文件随后由垃圾回收删除
+        :return: 迁移的文件数
+        """
+        adopted = 0
+        last_id = 0
+        while True:
+            certificates = Certificate.query.filter(Certificate.id > last_id).order_by(Certificate.id).limit(batch_size).all()
+            if not certificates:
+                break
+            for certificate in certificates:
+                for kind, (_, _, digest_field, path_field) in CertificateStore.KINDS.items():
+                    path = getattr(certificate, path_field)
+                    if not path or getattr(certificate, digest_field) or not os.path.exists(path):
+                        continue
+                    with open(path, 'rb') as f:
+                        stored = CertificateStore.put(kind, f.read())
+                    setattr(certificate, digest_field, stored['sha256'])
+                    setattr(certificate, path_field, stored['file_path'])
+                    adopted += 1
+            last_id = certificates[-1].id
+            db.session.commit()
+        return adopted
+    
+    @staticmethod
+    def collect_garbage(grace_seconds=None, dry_run=False):
+        """
+        删除不再被任何证书记录引用的文件（包括旧目录结构中的文件）
+        修改时间在 grace_seconds 之内的文件不删除，避免与正在进行、尚未提交的上传冲突
+        :return: 统计信息 {'scanned', 'removed', 'bytes_freed'}
+        """
+        if grace_seconds is None:
+            grace_seconds = current_app.config['CERT_STORE_GC_GRACE_HOURS'] * 3600
+        referenced = CertificateStore._referenced_paths()
+        cutoff = time.time() - grace_seconds
+        stats = {'scanned': 0, 'removed': 0, 'bytes_freed': 0}
+        
+        for root_dir in (CertificateStore.ROOT,) + CertificateStore.LEGACY_DIRS:
+            if not os.path.isdir(root_dir):
+                continue
+            for directory, _, filenames in os.walk(root_dir, topdown=False):
+                for filename in filenames:
+                    path = os.path.normpath(os.path.join(directory, filename))
+                    stats['scanned'] += 1
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if path in referenced or stat.st_mtime > cutoff:
+                        continue
+                    stats['removed'] += 1
+                    stats['bytes_freed'] += stat.st_size
+                    if not dry_run:
+                        os.remove(path)
+                
+                # 清理空目录（保留根目录）
+                if not dry_run and directory != root_dir and not os.listdir(directory):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        pass
+        
+        print(f"证书文件垃圾回收{'（试运行）' if dry_run else ''}: 扫描 {stats['scanned']} 个文件，"
+              f"删除 {stats['removed']} 个，释放 {stats['bytes_freed']} 字节")
+        return stats
@@ -0,0 +1,183 @@
+import uuid
+from flask import current_app
+from app import db
+from app.models.check_task import CheckTask
+
+# 支持的检查类型：ssl/whois/access 针对域名，url 针对URL监控项
+DOMAIN_CHECK_TYPES = ('ssl', 'whois', 'access')
+URL_CHECK_TYPES = ('url',)
+CHECK_TYPES = DOMAIN_CHECK_TYPES + URL_CHECK_TYPES
+
+TASK_STATUSES = ('pending', 'running', 'done', 'failed', 'skipped')
+
+class CheckJob:
+    """批量检查任务，由相同 job_id 的持久化检查任务组成"""
+    
+    def __init__(self, job_id, created_at, counts, tasks=None):
+        self.id = job_id
+        self.created_at = created_at
+        self.counts = counts
+        self.tasks = tasks
+    
+    @property
+    def is_finished(self):
+        return self.counts['pending'] == 0 and self.counts['running'] == 0
+    
+    def to_dict(self, include_items=True):
+        total = sum(self.counts.values())
+        completed = self.counts['done'] + self.counts['failed'] + self.counts['skipped']
+        result = {
+            'job_id': self.id,
+            'status': 'finished' if completed == total else 'running',
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'total': total,
+            'completed': completed,
+            'progress': round(completed / total * 100, 1) if total else 100.0,
+            'counts': dict(self.counts)
+        }
+        if include_items and self.tasks is not None:
+            result['items'] = [task.to_dict() for task in self.tasks]
+        return result
+
+class CheckJobManager:
+    """
+    批量检查任务管理
+    检查项写入持久化任务队列，由任务队列工作线程执行；
+    同一检查项（检查类型+目标ID）尚未完成时不会重复写入，重叠的请求合并到已有任务中；
+    多个进程同时提交时由任务表的 active_key 唯一约束保证只写入一次
+    """
+    
+    @staticmethod
+    def build_items(domain_ids=None, url_ids=None, check_types=None):
+        """根据请求参数生成检查项键列表"""
+        check_types = check_types or list(CHECK_TYPES)
+        unknown = [check_type for check_type in check_types if check_type not in CHECK_TYPES]
+        if unknown:
+            raise ValueError(f"不支持的检查类型: {', '.join(unknown)}")
+        
+        keys = []
+        for domain_id in dict.fromkeys(domain_ids or []):
+            for check_type in DOMAIN_CHECK_TYPES:
+                if check_type in check_types:
+                    keys.append((check_type, int(domain_id)))
+        for url_id in dict.fromkeys(url_ids or []):
+            if 'url' in check_types:
+                keys.append(('url', int(url_id)))
+        return keys
+    
+    @staticmethod
+    def submit(domain_ids=None, url_ids=None, check_types=None, stagger_interval=0):
+        """
+        提交批量检查任务
+        :param stagger_interval: 相邻检查项最早执行时间的间隔（秒），大于0时分散执行
+        :return: (CheckJob, 是否合并到已有任务)
+        """
+        from app.services.task_queue import TaskQueue, task_worker
+        
+        keys = CheckJobManager.build_items(domain_ids, url_ids, check_types)
+        if not keys:
+            raise ValueError("没有需要执行的检查项")
+        
+        # 查找与本次请求重叠的未完成任务
+        unfinished = TaskQueue.find_unfinished(keys)
+        job_id = next(iter(unfinished.values())) if unfinished else uuid.uuid4().hex
+        
+        new_keys = [key for key in keys if key not in unfinished]
+        inserted = TaskQueue.enqueue(new_keys, job_id, interval=stagger_interval)
+        merged = bool(unfinished) or len(inserted) < len(new_keys)
+        if not unfinished and not inserted:
+            # 所有检查项都已由其他进程同时写入，合并到其任务
+            unfinished = TaskQueue.find_unfinished(keys)
+            job_id = next(iter(unfinished.values()), job_id)
+        
+        if inserted:
+            task_worker.wake()
+        return CheckJobManager.get_job(job_id, include_items=False), merged
+    
+    @staticmethod
+    def get_job(job_id, include_items=True):
+        """
+        查询批量任务
+        :return: CheckJob，任务不存在或已清理时返回None
+        """
+        rows = db.session.query(
+            CheckTask.status, db.func.count(CheckTask.id), db.func.min(CheckTask.created_at)
+        ).filter(CheckTask.job_id == job_id).group_by(CheckTask.status).all()
+        if not rows:
+            return None
+        
+        counts = dict.fromkeys(TASK_STATUSES, 0)
+        for status, count, _ in rows:
+            counts[status] = count
+        created_at = min(created_at for _, _, created_at in rows)
+        
+        tasks = None
+        if include_items:
+            tasks = CheckTask.query.filter_by(job_id=job_id).order_by(CheckTask.id).all()
+        return CheckJob(job_id, created_at, counts, tasks)
+    
+    @staticmethod
+    def list_jobs():
+        """最近的批量任务（最多 CHECK_JOB_RETENTION 个），不含逐项明细"""
+        recent = db.session.query(CheckTask.job_id).group_by(CheckTask.job_id).order_by(
+            db.func.max(CheckTask.id).desc()
+        ).limit(current_app.config['CHECK_JOB_RETENTION']).subquery()
+        
+        rows = db.session.query(
+            CheckTask.job_id, CheckTask.status, db.func.count(CheckTask.id), db.func.min(CheckTask.created_at)
+        ).filter(CheckTask.job_id.in_(db.select(recent.c.job_id))).group_by(
+            CheckTask.job_id, CheckTask.status
+        ).all()
+        
+        jobs = {}
+        for job_id, status, count, created_at in rows:
+            job = jobs.get(job_id)
+            if job is None:
+                job = jobs[job_id] = CheckJob(job_id, created_at, dict.fromkeys(TASK_STATUSES, 0))
+            job.counts[status] = count
+            job.created_at = min(job.created_at, created_at)
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+def run_check(check_type, target_id):
+    """
+    执行单个检查
+    :return: True 检查完成，False 检查失败，None 目标不存在或未启用该检查
+    """
+    from app.models.domain import Domain
+    
+    if check_type == 'url':
+        from app.models.url import URL
+        from app.services.url_checker import URLChecker
+        
+        url_obj = URL.query.get(target_id)
+        if not url_obj or not url_obj.is_active:
+            return None
+        return URLChecker.check_single_url(target_id) is not None
+    
+    domain = Domain.query.get(target_id)
+    if not domain or not domain.is_active:
+        return None
+    
+    if check_type == 'ssl':
+        if not domain.check_ssl:
+            return None
+        from app.services.ssl_checker import SSLChecker
+        return SSLChecker.update_certificate_info(domain) is not None
+    
+    if check_type == 'whois':
+        if not domain.check_whois:
+            return None
+        from app.services.whois_checker import check_single_whois
+        return check_single_whois(domain.id) is not None
+    
+    if check_type == 'access':
+        if not domain.check_access:
+            return None
+        # 优先使用URL监控检查，回退到旧的访问检查
+        if domain.website_url_id:
+            from app.services.url_checker import URLChecker
+            return URLChecker.check_single_url(domain.website_url_id) is not None
+        from app.services.domain_access_checker import check_single_domain_access
+        return check_single_domain_access(domain.id) is not None
+    
+    raise ValueError(f"不支持的检查类型: {check_type}")
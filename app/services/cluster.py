@@ -0,0 +1,299 @@
+import atexit
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.cluster import WorkerNode, CheckClaim
+from app.utils.rate_limit import whois_rate_limiter
+
+# 各检查类型按哪种目标分片：同一域名的SSL/WHOIS/访问检查归属同一工作进程
+SHARD_KINDS = {
+    'ssl': 'domain',
+    'whois': 'domain',
+    'access': 'domain',
+    'url': 'url'
+}
+
+# 按天执行的定时检查的周期（秒）；SSL检查周期由 CERT_CHECK_INTERVAL 配置
+CHECK_INTERVALS = {
+    'whois': 24 * 3600,
+    'access': 24 * 3600
+}
+
+# 补查遗漏目标时执行的批量检查（URL监控每分钟按间隔检查，无需补查）
+SWEEP_CHECKS = {
+    'ssl': 'app.services.ssl_checker:check_all_certificates',
+    'whois': 'app.services.whois_checker:check_all_whois',
+    'access': 'app.services.domain_access_checker:check_all_domain_access'
+}
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+class HashRing:
+    """一致性哈希环，成员变化时只有少量目标需要迁移"""
+    
+    def __init__(self, members, replicas=64):
+        self.members = tuple(sorted(members))
+        self._points = []
+        self._owners = []
+        points = sorted((_hash(f'{member}#{index}'), member)
+                        for member in self.members for index in range(replicas))
+        for point, member in points:
+            self._points.append(point)
+            self._owners.append(member)
+    
+    def owner(self, key):
+        """返回负责该键的成员"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+class ClusterMembership:
+    """
+    集群成员管理
+    每个工作进程在 worker_node 表中持有一个租约并定期续约，
+    存活成员组成一致性哈希环，按环分配域名与URL监控项的归属
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.worker_id = None
+        self._lock = threading.Lock()
+        self._ring = None
+        self._running = set()  # 本进程正在执行的批量检查类型
+    
+    @property
+    def enabled(self):
+        return self.app is not None
+    
+    def start(self, app):
+        """加入集群，同一进程内只加入一次"""
+        if self.app is not None:
+            return
+        self.app = app
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._ring = HashRing([self.worker_id], app.config['CLUSTER_HASH_REPLICAS'])
+        with app.app_context():
+            self.heartbeat()
+        atexit.register(self.leave)
+        
+        from app.utils.metrics import CLUSTER_MEMBERS
+        CLUSTER_MEMBERS.set_function(lambda: len(self.members))
+        print(f"已加入集群: {self.worker_id}")
+    
+    def heartbeat(self):
+        """续约并刷新存活成员，成员变化时重建哈希环（需在应用上下文中调用）"""
+        config = current_app.config
+        now = datetime.utcnow()
+        lease_expires_at = now + timedelta(seconds=config['CLUSTER_LEASE_SECONDS'])
+        
+        try:
+            node = WorkerNode.query.filter_by(worker_id=self.worker_id).first()
+            if node is None:
+                hostname, pid, _ = self.worker_id.rsplit(':', 2)
+                node = WorkerNode(worker_id=self.worker_id, hostname=hostname, pid=int(pid), started_at=now)
+                db.session.add(node)
+            node.heartbeat_at = now
+            node.lease_expires_at = lease_expires_at
+            db.session.commit()
+            
+            members = [worker_id for (worker_id,) in db.session.query(WorkerNode.worker_id)
+                       .filter(WorkerNode.lease_expires_at > now)]
+            
+            # 清理长时间失联的成员和过期的周期领取记录
+            WorkerNode.query.filter(
+                WorkerNode.lease_expires_at < now - timedelta(seconds=config['CLUSTER_LEASE_SECONDS'] * 10)
+            ).delete(synchronize_session=False)
+            CheckClaim.query.filter(
+                CheckClaim.claimed_at < now - timedelta(days=config['CLUSTER_CLAIM_RETENTION_DAYS'])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"集群心跳失败: {str(e)}")
+            return
+        
+        if self.worker_id not in members:
+            members.append(self.worker_id)
+        with self._lock:
+            if set(members) != set(self._ring.members):
+                print(f"集群成员变化: {len(self._ring.members)} -> {len(members)}，重新分配监控归属")
+                self._ring = HashRing(members, config['CLUSTER_HASH_REPLICAS'])
+        
+        # WHOIS服务器的限速由存活的工作进程平均分摊
+        whois_rate_limiter.set_share(len(members))
+    
+    def leave(self):
+        """退出集群，释放租约以便其他成员立即接管"""
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                WorkerNode.query.filter_by(worker_id=self.worker_id).delete(synchronize_session=False)
+                db.session.commit()
+        except Exception as e:
+            print(f"退出集群失败: {str(e)}")
+    
+    @property
+    def members(self):
+        with self._lock:
+            return self._ring.members if self._ring else ()
+    
+    def owns(self, check_type, target_id):
+        """本进程是否负责该目标；未启用集群时负责所有目标"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            ring = self._ring
+        return ring.owner(f'{SHARD_KINDS[check_type]}:{target_id}') == self.worker_id
+    
+    @staticmethod
+    def check_interval(check_type):
+        """定时检查类型的检查周期（秒），周期序号按该间隔计算"""
+        if check_type == 'ssl':
+            return current_app.config['CERT_CHECK_INTERVAL'] * 3600
+        return CHECK_INTERVALS[check_type]
+    
+    def claim(self, check_type, target_id, interval_seconds):
+        """
+        领取目标在当前周期内的检查，检查结束后调用 complete
+        :return: 领取成功返回True，本周期已由其他进程执行或正在执行返回False
+        """
+        return bool(self.claim_many(check_type, [target_id], interval_seconds))
+    
+    def claim_many(self, check_type, target_ids, interval_seconds):
+        """
+        批量领取目标在当前周期内的检查（一次提交）
+        没有领取记录的目标直接领取；已有未完成记录、但租约已过期或领取者已退出集群的目标被接管；
+        已完成或仍在其他进程租约内的目标跳过
+        :return: 领取成功的目标ID列表
+        """
+        if not self.enabled:
+            return list(target_ids)
+        if not target_ids:
+            return []
+        
+        slot = int(time.time() // max(int(interval_seconds), 1))
+        now = datetime.utcnow()
+        lease_expires_at = now + timedelta(seconds=current_app.config['CLUSTER_CLAIM_LEASE_SECONDS'])
+        members = set(self.members)
+        existing = {claim.target_id: claim for claim in CheckClaim.query.filter(
+            CheckClaim.check_type == check_type,
+            CheckClaim.slot == slot,
+            CheckClaim.target_id.in_(target_ids)
+        )}
+        
+        claimed = []
+        for target_id in target_ids:
+            claim = existing.get(target_id)
+            if claim is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(CheckClaim(
+                            check_type=check_type,
+                            target_id=target_id,
+                            slot=slot,
+                            worker_id=self.worker_id,
+                            claimed_at=now,
+                            lease_expires_at=lease_expires_at
+                        ))
+                except IntegrityError:
+                    # 其他进程刚刚领取，保存点已回滚，外层事务不受影响
+                    continue
+                claimed.append(target_id)
+            elif (claim.completed_at is None and claim.lease_expires_at is not None
+                  and (claim.lease_expires_at <= now or claim.worker_id not in members)):
+                # 按原领取者条件更新，多个进程同时接管时只有一个成功
+                taken = CheckClaim.query.filter(
+                    CheckClaim.id == claim.id,
+                    CheckClaim.worker_id == claim.worker_id,
+                    CheckClaim.completed_at.is_(None)
+                ).update({
+                    'worker_id': self.worker_id,
+                    'claimed_at': now,
+                    'lease_expires_at': lease_expires_at
+                }, synchronize_session=False)
+                if taken:
+                    print(f"接管未完成的检查 {check_type}:{target_id}（原领取者 {claim.worker_id}）")
+                    claimed.append(target_id)
+        db.session.commit()
+        return claimed
+    
+    def complete(self, check_type, target_ids):
+        """标记本进程领取的检查已完成（检查失败也视为本周期已执行）"""
+        if not self.enabled or not target_ids:
+            return
+        try:
+            CheckClaim.query.filter(
+                CheckClaim.check_type == check_type,
+                CheckClaim.target_id.in_(list(target_ids)),
+                CheckClaim.worker_id == self.worker_id,
+                CheckClaim.completed_at.is_(None)
+            ).update({'completed_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"标记检查完成失败 {check_type}: {str(e)}")
+    
+    def claimed_batches(self, check_type, target_ids, interval_seconds):
+        """
+        定时检查按批领取：每批在检查前才领取，调用方检查完一批后调用 complete，
+        进程中途退出时只有当前一批处于领取状态，租约过期后由其他进程接管
+        未启用集群时一次返回全部目标
+        :return: 生成器，产出每批领取成功的目标ID列表
+        """
+        target_ids = list(target_ids)
+        if not self.enabled:
+            if target_ids:
+                yield target_ids
+            return
+        
+        batch_size = max(current_app.config['CLUSTER_CLAIM_BATCH'], 1)
+        with self._lock:
+            self._running.add(check_type)
+        try:
+            for start in range(0, len(target_ids), batch_size):
+                claimed = self.claim_many(check_type, target_ids[start:start + batch_size], interval_seconds)
+                if claimed:
+                    yield claimed
+        finally:
+            with self._lock:
+                self._running.discard(check_type)
+    
+    def sweep(self):
+        """
+        补查本周期遗漏的定时检查（需在应用上下文中调用）
+        成员变化时各进程的哈希环可能短暂不一致，某些目标无人领取；领取者中途退出时其目标停留在未完成状态。
+        本周期的定时检查已在集群内开始（存在领取记录）且本进程没有在执行同类检查时，
+        重新执行该类检查：已完成或仍在租约内的目标会被跳过，只检查归属本进程的遗漏目标
+        """
+        if not self.enabled:
+            return
+        
+        for check_type, func_name in SWEEP_CHECKS.items():
+            with self._lock:
+                if check_type in self._running:
+                    continue
+            slot = int(time.time() // max(int(self.check_interval(check_type)), 1))
+            started = db.session.query(CheckClaim.id).filter_by(check_type=check_type, slot=slot).first()
+            if started is None:
+                continue
+            
+            module_name, attr = func_name.split(':')
+            func = getattr(__import__(module_name, fromlist=[attr]), attr)
+            try:
+                func()
+            except Exception as e:
+                db.session.rollback()
+                print(f"补查遗漏的检查失败 {check_type}: {str(e)}")
+
+cluster = ClusterMembership()
@@ -6,6 +6,9 @@ from app.models.domain import Domain
 from app import db
 from app.services.notifier import Notifier
 from app.utils.timezone import get_current_beijing_time
+from app.utils.single_flight import single_flight
+from app.utils import happy_eyeballs
+from app.utils.metrics import instrument_check
 
 class DomainAccessChecker:
     @staticmethod
@@ -15,12 +18,14 @@ class DomainAccessChecker:
         
         try:
             start_time = time.time()
-            response = requests.get(
-                url, 
-                timeout=timeout, 
-                allow_redirects=True,
-                verify=True
-            )
+            # 双栈竞速连接，IPv6 路由故障时不必等待超时再尝试 IPv4
+            with happy_eyeballs.session() as http:
+                response = http.get(
+                    url, 
+                    timeout=timeout, 
+                    allow_redirects=True,
+                    verify=True
+                )
             response_time = time.time() - start_time
             
             return {
@@ -29,7 +34,7 @@ class DomainAccessChecker:
                 'response_time': round(response_time, 3),
                 'error_message': None
             }
-            
+        
         except requests.exceptions.SSLError as e:
             return {
                 'is_accessible': False,
@@ -67,6 +72,8 @@ class DomainAccessChecker:
             }
     
     @staticmethod
+    @single_flight('access', lambda domain: domain.id)
+    @instrument_check('access')
     def update_domain_access_record(domain):
         """更新域名的访问检查记录"""
         access_info = DomainAccessChecker.check_domain_access(domain.name)
@@ -97,14 +104,24 @@ class DomainAccessChecker:
 
 def check_all_domain_access():
     """检查所有启用访问检查的域名"""
+    from app.services.cluster import cluster
+    
     domains = Domain.query.filter_by(is_active=True, check_access=True).all()
     
-    for domain in domains:
-        try:
-            DomainAccessChecker.update_domain_access_record(domain)
-        except Exception as e:
-            print(f"检查域名访问失败 {domain.name}: {str(e)}")
+    # 集群模式下只检查归属本进程的域名，按批在检查前领取当天的检查
+    domains = {domain.id: domain for domain in domains if cluster.owns('access', domain.id)}
+    for domain_ids in cluster.claimed_batches('access', list(domains), cluster.check_interval('access')):
+        for domain_id in domain_ids:
+            domain = domains[domain_id]
+            try:
+                DomainAccessChecker.update_domain_access_record(domain)
+            except Exception as e:
+                print(f"检查域名访问失败 {domain.name}: {str(e)}")
+            finally:
+                cluster.complete('access', [domain_id])
 
+@single_flight('access', lambda domain_id: domain_id)
+@instrument_check('access')
 def check_single_domain_access(domain_id):
     """检查单个域名的访问状态"""
     try:
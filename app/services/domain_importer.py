@@ -0,0 +1,219 @@
+import csv
+import re
+from flask import current_app
+from app import db
+from app.models.domain import Domain
+from app.models.url import URL
+
+# 合法域名（已转换为小写/punycode）
+DOMAIN_PATTERN = re.compile(r'^(?=.{1,253}$)([a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z0-9-]{2,63}$')
+
+# CSV表头中可识别的列名
+HEADER_ALIASES = {
+    'name': 'name',
+    'domain': 'name',
+    '域名': 'name',
+    'description': 'description',
+    '描述': 'description',
+    'check_ssl': 'check_ssl',
+    'check_whois': 'check_whois',
+    'check_access': 'check_access'
+}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on', '是')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'off', '否')
+
+class DomainImporter:
+    """
+    批量导入域名
+    支持CSV（可带表头）或每行一个域名的纯文本列表，
+    按批次去重、插入域名与URL监控项，并分散提交首次检查
+    """
+    
+    @staticmethod
+    def normalize_name(value):
+        """
+        规范化域名：去掉协议、路径、端口和末尾的点，转换为小写
+        :return: 规范化后的域名，不合法时返回None
+        """
+        name = (value or '').strip().lower()
+        name = re.sub(r'^[a-z][a-z0-9+.-]*://', '', name)
+        name = name.split('/', 1)[0].split('?', 1)[0].split(':', 1)[0].rstrip('.')
+        if not name:
+            return None
+        try:
+            name = name.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+        return name if DOMAIN_PATTERN.match(name) else None
+    
+    @staticmethod
+    def _parse_bool(value):
+        value = (value or '').strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        return None
+    
+    @staticmethod
+    def parse(content):
+        """
+        解析导入内容
+        :param content: CSV或纯文本内容（str）
+        :return: (条目列表, 无法识别的行列表)
+        """
+        entries = []
+        invalid = []
+        
+        lines = [line for line in content.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+        if not lines:
+            return entries, invalid
+        
+        rows = list(csv.reader(lines))
+        columns = None
+        first = [cell.strip().lower() for cell in rows[0]]
+        if first and first[0] in HEADER_ALIASES and HEADER_ALIASES[first[0]] == 'name':
+            columns = [HEADER_ALIASES.get(cell) for cell in first]
+            rows = rows[1:]
+        
+        for row in rows:
+            if columns:
+                record = {}
+                for column, cell in zip(columns, row):
+                    if column:
+                        record[column] = cell.strip()
+            else:
+                record = {'name': row[0].strip() if row else ''}
+                if len(row) > 1:
+                    record['description'] = row[1].strip()
+            
+            name = DomainImporter.normalize_name(record.get('name'))
+            if not name:
+                invalid.append(','.join(row))
+                continue
+            
+            entries.append({
+                'name': name,
+                'description': record.get('description') or None,
+                'check_ssl': DomainImporter._parse_bool(record.get('check_ssl')),
+                'check_whois': DomainImporter._parse_bool(record.get('check_whois')),
+                'check_access': DomainImporter._parse_bool(record.get('check_access'))
+            })
+        
+        return entries, invalid
+    
+    @staticmethod
+    def build_website_url(domain):
+        """创建域名的官网URL监控项，默认配置与单个添加域名时一致"""
+        return URL(
+            name=f"{domain.name} 官网监控",
+            url=f"https://{domain.name}",
+            description=f"域名 {domain.name} 的官网可用性监控",
+            check_interval=1,
+            timeout=10,
+            retry_count=1,
+            method='GET',
+            expected_status_codes='200',
+            response_time_threshold=5.0,
+            follow_redirects=True,
+            verify_ssl=True,
+            notification_config_id=domain.notification_config_id
+        )
+    
+    @staticmethod
+    def import_domains(entries, check_ssl=True, check_whois=True, check_access=False,
+                       notification_config_id=None, enqueue_checks=True):
+        """
+        批量导入域名
+        :param entries: parse() 返回的条目列表，条目中的检查开关优先于默认值
+        :param enqueue_checks: 是否分散提交首次检查任务
+        :return: 导入结果统计
+        """
+        batch_size = current_app.config['IMPORT_BATCH_SIZE']
+        
+        # 先在输入内部去重，保留第一次出现的条目
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry['name'], entry)
+        pending = list(unique.values())
+        
+        result = {
+            'total': len(entries),
+            'duplicates': len(entries) - len(pending),
+            'existing': 0,
+            'created': 0,
+            'domain_ids': [],
+            'job_id': None
+        }
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            
+            # 每批只用一次查询找出已存在的域名
+            existing = {
+                name for (name,) in db.session.query(Domain.name)
+                .filter(Domain.name.in_([entry['name'] for entry in batch]))
+            }
+            result['existing'] += len(existing)
+            
+            domains = []
+            for entry in batch:
+                if entry['name'] in existing:
+                    continue
+                domains.append(Domain(
+                    name=entry['name'],
+                    description=entry['description'],
+                    check_ssl=check_ssl if entry['check_ssl'] is None else entry['check_ssl'],
+                    check_whois=check_whois if entry['check_whois'] is None else entry['check_whois'],
+                    check_access=check_access if entry['check_access'] is None else entry['check_access'],
+                    notification_config_id=notification_config_id
+                ))
+            if not domains:
+                continue
+            
+            try:
+                db.session.add_all(domains)
+                db.session.flush()
+                
+                # 批量创建官网URL监控项并关联
+                monitored = [domain for domain in domains if domain.check_access]
+                urls = [DomainImporter.build_website_url(domain) for domain in monitored]
+                if urls:
+                    db.session.add_all(urls)
+                    db.session.flush()
+                    for domain, website_url in zip(monitored, urls):
+                        domain.website_url_id = website_url.id
+                
+                # 提交前记录ID，避免提交后逐个刷新过期对象
+                domain_ids = [domain.id for domain in domains]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            
+            result['created'] += len(domain_ids)
+            result['domain_ids'].extend(domain_ids)
+        
+        if enqueue_checks and result['domain_ids']:
+            result['job_id'] = DomainImporter.enqueue_first_checks(result['domain_ids'])
+        
+        print(f"批量导入域名完成: 新增 {result['created']} 个，已存在 {result['existing']} 个，"
+              f"重复 {result['duplicates']} 个")
+        return result
+    
+    @staticmethod
+    def enqueue_first_checks(domain_ids):
+        """
+        把新域名的首次WHOIS/SSL/访问检查写入任务队列，按配置的速率错开最早执行时间
+        :return: 批量任务ID
+        """
+        from app.services.check_jobs import CheckJobManager
+        
+        checks_per_minute = max(current_app.config['IMPORT_CHECKS_PER_MINUTE'], 1)
+        job, _ = CheckJobManager.submit(
+            domain_ids=domain_ids,
+            check_types=['whois', 'ssl', 'access'],
+            stagger_interval=60.0 / checks_per_minute
+        )
+        return job.id
@@ -0,0 +1,165 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from app import db
+from app.models.domain import Domain
+from app.models.certificate import Certificate
+from app.models.notification import URLCheck, WhoisRecord
+from app.utils.serialization import dumps
+
+class DataExporter:
+    """检查历史与资产清单的流式导出，内存占用与导出行数无关"""
+    
+    # 服务端游标每批拉取的行数
+    BATCH_SIZE = 1000
+    
+    # CSV每累积多少行输出一次
+    CSV_FLUSH_ROWS = 500
+    
+    FORMATS = ('ndjson', 'csv')
+    
+    @staticmethod
+    def get_kinds():
+        """可导出的数据类型 -> (列列表, 时间过滤列, 监控项过滤列)"""
+        return {
+            'url_checks': (
+                list(URLCheck.__table__.columns),
+                URLCheck.checked_at,
+                {'url_id': URLCheck.url_id}
+            ),
+            'domains': (
+                list(Domain.__table__.columns),
+                Domain.created_at,
+                {'domain_id': Domain.id}
+            ),
+            'certificates': (
+                list(Certificate.__table__.columns) + [Certificate.days_until_expiry.label('days_until_expiry'),
+                                                       Domain.name.label('domain_name')],
+                Certificate.last_checked,
+                {'domain_id': Certificate.domain_id}
+            ),
+            'whois': (
+                list(WhoisRecord.__table__.columns) + [WhoisRecord.days_until_expiry.label('days_until_expiry'),
+                                                       Domain.name.label('domain_name')],
+                WhoisRecord.last_checked,
+                {'domain_id': WhoisRecord.domain_id}
+            )
+        }
+    
+    @staticmethod
+    def parse_time(value):
+        """解析ISO格式的时间参数（如 2024-01-01 或 2024-01-01T08:00:00）"""
+        if not value:
+            return None
+        return datetime.fromisoformat(value)
+    
+    @staticmethod
+    def build_query(kind, since=None, until=None, url_id=None, domain_id=None):
+        """
+        构建导出查询
+        :return: (字段名列表, select语句)
+        """
+        kinds = DataExporter.get_kinds()
+        if kind not in kinds:
+            raise ValueError(f"不支持的导出类型: {kind}")
+        
+        columns, time_column, monitor_columns = kinds[kind]
+        query = db.select(*columns)
+        
+        if kind in ('certificates', 'whois'):
+            query = query.join(Domain, columns[0].table.c.domain_id == Domain.id)
+        
+        if since:
+            query = query.where(time_column >= since)
+        if until:
+            query = query.where(time_column < until)
+        
+        for name, value in (('url_id', url_id), ('domain_id', domain_id)):
+            if value is None:
+                continue
+            if name not in monitor_columns:
+                raise ValueError(f"导出类型 {kind} 不支持按 {name} 过滤")
+            query = query.where(monitor_columns[name] == value)
+        
+        # 按主键顺序输出，便于增量同步
+        query = query.order_by(columns[0].table.c.id)
+        
+        field_names = [column.key for column in columns]
+        return field_names, query
+    
+    @staticmethod
+    def iter_rows(query, batch_size=None):
+        """使用服务端游标（yield_per）逐批读取行元组"""
+        result = db.session.execute(
+            query.execution_options(yield_per=batch_size or DataExporter.BATCH_SIZE)
+        )
+        try:
+            for row in result:
+                yield row
+        finally:
+            result.close()
+    
+    @staticmethod
+    def iter_ndjson(field_names, rows):
+        """按行输出NDJSON"""
+        for row in rows:
+            yield dumps(dict(zip(field_names, row))) + b'\n'
+    
+    @staticmethod
+    def iter_csv(field_names, rows):
+        """输出CSV，按批刷新缓冲区"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(field_names)
+        
+        pending = 0
+        for row in rows:
+            writer.writerow(['' if value is None else
+                             value.isoformat() if isinstance(value, datetime) else value
+                             for value in row])
+            pending += 1
+            if pending >= DataExporter.CSV_FLUSH_ROWS:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate(0)
+                pending = 0
+        
+        remaining = buffer.getvalue()
+        if remaining:
+            yield remaining.encode('utf-8')
+    
+    @staticmethod
+    def iter_gzip(chunks):
+        """对输出流做gzip压缩"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 生成gzip格式
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    @staticmethod
+    def stream(kind, fmt='ndjson', gzip=False, **filters):
+        """
+        生成导出内容的字节流
+        :param kind: url_checks / domains / certificates / whois
+        :param fmt: ndjson / csv
+        :param gzip: 是否gzip压缩
+        :param filters: since, until, url_id, domain_id
+        """
+        if fmt not in DataExporter.FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        
+        field_names, query = DataExporter.build_query(kind, **filters)
+        rows = DataExporter.iter_rows(query)
+        
+        if fmt == 'csv':
+            chunks = DataExporter.iter_csv(field_names, rows)
+        else:
+            chunks = DataExporter.iter_ndjson(field_names, rows)
+        
+        if gzip:
+            chunks = DataExporter.iter_gzip(chunks)
+        
+        return chunks
@@ -1,17 +1,16 @@
-import smtplib
-import requests
 import json
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from app.models.notification import Notification, NotificationConfig
 from app import db
+from app.utils.metrics import NOTIFICATIONS_TOTAL
 from flask import current_app
 
 class Notifier:
     @staticmethod
     def send_webhook_notification(message, webhook_url):
         """发送Webhook通知"""
+        import requests
+        
         try:
             payload = {
                 "text": message,
@@ -25,14 +24,19 @@ class Notifier:
                 timeout=10
             )
             
-            return response.status_code == 200
+            success = response.status_code == 200
+            NOTIFICATIONS_TOTAL.inc(channel='webhook', result='success' if success else 'failure')
+            return success
         except Exception as e:
+            NOTIFICATIONS_TOTAL.inc(channel='webhook', result='error')
             print(f"发送Webhook通知失败: {str(e)}")
             return False
     
     @staticmethod
     def send_wechat_bot_notification(message, bot_key):
         """发送企业微信机器人通知"""
+        import requests
+        
         try:
             webhook_url = f"https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key={bot_key}"
             
@@ -50,8 +54,11 @@ class Notifier:
                 timeout=10
             )
             
-            return response.status_code == 200
+            success = response.status_code == 200
+            NOTIFICATIONS_TOTAL.inc(channel='wechat_bot', result='success' if success else 'failure')
+            return success
         except Exception as e:
+            NOTIFICATIONS_TOTAL.inc(channel='wechat_bot', result='error')
             print(f"发送企业微信机器人通知失败: {str(e)}")
             return False
     
@@ -102,6 +109,73 @@ SSL证书到期提醒
         else:
             Notifier.send_notification_to_all_channels(message)
     
+    @staticmethod
+    def send_certificate_change_notification(domain, change):
+        """发送证书变更通知"""
+        change_text = '颁发机构变更' if change.change_type == 'issuer_changed' else '证书更换'
+        if change.is_renewal:
+            change_text += '（已续期）'
+        
+        message = f"""
+SSL证书变更提醒
+域名: {domain.name}
+变更类型: {change_text}
+原颁发机构: {change.old_issuer}
+新颁发机构: {change.new_issuer}
+原到期时间: {change.old_not_after}
+新到期时间: {change.new_not_after}
+新证书指纹: {change.new_fingerprint}
+
+如非计划内的证书更换，请核实服务器配置。
+        """
+        
+        # 保存通知记录
+        notification = Notification(
+            type='cert_changed',
+            domain_id=domain.id,
+            message=message
+        )
+        db.session.add(notification)
+        db.session.commit()
+        
+        # 如果域名配置了特定通知方式，使用该配置；否则发送到所有渠道
+        if domain.notification_config:
+            Notifier.send_notification_to_config(message, domain.notification_config)
+        else:
+            Notifier.send_notification_to_all_channels(message)
+    
+    @staticmethod
+    def send_certificate_drift_notification(domain, endpoints):
+        """发送多IP证书不一致通知"""
+        lines = '\n'.join(
+            f"- {endpoint['address']}: {(endpoint['fingerprint_sha256'] or '无证书')[:16]} 到期 {endpoint['not_after']}"
+            for endpoint in endpoints
+        )
+        
+        message = f"""
+SSL证书不一致提醒
+域名: {domain.name}
+各IP返回的证书:
+{lines}
+
+部分节点返回的证书与其他节点不同，可能有节点仍在使用旧证书。
+        """
+        
+        # 保存通知记录
+        notification = Notification(
+            type='cert_drift',
+            domain_id=domain.id,
+            message=message
+        )
+        db.session.add(notification)
+        db.session.commit()
+        
+        # 如果域名配置了特定通知方式，使用该配置；否则发送到所有渠道
+        if domain.notification_config:
+            Notifier.send_notification_to_config(message, domain.notification_config)
+        else:
+            Notifier.send_notification_to_all_channels(message)
+    
     @staticmethod
     def send_whois_expiry_notification(domain, whois_record):
         """发送WHOIS到期通知"""
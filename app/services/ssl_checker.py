@@ -1,117 +1,397 @@
-import ssl
+import json
+import selectors
 import socket
-from OpenSSL import SSL
-from datetime import datetime
-from app.models.certificate import Certificate
+import threading
+import time
+from datetime import datetime, timedelta
+from app.models.certificate import Certificate, CertificateChange, CertificateEndpoint
 from app.models.domain import Domain
 from app import db
 from app.services.notifier import Notifier
+from app.utils.single_flight import single_flight
+from app.utils.expiry import to_utc
+from app.utils import happy_eyeballs
+from app.utils.metrics import SSL_HANDSHAKE_DURATION, CERT_CHANGES_TOTAL, instrument_check
 from flask import current_app
 
+# OpenSSL 证书校验错误码（X509_V_ERR_*）
+VERIFY_ERRORS = {
+    2: '无法获取颁发者证书',
+    7: '证书签名无效',
+    9: '证书尚未生效',
+    10: '证书已过期',
+    18: '自签名证书',
+    19: '证书链中的根证书不受信任',
+    20: '无法获取本地颁发者证书（证书链不完整或不受信任）',
+    21: '无法验证叶子证书签名',
+    23: '证书已吊销',
+    24: 'CA证书无效',
+    26: '证书用途不符'
+}
+
+_context_lock = threading.Lock()
+_client_context = None
+
+def _get_client_context():
+    """
+    共享的客户端TLS上下文（加载系统信任的根证书）
+    校验回调只记录错误、不中断握手，保证在任何情况下都能取得证书链
+    """
+    global _client_context
+    from OpenSSL import SSL
+    
+    with _context_lock:
+        if _client_context is None:
+            def verify_callback(conn, cert, errnum, depth, ok):
+                if not ok:
+                    conn.get_app_data().append((depth, errnum))
+                return True
+            
+            context = SSL.Context(SSL.TLS_CLIENT_METHOD)
+            context.set_default_verify_paths()
+            context.set_verify(SSL.VERIFY_PEER, verify_callback)
+            _client_context = context
+        return _client_context
+
 class SSLChecker:
     @staticmethod
-    def get_certificate_info(domain_name, port=443):
-        """获取SSL证书信息"""
+    def get_certificate_info(domain_name, port=443, timeout=10, addresses=None):
+        """
+        获取SSL证书信息
+        一次握手取得完整证书链，证书校验与域名匹配在取得证书后单独判断，
+        过期、自签名或域名不匹配的证书同样会返回完整信息
+        :param timeout: 连接与握手共用的截止时间（秒）
+        :param addresses: 已解析的IP地址列表，为空时按域名解析；多个地址时按双栈竞速连接
+        :return: 握手失败时只包含 error；否则包含证书信息、证书链与校验结果，
+                 is_valid 表示证书是否通过校验，address/family 为实际连接的地址与地址族
+        """
+        from OpenSSL import SSL, crypto
+        
+        start_time = time.perf_counter()
+        deadline = start_time + timeout
+        verify_errors = []
         try:
-            context = ssl.create_default_context()
-            with socket.create_connection((domain_name, port), timeout=10) as sock:
-                with context.wrap_socket(sock, server_hostname=domain_name) as ssock:
-                    cert = ssock.getpeercert()
-                    
-                    return {
-                        'issuer': dict(x[0] for x in cert['issuer']),
-                        'subject': dict(x[0] for x in cert['subject']),
-                        'serial_number': cert['serialNumber'],
-                        'not_before': datetime.strptime(cert['notBefore'], '%b %d %H:%M:%S %Y %Z'),
-                        'not_after': datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z'),
-                        'is_valid': True
-                    }
+            with happy_eyeballs.create_connection(domain_name, port, timeout=timeout, addresses=addresses) as sock:
+                address, family = sock.getpeername()[0], happy_eyeballs.family_name(sock)
+                conn = SSL.Connection(_get_client_context(), sock)
+                conn.set_app_data(verify_errors)
+                conn.set_tlsext_host_name(SSLChecker._server_name(domain_name))
+                conn.set_connect_state()
+                SSLChecker._handshake(conn, sock, deadline)
+                # 只取DER编码，证书解析由 CertParser 按指纹缓存
+                chain = [crypto.dump_certificate(crypto.FILETYPE_ASN1, cert) for cert in (conn.get_peer_cert_chain() or [])]
+                leaf = conn.get_peer_certificate()
+                leaf = crypto.dump_certificate(crypto.FILETYPE_ASN1, leaf) if leaf else None
+            SSL_HANDSHAKE_DURATION.observe(time.perf_counter() - start_time, result='success')
         except Exception as e:
+            SSL_HANDSHAKE_DURATION.observe(time.perf_counter() - start_time, result='error')
             return {
-                'error': str(e),
+                'error': str(e) or type(e).__name__,
                 'is_valid': False
             }
+        
+        cert_info = SSLChecker._build_certificate_info(domain_name, leaf, chain, verify_errors)
+        cert_info['address'] = address
+        cert_info['family'] = family
+        return cert_info
+    
+    @staticmethod
+    def _build_certificate_info(domain_name, leaf, chain, verify_errors):
+        """
+        解析握手取得的证书并汇总校验结果
+        :param leaf: 叶子证书的DER编码
+        :param chain: 证书链各证书的DER编码
+        """
+        from app.services.cert_parser import CertParser
+        
+        if leaf is None:
+            return {'error': '服务器未返回证书', 'is_valid': False}
+        
+        record = CertParser.load_certificate(leaf)
+        cert_info = CertParser.describe_certificate(record)
+        cert_info['chain'] = []
+        for der in chain:
+            cert = CertParser.load_certificate(der)
+            cert_info['chain'].append({
+                'subject': cert.subject,
+                'issuer': cert.issuer,
+                'not_after': cert.not_after.isoformat(),
+                'fingerprint_sha256': cert.fingerprint_sha256
+            })
+        
+        reasons = []
+        for _, errnum in sorted(verify_errors):
+            reason = VERIFY_ERRORS.get(errnum, f'证书校验失败（错误码 {errnum}）')
+            if reason not in reasons:
+                reasons.append(reason)
+        if not CertParser.match_hostname(record.cert_domains, domain_name):
+            reasons.append(f'证书域名与 {domain_name} 不匹配')
+        
+        cert_info['verify_error'] = '；'.join(reasons) or None
+        cert_info['is_valid'] = not reasons
+        return cert_info
+    
+    @staticmethod
+    def _server_name(domain_name):
+        """SNI主机名（国际化域名转换为punycode）"""
+        try:
+            return domain_name.encode('idna')
+        except UnicodeError:
+            return domain_name.encode('ascii', 'ignore')
+    
+    @staticmethod
+    def _handshake(conn, sock, deadline):
+        """在截止时间前完成握手，避免慢速主机逐包拖延超过超时时间"""
+        from OpenSSL import SSL
+        
+        sock.setblocking(False)
+        # 使用 selectors 而不是 select()，文件描述符超过 FD_SETSIZE 时同样可用
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise socket.timeout('SSL握手超时')
+                try:
+                    conn.do_handshake()
+                    return
+                except SSL.WantReadError:
+                    selector.modify(sock, selectors.EVENT_READ)
+                except SSL.WantWriteError:
+                    selector.modify(sock, selectors.EVENT_WRITE)
+                selector.select(remaining)
     
     @staticmethod
+    @single_flight('ssl', lambda domain: domain.id)
+    @instrument_check('ssl')
     def update_certificate_info(domain):
         """更新域名的SSL证书信息"""
-        # 首先创建或更新证书记录，标记为查询中
+        config = current_app.config
         certificate = Certificate.query.filter_by(domain_id=domain.id).first()
-        if not certificate:
-            certificate = Certificate(domain_id=domain.id)
         
-        # 标记为查询中状态
-        certificate.last_checked = datetime.utcnow()
-        certificate.is_valid = False  # 暂时标记为无效，表示正在查询
+        # 执行实际的SSL证书查询，多IP模式下对每个IP分别握手
+        if config['TLS_SCAN_ALL_IPS']:
+            from app.services.tls_scanner import TLSScanner
+            _, cert_info = next(TLSScanner.from_config(config, instrument=False).scan([domain.name]))
+        else:
+            cert_info = SSLChecker.get_certificate_info(domain.name, timeout=config['TLS_HANDSHAKE_TIMEOUT'])
         
-        db.session.add(certificate)
-        db.session.commit()
+        return SSLChecker.apply_certificate_info(domain, cert_info, certificate)
+    
+    @staticmethod
+    def apply_certificate_info(domain, cert_info, certificate=None):
+        """
+        把查询结果写入证书记录
+        以SHA-256指纹判断证书是否变化：未变化时只更新检查时间，变化时记录变更并通知；
+        到期通知只在证书进入即将到期或已过期状态时（或证书更换后）发送一次
+        :param cert_info: get_certificate_info 的返回值
+        :return: 取得证书（无论是否通过校验）返回证书记录，握手失败返回None
+        """
+        if certificate is None:
+            certificate = Certificate.query.filter_by(domain_id=domain.id).first() or Certificate(domain_id=domain.id)
         
-        # 执行实际的SSL证书查询
-        cert_info = SSLChecker.get_certificate_info(domain.name)
+        if 'endpoints' in cert_info:
+            SSLChecker._save_endpoints(domain, cert_info['endpoints'])
         
-        if cert_info.get('is_valid'):
-            # 计算剩余天数 - 修复时区问题
-            not_after = cert_info['not_after']
-            current_time = datetime.utcnow()
+        if not cert_info.get('not_after'):
+            # 记录错误信息
+            certificate.last_checked = datetime.utcnow()
+            certificate.is_valid = False
+            certificate.verify_error = (cert_info.get('error') or '')[:500] or None
             
-            # 如果not_after是naive，将其转换为aware（假设为UTC）
-            if not_after.tzinfo is None:
-                import pytz
-                not_after = pytz.UTC.localize(not_after)
-                current_time = pytz.UTC.localize(current_time)
+            db.session.add(certificate)
+            db.session.commit()
             
-            days_until_expiry = (not_after - current_time).days
+            return None
+        
+        # 到期时间统一按UTC保存，剩余天数在读取时计算
+        not_after = to_utc(cert_info['not_after'])
+        now = datetime.utcnow()
+        fingerprint = cert_info.get('fingerprint_sha256')
+        previous_stage = SSLChecker._expiry_stage(certificate.not_after, certificate.last_checked)
+        fingerprint_changed = certificate.fingerprint_sha256 != fingerprint
+        ip_drift = cert_info.get('ip_drift', False)
+        drift_started = ip_drift and not certificate.ip_drift
+        
+        if (certificate.id is not None and not fingerprint_changed
+                and certificate.is_valid == cert_info['is_valid']
+                and certificate.verify_error == cert_info.get('verify_error')
+                and bool(certificate.ip_drift) == ip_drift):
+            # 证书未变化：一条轻量更新，只刷新检查时间
+            certificate_id = certificate.id
+            db.session.execute(
+                db.update(Certificate)
+                .where(Certificate.id == certificate_id)
+                .values(last_checked=now)
+            )
+            db.session.commit()
+        else:
+            change = SSLChecker._detect_change(domain, certificate, cert_info) if fingerprint_changed else None
             
             # 更新证书信息
             certificate.issuer = str(cert_info['issuer'])
             certificate.subject = str(cert_info['subject'])
             certificate.serial_number = cert_info['serial_number']
-            certificate.not_before = cert_info['not_before']
-            certificate.not_after = cert_info['not_after']
-            certificate.days_until_expiry = days_until_expiry
-            certificate.is_valid = True
-            certificate.last_checked = datetime.utcnow()
+            certificate.not_before = to_utc(cert_info['not_before'])
+            certificate.not_after = not_after
+            certificate.common_name = cert_info.get('common_name')
+            certificate.san_domains = cert_info.get('san_domains')
+            certificate.cert_domains = cert_info.get('cert_domains')
+            certificate.fingerprint_sha256 = fingerprint
+            certificate.key_type = cert_info.get('key_type')
+            certificate.signature_algorithm = cert_info.get('signature_algorithm')
+            certificate.chain = json.dumps(cert_info.get('chain') or [], ensure_ascii=False)
+            certificate.verify_error = cert_info.get('verify_error')
+            certificate.is_valid = cert_info['is_valid']
+            certificate.ip_drift = ip_drift
+            certificate.last_checked = now
             
             db.session.add(certificate)
+            if change is not None:
+                change.certificate = certificate
+                db.session.add(change)
             db.session.commit()
             
-            # 检查是否需要发送通知
-            if certificate.is_expiring_soon:
-                Notifier.send_certificate_expiry_notification(domain, certificate)
-            
-            return certificate
-        else:
-            # 记录错误信息
-            certificate.last_checked = datetime.utcnow()
-            certificate.is_valid = False
+            if change is not None:
+                CERT_CHANGES_TOTAL.inc(change_type=change.change_type)
+                print(f"检测到证书变更 {domain.name}: {change.old_fingerprint[:16]} -> {change.new_fingerprint[:16]}")
+                Notifier.send_certificate_change_notification(domain, change)
             
-            db.session.add(certificate)
-            db.session.commit()
+            if drift_started:
+                print(f"检测到多IP证书不一致 {domain.name}")
+                Notifier.send_certificate_drift_notification(domain, cert_info['endpoints'])
+        
+        # 进入即将到期/已过期状态时通知（已过期的证书同样通知），证书更换后重新判断
+        stage = SSLChecker._expiry_stage(not_after, now)
+        if stage and (fingerprint_changed or stage != previous_stage):
+            Notifier.send_certificate_expiry_notification(domain, certificate)
+        
+        return certificate
+    
+    @staticmethod
+    def _save_endpoints(domain, endpoints):
+        """
+        保存多IP扫描中每个IP的结果（与证书记录在同一事务中提交）
+        结果未变化的IP只更新检查时间，已不在解析结果中的IP被删除
+        """
+        now = datetime.utcnow()
+        existing = {endpoint.ip_address: endpoint
+                    for endpoint in CertificateEndpoint.query.filter_by(domain_id=domain.id)}
+        unchanged_ids = []
+        
+        for item in endpoints:
+            error = (item['error'] or '')[:500] or None
+            endpoint = existing.pop(item['address'], None)
+            if (endpoint is not None and endpoint.fingerprint_sha256 == item['fingerprint_sha256']
+                    and endpoint.is_valid == item['is_valid'] and endpoint.error == error):
+                unchanged_ids.append(endpoint.id)
+                continue
             
+            if endpoint is None:
+                endpoint = CertificateEndpoint(domain_id=domain.id, ip_address=item['address'])
+                db.session.add(endpoint)
+            endpoint.fingerprint_sha256 = item['fingerprint_sha256']
+            endpoint.not_after = to_utc(item['not_after'])
+            endpoint.is_valid = item['is_valid']
+            endpoint.error = error
+            endpoint.last_checked = now
+        
+        if unchanged_ids:
+            db.session.execute(
+                db.update(CertificateEndpoint)
+                .where(CertificateEndpoint.id.in_(unchanged_ids))
+                .values(last_checked=now)
+            )
+        for endpoint in existing.values():
+            db.session.delete(endpoint)
+    
+    @staticmethod
+    def _expiry_stage(not_after, at):
+        """
+        证书在某一时刻的到期状态
+        :return: 'expired' / 'expiring'，正常或未知返回None
+        """
+        if not_after is None or at is None:
+            return None
+        if not_after <= at:
+            return 'expired'
+        if not_after < at + timedelta(days=current_app.config['NOTIFICATION_DAYS_BEFORE']):
+            return 'expiring'
+        return None
+    
+    @staticmethod
+    def _detect_change(domain, certificate, cert_info):
+        """
+        比较旧证书与新证书，生成变更记录
+        首次取得证书（没有旧指纹）不算变更
+        """
+        if not certificate.fingerprint_sha256:
             return None
+        
+        new_issuer = str(cert_info['issuer'])
+        return CertificateChange(
+            domain_id=domain.id,
+            change_type='issuer_changed' if certificate.issuer != new_issuer else 'rotated',
+            old_fingerprint=certificate.fingerprint_sha256,
+            new_fingerprint=cert_info.get('fingerprint_sha256'),
+            old_issuer=certificate.issuer,
+            new_issuer=new_issuer,
+            old_not_after=certificate.not_after,
+            new_not_after=to_utc(cert_info['not_after'])
+        )
 
 def check_all_certificates():
-    """检查所有域名的SSL证书"""
-    from app import create_app
-    app = create_app()
-    with app.app_context():
-        domains = Domain.query.filter_by(is_active=True, check_ssl=True).all()
-        
-        for domain in domains:
-            try:
-                SSLChecker.update_certificate_info(domain)
-            except Exception as e:
-                print(f"检查SSL证书失败 {domain.name}: {str(e)}")
+    """
+    检查所有域名的SSL证书（需在应用上下文中调用）
+    握手由并发扫描器完成，结果在当前线程中逐个写入数据库
+    """
+    from app.services.cluster import cluster
+    from app.services.tls_scanner import TLSScanner
+    
+    config = current_app.config
+    interval = cluster.check_interval('ssl')
+    
+    # 集群模式下只检查归属本进程的域名
+    domains = {domain.id: domain
+               for domain in Domain.query.filter_by(is_active=True, check_ssl=True)
+               if cluster.owns('ssl', domain.id)}
+    if not domains:
+        return
+    
+    # 同一域名有多条证书记录时与单个检查一致，使用最早的一条
+    certificates = {certificate.domain_id: certificate for certificate in
+                    Certificate.query.join(Domain).filter(Domain.is_active == True, Domain.check_ssl == True)
+                    .order_by(Certificate.id.desc())}
+    
+    scanner = TLSScanner.from_config(config)
+    start_time = time.perf_counter()
+    checked = 0
+    succeeded = 0
+    # 每批在扫描前领取本周期的检查，扫描完成后标记完成
+    for domain_ids in cluster.claimed_batches('ssl', list(domains), interval):
+        batch = {domains[domain_id].name: domains[domain_id] for domain_id in domain_ids}
+        try:
+            for domain_name, cert_info in scanner.scan(list(batch)):
+                domain = batch[domain_name]
+                try:
+                    if SSLChecker.apply_certificate_info(domain, cert_info, certificates.get(domain.id)) is not None:
+                        succeeded += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"检查SSL证书失败 {domain_name}: {str(e)}")
+        finally:
+            cluster.complete('ssl', domain_ids)
+        checked += len(domain_ids)
+    
+    if checked:
+        print(f"SSL证书检查完成: {checked} 个域名，成功 {succeeded} 个，"
+              f"耗时 {time.perf_counter() - start_time:.1f} 秒")
 
 def check_single_certificate(domain_id):
-    """检查单个域名的SSL证书"""
-    from app import create_app
-    app = create_app()
-    with app.app_context():
-        domain = Domain.query.get(domain_id)
-        if domain and domain.is_active and domain.check_ssl:
-            try:
-                SSLChecker.update_certificate_info(domain)
-            except Exception as e:
-                print(f"检查SSL证书失败 {domain.name}: {str(e)}")
+    """检查单个域名的SSL证书（需在应用上下文中调用）"""
+    domain = Domain.query.get(domain_id)
+    if domain and domain.is_active and domain.check_ssl:
+        try:
+            SSLChecker.update_certificate_info(domain)
+        except Exception as e:
+            print(f"检查SSL证书失败 {domain.name}: {str(e)}")
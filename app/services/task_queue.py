@@ -0,0 +1,322 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.check_task import CheckTask
+from app.utils.timezone import get_current_beijing_time
+
+UNFINISHED_STATUSES = ('pending', 'running')
+
+class TaskQueue:
+    """基于数据库的持久化检查任务队列"""
+    
+    @staticmethod
+    def find_unfinished(keys):
+        """
+        查找尚未完成的任务
+        :param keys: (check_type, target_id) 列表
+        :return: {(check_type, target_id): job_id}
+        """
+        wanted = set(keys)
+        found = {}
+        target_ids = sorted({target_id for _, target_id in wanted})
+        check_types = sorted({check_type for check_type, _ in wanted})
+        for start in range(0, len(target_ids), 500):
+            rows = db.session.query(CheckTask.check_type, CheckTask.target_id, CheckTask.job_id).filter(
+                CheckTask.status.in_(UNFINISHED_STATUSES),
+                CheckTask.check_type.in_(check_types),
+                CheckTask.target_id.in_(target_ids[start:start + 500])
+            )
+            for check_type, target_id, job_id in rows:
+                if (check_type, target_id) in wanted:
+                    found.setdefault((check_type, target_id), job_id)
+        return found
+    
+    @staticmethod
+    def enqueue(keys, job_id, interval=0):
+        """
+        批量写入任务
+        已有未完成任务的检查项（其他进程同时写入）由 active_key 唯一约束拒绝并跳过
+        :param interval: 相邻任务最早执行时间的间隔（秒），用于分散执行
+        :return: 实际写入的检查项键列表
+        """
+        now = datetime.utcnow()
+        max_attempts = current_app.config['TASK_MAX_ATTEMPTS']
+        rows = [{
+            'job_id': job_id,
+            'check_type': check_type,
+            'target_id': target_id,
+            'status': 'pending',
+            'active_key': CheckTask.make_active_key(check_type, target_id),
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'next_run_at': now + timedelta(seconds=index * interval),
+            'created_at': now
+        } for index, (check_type, target_id) in enumerate(keys)]
+        if not rows:
+            return []
+        
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(CheckTask), rows)
+            inserted = list(keys)
+        except IntegrityError:
+            # 部分检查项已被其他进程写入，逐个写入并跳过冲突项
+            inserted = []
+            for key, row in zip(keys, rows):
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(db.insert(CheckTask), [row])
+                except IntegrityError:
+                    continue
+                inserted.append(key)
+        db.session.commit()
+        return inserted
+    
+    @staticmethod
+    def claim(worker_id, limit):
+        """
+        批量领取到期的任务并加租约
+        :return: 领取到的任务列表
+        """
+        now = datetime.utcnow()
+        due = db.and_(CheckTask.status == 'pending', CheckTask.next_run_at <= now)
+        
+        task_ids = [task_id for (task_id,) in db.session.query(CheckTask.id)
+                    .filter(due).order_by(CheckTask.next_run_at, CheckTask.id).limit(limit)]
+        if not task_ids:
+            return []
+        
+        # 条件更新，避免与其他工作进程重复领取
+        db.session.execute(
+            db.update(CheckTask)
+            .where(CheckTask.id.in_(task_ids), due)
+            .values(
+                status='running',
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=current_app.config['TASK_LEASE_SECONDS']),
+                attempts=CheckTask.attempts + 1,
+                started_at=now
+            )
+        )
+        db.session.commit()
+        
+        return CheckTask.query.filter(
+            CheckTask.id.in_(task_ids),
+            CheckTask.status == 'running',
+            CheckTask.lease_owner == worker_id
+        ).all()
+    
+    @staticmethod
+    def heartbeat(worker_id, task_ids):
+        """为仍在执行的任务续约"""
+        if not task_ids:
+            return
+        db.session.execute(
+            db.update(CheckTask)
+            .where(CheckTask.id.in_(list(task_ids)), CheckTask.status == 'running',
+                   CheckTask.lease_owner == worker_id)
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=current_app.config['TASK_LEASE_SECONDS']))
+        )
+        db.session.commit()
+    
+    @staticmethod
+    def complete(task_id, worker_id, result, error=None):
+        """
+        记录任务结果，失败时按指数退避重试
+        :param result: run_check 的返回值，True 完成，None 跳过，False 失败
+        """
+        task = CheckTask.query.filter_by(id=task_id, status='running', lease_owner=worker_id).first()
+        if task is None:
+            # 租约已过期并被回收，结果以新的执行为准
+            return
+        
+        now = datetime.utcnow()
+        task.lease_owner = None
+        task.lease_expires_at = None
+        if result is None and error is None:
+            task.status = 'skipped'
+            task.finished_at = now
+        elif result:
+            task.status = 'done'
+            task.last_error = None
+            task.finished_at = now
+        else:
+            task.last_error = error or '检查失败'
+            if task.attempts >= task.max_attempts:
+                task.status = 'failed'
+                task.finished_at = now
+            else:
+                task.status = 'pending'
+                task.next_run_at = now + TaskQueue.retry_delay(task.attempts)
+        if task.is_finished:
+            # 释放唯一键，之后可以再次提交同一检查项
+            task.active_key = None
+        db.session.commit()
+    
+    @staticmethod
+    def retry_delay(attempts):
+        """第 attempts 次失败后的重试等待时间"""
+        base = current_app.config['TASK_RETRY_BACKOFF']
+        return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 3600))
+    
+    @staticmethod
+    def reclaim_expired():
+        """
+        回收租约过期的任务（工作进程崩溃或失联）
+        仍有重试次数的重新排队，否则标记为失败
+        """
+        now = datetime.utcnow()
+        expired = db.and_(CheckTask.status == 'running', CheckTask.lease_expires_at < now)
+        failed = db.session.execute(
+            db.update(CheckTask)
+            .where(expired, CheckTask.attempts >= CheckTask.max_attempts)
+            .values(status='failed', active_key=None, lease_owner=None, lease_expires_at=None,
+                    last_error='执行超时或工作进程中断', finished_at=now)
+        ).rowcount
+        requeued = db.session.execute(
+            db.update(CheckTask)
+            .where(expired)
+            .values(status='pending', lease_owner=None, lease_expires_at=None,
+                    last_error='执行超时或工作进程中断', next_run_at=now)
+        ).rowcount
+        db.session.commit()
+        if failed or requeued:
+            print(f"回收过期任务: 重新排队 {requeued} 个，失败 {failed} 个")
+        return requeued + failed
+    
+    @staticmethod
+    def cleanup_stale_whois():
+        """清理长时间停留在“查询中”的WHOIS记录（查询过程中进程退出留下的标记）"""
+        from app.models.notification import WhoisRecord
+        
+        timeout = current_app.config['WHOIS_QUERYING_TIMEOUT']
+        # last_checked 以北京时间（不带时区）保存
+        deadline = get_current_beijing_time().replace(tzinfo=None) - timedelta(seconds=timeout)
+        count = WhoisRecord.query.filter(
+            WhoisRecord.whois_server == 'querying',
+            WhoisRecord.last_checked < deadline
+        ).update({
+            'whois_server': 'error',
+            'is_valid': False,
+            'error_message': '查询中断，等待下次检查'
+        }, synchronize_session=False)
+        db.session.commit()
+        if count:
+            print(f"清理未完成的WHOIS查询标记: {count} 条")
+        return count
+    
+    @staticmethod
+    def purge_finished():
+        """删除超过保留时间的已完成任务"""
+        deadline = datetime.utcnow() - timedelta(hours=current_app.config['TASK_RETENTION_HOURS'])
+        count = CheckTask.query.filter(
+            CheckTask.status.in_(('done', 'failed', 'skipped')),
+            CheckTask.finished_at < deadline
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+class TaskWorker:
+    """
+    任务队列工作线程
+    批量领取到期任务交给后台执行器执行，定期续约、回收过期租约并清理残留状态
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.worker_id = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._running = set()  # 本进程持有租约的任务ID
+        self._last_heartbeat = 0
+        self._last_maintenance = 0
+    
+    def start(self, app):
+        """启动工作线程，同一进程内只启动一次"""
+        if self._thread is not None:
+            return
+        self.app = app
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._thread = threading.Thread(target=self._loop, name='check-task-worker', daemon=True)
+        self._thread.start()
+        print(f"任务队列工作线程已启动: {self.worker_id}")
+    
+    def wake(self):
+        """有新任务时立即唤醒工作线程"""
+        self._wake.set()
+    
+    def _loop(self):
+        with self.app.app_context():
+            poll_interval = self.app.config['TASK_POLL_INTERVAL']
+            while True:
+                claimed = 0
+                try:
+                    claimed = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"任务队列处理失败: {str(e)}")
+                finally:
+                    db.session.remove()
+                if not claimed:
+                    self._wake.wait(poll_interval)
+                    self._wake.clear()
+    
+    def run_once(self):
+        """
+        执行一轮维护与领取
+        :return: 本轮领取的任务数
+        """
+        from app import executor
+        
+        config = self.app.config
+        now = time.monotonic()
+        
+        if now - self._last_maintenance >= config['TASK_MAINTENANCE_INTERVAL']:
+            self._last_maintenance = now
+            TaskQueue.reclaim_expired()
+            TaskQueue.cleanup_stale_whois()
+            TaskQueue.purge_finished()
+        
+        with self._lock:
+            running = set(self._running)
+        if running and now - self._last_heartbeat >= config['TASK_LEASE_SECONDS'] / 3:
+            self._last_heartbeat = now
+            TaskQueue.heartbeat(self.worker_id, running)
+        
+        free = config['TASK_CLAIM_BATCH'] - len(running)
+        if free <= 0:
+            return 0
+        
+        tasks = TaskQueue.claim(self.worker_id, free)
+        for task in tasks:
+            with self._lock:
+                self._running.add(task.id)
+            executor.submit_blocking(self._execute, task.id, task.check_type, task.target_id)
+        return len(tasks)
+    
+    def _execute(self, task_id, check_type, target_id):
+        """在后台执行器中执行单个任务"""
+        from app.services.check_jobs import run_check
+        
+        result = None
+        error = None
+        try:
+            result = run_check(check_type, target_id)
+        except Exception as e:
+            error = str(e)
+            print(f"检查任务失败 {check_type}:{target_id}: {error}")
+        try:
+            TaskQueue.complete(task_id, self.worker_id, result, error)
+        finally:
+            with self._lock:
+                self._running.discard(task_id)
+            self._wake.set()
+
+task_worker = TaskWorker()
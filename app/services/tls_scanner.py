@@ -0,0 +1,157 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.ssl_checker import SSLChecker
+from app.utils.metrics import CHECK_DURATION, CHECKS_TOTAL
+
+class TLSScanner:
+    """
+    并发TLS扫描器
+    先并发解析域名，再按IP轮流提交握手：同一IP的并发握手数受限，
+    每次握手有独立的截止时间，少数无响应的主机不会拖慢整体扫描。
+    默认在域名的 A/AAAA 记录之间双栈竞速连接，取最先连通的地址；
+    all_ips 模式下对每个地址分别握手（带SNI），用于发现负载均衡后仍在使用旧证书的节点
+    """
+    
+    def __init__(self, workers=50, per_ip=4, timeout=10, port=443, all_ips=False, max_ips=16, instrument=True):
+        self.workers = max(int(workers), 1)
+        self.per_ip = max(int(per_ip), 1)
+        self.timeout = timeout
+        self.port = port
+        self.all_ips = all_ips
+        self.max_ips = max(int(max_ips), 1)
+        self.instrument = instrument  # 是否记录检查指标（调用方已统计时传入False）
+        self._lock = threading.Lock()
+        self._ip_slots = {}  # IP -> 并发握手信号量
+    
+    @classmethod
+    def from_config(cls, config, **options):
+        """按应用配置创建扫描器，options 覆盖对应参数"""
+        params = {
+            'workers': config['TLS_SCAN_WORKERS'],
+            'per_ip': config['TLS_SCAN_PER_IP'],
+            'timeout': config['TLS_HANDSHAKE_TIMEOUT'],
+            'all_ips': config['TLS_SCAN_ALL_IPS'],
+            'max_ips': config['TLS_SCAN_MAX_IPS']
+        }
+        params.update(options)
+        return cls(**params)
+    
+    def scan(self, domain_names):
+        """
+        扫描域名证书，按完成顺序返回结果
+        :return: 生成器，产出 (域名, get_certificate_info 格式的结果)；
+                 all_ips 模式下结果另含 endpoints（每个IP的结果）与 ip_drift（各IP证书不一致）
+        """
+        names = list(OrderedDict.fromkeys(domain_names))
+        if not names:
+            return
+        
+        # 先解析，握手线程池按握手目标数（多IP模式下每个IP一个目标）而不是域名数确定大小
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(names)), thread_name_prefix='tls-resolve') as pool:
+            resolved = dict(zip(names, pool.map(self._resolve, names)))
+        tasks = self._interleave(resolved)
+        
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks)), thread_name_prefix='tls-scan') as pool:
+            futures = {pool.submit(self._scan_one, name, target, error): (name, target)
+                       for name, target, error in tasks}
+            
+            pending = {name: len(targets) or 1 for name, (targets, _) in resolved.items()}
+            results = {name: {} for name in names}
+            for future in as_completed(futures):
+                name, target = futures[future]
+                started, cert_info = future.result()
+                results[name][target] = (started, cert_info)
+                pending[name] -= 1
+                if pending[name] == 0:
+                    yield name, self._merge(resolved[name][0], results.pop(name))
+    
+    def _resolve(self, domain_name):
+        """
+        解析域名
+        :return: (握手目标列表, 错误信息)，每个目标是一组IP地址：
+                 all_ips 模式下每个地址单独作为目标，否则所有地址组成一个双栈竞速目标
+        """
+        try:
+            infos = socket.getaddrinfo(domain_name, self.port, type=socket.SOCK_STREAM)
+        except (OSError, UnicodeError) as e:
+            return [], str(e)
+        addresses = list(OrderedDict.fromkeys(info[4][0] for info in infos))[:self.max_ips]
+        if self.all_ips:
+            return [(address,) for address in addresses], None
+        return ([tuple(addresses)] if addresses else []), None
+    
+    @staticmethod
+    def _interleave(resolved):
+        """
+        按IP轮流排列握手任务（以目标的首个地址分组），避免同一IP的域名集中提交后占满线程池
+        :return: [(域名, 握手目标, 解析错误)]
+        """
+        groups = OrderedDict()
+        for name, (targets, error) in resolved.items():
+            for target in targets or [None]:
+                groups.setdefault(target and target[0], []).append((name, target, error))
+        
+        ordered = []
+        queues = [iter(tasks) for tasks in groups.values()]
+        while queues:
+            remaining = []
+            for queue in queues:
+                task = next(queue, None)
+                if task is not None:
+                    ordered.append(task)
+                    remaining.append(queue)
+            queues = remaining
+        return ordered
+    
+    def _ip_slot(self, address):
+        with self._lock:
+            slot = self._ip_slots.get(address)
+            if slot is None:
+                slot = self._ip_slots[address] = threading.BoundedSemaphore(self.per_ip)
+            return slot
+    
+    def _scan_one(self, domain_name, target, error):
+        """
+        在线程池中对单个目标握手
+        :return: (开始时间, 握手结果)
+        """
+        started = time.perf_counter()
+        if target is None:
+            return started, {'error': f'域名解析失败: {error}', 'is_valid': False}
+        
+        with self._ip_slot(target[0]):
+            return started, SSLChecker.get_certificate_info(
+                domain_name, self.port, timeout=self.timeout, addresses=target
+            )
+    
+    def _merge(self, targets, results):
+        """
+        汇总同一域名各IP的握手结果并记录检查指标
+        以到期时间最早的证书作为域名的证书，避免旧证书被其他节点的新证书掩盖
+        """
+        started = min(started for started, _ in results.values())
+        ordered = [(target, results[target][1]) for target in (targets or [None])]
+        
+        captured = [cert_info for _, cert_info in ordered if cert_info.get('not_after')]
+        if captured:
+            merged = dict(min(captured, key=lambda cert_info: cert_info['not_after']))
+        else:
+            merged = dict(ordered[0][1])
+        
+        if self.all_ips and targets:
+            merged['endpoints'] = [{
+                'address': target[0],
+                'fingerprint_sha256': cert_info.get('fingerprint_sha256'),
+                'not_after': cert_info.get('not_after'),
+                'is_valid': cert_info.get('is_valid', False),
+                'error': cert_info.get('verify_error') or cert_info.get('error')
+            } for target, cert_info in ordered]
+            merged['ip_drift'] = len({cert_info['fingerprint_sha256'] for cert_info in captured}) > 1
+        
+        if self.instrument:
+            CHECK_DURATION.observe(time.perf_counter() - started, check_type='ssl')
+            CHECKS_TOTAL.inc(check_type='ssl', result='success' if merged.get('is_valid') else 'failure')
+        return merged
@@ -7,11 +7,14 @@ from app.models.url import URL
 from app.models.notification import URLCheck
 from app.services.notifier import Notifier
 from app.utils.timezone import get_current_beijing_time
+from app.utils.single_flight import single_flight
+from app.utils.metrics import URL_CHECK_LAG, instrument_check
 
 class URLChecker:
     """URL监控检查器，参考Uptime Kuma功能"""
     
     @staticmethod
+    @single_flight('url', lambda url_id: url_id)
     def check_single_url(url_id):
         """检查单个URL"""
         try:
@@ -52,28 +55,37 @@ class URLChecker:
                 Notifier.send_url_down_notification(url_obj, check_record)
             
             return check_record
-            
+        
         except Exception as e:
             print(f"检查URL失败 {url_id}: {str(e)}")
             return None
-
+    
     @staticmethod
     def check_all_urls():
         """检查所有活跃的URL"""
+        from app.services.cluster import cluster
+        
         urls = URL.query.filter_by(is_active=True).all()
         for url_obj in urls:
+            if not cluster.owns('url', url_obj.id):
+                continue
             try:
                 URLChecker.check_single_url(url_obj.id)
             except Exception as e:
                 print(f"检查URL失败 {url_obj.name}: {str(e)}")
-
+    
     @staticmethod
     def check_urls_by_interval():
         """根据检查间隔检查需要检查的URL"""
+        from app.services.cluster import cluster
+        
         now = get_current_beijing_time()
         urls = URL.query.filter_by(is_active=True).all()
         
         for url_obj in urls:
+            # 集群模式下只处理归属本进程的URL
+            if not cluster.owns('url', url_obj.id):
+                continue
             try:
                 # 获取最后一次检查时间
                 latest_check = URLCheck.query.filter_by(url_id=url_obj.id).order_by(URLCheck.checked_at.desc()).first()
@@ -99,17 +111,27 @@ class URLChecker:
                     # 如果超过检查间隔，则需要检查
                     if minutes_diff >= url_obj.check_interval:
                         should_check = True
+                        # 记录到期后延迟开始检查的时间
+                        URL_CHECK_LAG.observe((minutes_diff - url_obj.check_interval) * 60)
+                
+                # 同一检查周期在集群内只执行一次
+                if should_check and not cluster.claim('url', url_obj.id, url_obj.check_interval * 60):
+                    continue
                 
                 if should_check:
                     print(f"检查URL: {url_obj.name} (间隔: {url_obj.check_interval}分钟)")
-                    URLChecker.check_single_url(url_obj.id)
+                    try:
+                        URLChecker.check_single_url(url_obj.id)
+                    finally:
+                        cluster.complete('url', [url_obj.id])
                 else:
                     print(f"跳过URL: {url_obj.name} (距离下次检查还有 {url_obj.check_interval - minutes_diff:.1f}分钟)")
-                    
+            
             except Exception as e:
                 print(f"检查URL失败 {url_obj.name}: {str(e)}")
     
     @staticmethod
+    @instrument_check('url', is_success=lambda result: result['is_available'])
     def _perform_check(url_obj):
         """执行URL检查"""
         result = {
@@ -209,7 +231,7 @@ class URLChecker:
                         continue
                     else:
                         break
-                        
+            
             except requests.exceptions.SSLError as e:
                 result['error_message'] = f"SSL证书错误: {str(e)}"
                 result['ssl_valid'] = False
@@ -217,21 +239,21 @@ class URLChecker:
                     time.sleep(1)
                     continue
                 break
-                
+            
             except requests.exceptions.Timeout as e:
                 result['error_message'] = f"请求超时: {str(e)}"
                 if attempt < url_obj.retry_count:
                     time.sleep(1)
                     continue
                 break
-                
+            
             except requests.exceptions.ConnectionError as e:
                 result['error_message'] = f"连接错误: {str(e)}"
                 if attempt < url_obj.retry_count:
                     time.sleep(1)
                     continue
                 break
-                
+            
             except Exception as e:
                 result['error_message'] = f"请求失败: {str(e)}"
                 if attempt < url_obj.retry_count:
@@ -315,7 +337,7 @@ class URLChecker:
         
         db.session.add(url_check)
         db.session.commit()
-
+    
     @staticmethod
     def _send_notification(url_obj, check_result):
         """发送URL监控通知"""
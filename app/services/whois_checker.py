@@ -1,18 +1,31 @@
 import socket
 import re
 import os
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from flask import current_app
 from app.models.notification import WhoisRecord
 from app.models.domain import Domain
 from app import db
 from app.services.notifier import Notifier
 from app.utils.timezone import get_current_beijing_time
+from app.utils.single_flight import single_flight
+from app.utils.expiry import to_utc
+from app.utils import happy_eyeballs
+from app.utils.rate_limit import whois_rate_limiter
+from app.utils.metrics import WHOIS_QUERIES_TOTAL, WHOIS_QUERY_DURATION, instrument_check
+
+class QueryCancelled(Exception):
+    """对冲查询中其他服务器已返回结果，本次查询被取消"""
 
 class WhoisChecker:
     # 查询配置
     MAX_SERVERS_TO_TRY = 5  # 最多尝试5个服务器
     SOCKET_TIMEOUT = 15     # Socket超时时间（秒）
-    QUERY_TIMEOUT = 60      # 整体查询超时时间（秒）- 最多1分钟
+    QUERY_TIMEOUT = 60      # 整体查询超时时间（秒）- 最多1分钟，作为所有服务器查询共用的截止时间
+    CANCEL_POLL_INTERVAL = 0.5  # 对冲查询中读取响应时检查取消标记的间隔（秒）
     
     # 自定义WHOIS服务器映射
     DIY_WHOIS_SERVERS = {
@@ -144,23 +157,39 @@ class WhoisChecker:
     def query_iana_whois_server(domain_suffix, whois_register='whois.iana.org'):
         """查询IANA获取WHOIS服务器"""
         try:
-            test_domain = f"example{domain_suffix}"
-            response = WhoisChecker.query_whois_server(test_domain, whois_register)
-            
-            # 解析IANA响应
-            if isinstance(response, dict) and 'raw_data' in response:
-                whois_data = response['raw_data']
-            else:
-                whois_data = str(response)
-            
-            refer_match = re.search(r'refer:\s*(.*?)\s*(?=\w+:|$)', whois_data, re.IGNORECASE | re.MULTILINE)
-            if refer_match:
-                return refer_match.group(1).strip()
+            return WhoisChecker.fetch_iana_referral(domain_suffix.lstrip('.'), whois_register)
         except Exception as e:
             print(f"Query IANA Whois Server Exception: {e}")
         
         return None
     
+    @staticmethod
+    def fetch_iana_referral(suffix, whois_register='whois.iana.org'):
+        """
+        向IANA查询域名后缀的WHOIS服务器
+        :param suffix: 不含开头点的后缀，例如 com、co.uk
+        :return: WHOIS服务器，IANA没有返回 refer 时为None
+        :raises OSError: 连接或读取失败、限速等待超时（调用方据此区分查询失败与没有服务器）
+        """
+        deadline = time.monotonic() + WhoisChecker.QUERY_TIMEOUT
+        if not whois_rate_limiter.acquire(whois_register, deadline):
+            WHOIS_QUERIES_TOTAL.inc(server=whois_register, result='throttled')
+            raise OSError(f"等待 {whois_register} 限速令牌超时")
+        
+        start_time = time.perf_counter()
+        try:
+            whois_data = WhoisChecker._read_whois_response(f"example.{suffix}", whois_register, deadline=deadline)
+        except OSError:
+            WHOIS_QUERIES_TOTAL.inc(server=whois_register, result='failure')
+            raise
+        WHOIS_QUERY_DURATION.observe(time.perf_counter() - start_time, server=whois_register)
+        WHOIS_QUERIES_TOTAL.inc(server=whois_register, result='success')
+        
+        refer_match = re.search(r'^refer:\s*(\S+)', whois_data, re.IGNORECASE | re.MULTILINE)
+        if refer_match:
+            return refer_match.group(1).strip().lower()
+        return None
+    
     @staticmethod
     def get_whois_servers(domain_name):
         """获取域名对应的WHOIS服务器列表"""
@@ -175,8 +204,9 @@ class WhoisChecker:
         if suffix_key in WhoisChecker.DIY_WHOIS_SERVERS:
             servers.extend(WhoisChecker.DIY_WHOIS_SERVERS[suffix_key])
         
-        # 查询IANA获取官方服务器
-        iana_server = WhoisChecker.query_iana_whois_server(suffix_key)
+        # IANA登记的官方服务器（按后缀缓存，过期后在后台刷新，不再每次查询IANA）
+        from app.services.whois_referrals import whois_referrals
+        iana_server = whois_referrals.lookup(domain_suffix)
         if iana_server and iana_server not in servers:
             servers.append(iana_server)
         
@@ -195,33 +225,37 @@ class WhoisChecker:
         return unique_servers[:WhoisChecker.MAX_SERVERS_TO_TRY]
     
     @staticmethod
-    def query_whois_server(domain_name, server, port=43, timeout=None):
+    def query_whois_server(domain_name, server, port=43, timeout=None, deadline=None, cancel=None, rate_limited=True):
+        """
+        查询特定的WHOIS服务器（记录每个服务器的成功率与耗时）
+        :param deadline: time.monotonic() 截止时间，连接、读取与等待限速令牌都不会超过该时间
+        :param cancel: threading.Event，被设置时尽快放弃查询（结果带 cancelled 标记）
+        :param rate_limited: 是否先取得服务器的限速令牌，调用方已取得令牌时传入False
+        """
+        if rate_limited and not whois_rate_limiter.acquire(server, deadline, cancel):
+            cancelled = cancel is not None and cancel.is_set()
+            WHOIS_QUERIES_TOTAL.inc(server=server, result='cancelled' if cancelled else 'throttled')
+            return {
+                'error': f"查询已取消" if cancelled else f"查询失败",
+                'is_valid': False,
+                'server': server,
+                'cancelled': cancelled
+            }
+        
+        start_time = time.perf_counter()
+        result = WhoisChecker._query_whois_server(domain_name, server, port, timeout, deadline, cancel)
+        if result.get('cancelled'):
+            WHOIS_QUERIES_TOTAL.inc(server=server, result='cancelled')
+            return result
+        WHOIS_QUERY_DURATION.observe(time.perf_counter() - start_time, server=server)
+        WHOIS_QUERIES_TOTAL.inc(server=server, result='success' if result.get('is_valid') else 'failure')
+        return result
+    
+    @staticmethod
+    def _query_whois_server(domain_name, server, port=43, timeout=None, deadline=None, cancel=None):
         """查询特定的WHOIS服务器"""
-        if timeout is None:
-            timeout = WhoisChecker.SOCKET_TIMEOUT
-            
         try:
-            # 创建socket连接
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            sock.connect((server, port))
-            
-            # 发送查询
-            query = f"{domain_name}\r\n".encode('utf-8')
-            sock.send(query)
-            
-            # 接收响应
-            response = b""
-            while True:
-                data = sock.recv(4096)
-                if not data:
-                    break
-                response += data
-            
-            sock.close()
-            
-            # 解码响应
-            whois_data = response.decode('utf-8', errors='ignore')
+            whois_data = WhoisChecker._read_whois_response(domain_name, server, port, timeout, deadline, cancel)
             
             # 检查是否包含有效信息
             if not WhoisChecker.is_valid_whois_response(whois_data):
@@ -233,7 +267,14 @@ class WhoisChecker:
             
             # 解析WHOIS数据
             return WhoisChecker.parse_whois_response(whois_data, server)
-            
+        
+        except QueryCancelled:
+            return {
+                'error': f"查询已取消",
+                'is_valid': False,
+                'server': server,
+                'cancelled': True
+            }
         except socket.timeout:
             return {
                 'error': f"查询失败",
@@ -247,6 +288,54 @@ class WhoisChecker:
                 'server': server
             }
     
+    @staticmethod
+    def _read_whois_response(query, server, port=43, timeout=None, deadline=None, cancel=None):
+        """
+        发送WHOIS查询并读取完整响应文本
+        timeout 为连接及两次收到数据之间的最长等待时间；deadline（time.monotonic()）为整个查询的截止时间，
+        服务器持续缓慢返回数据时也不会超过截止时间
+        """
+        if timeout is None:
+            timeout = WhoisChecker.SOCKET_TIMEOUT
+        
+        def remaining(limit):
+            if cancel is not None and cancel.is_set():
+                raise QueryCancelled(server)
+            if deadline is not None:
+                limit = min(limit, deadline - time.monotonic())
+            if limit <= 0:
+                raise socket.timeout(f'查询 {server} 超过截止时间')
+            return limit
+        
+        # 双栈竞速连接，IPv6 路由故障时不必等待超时再尝试 IPv4
+        with happy_eyeballs.create_connection(server, port, timeout=remaining(timeout)) as sock:
+            sock.settimeout(remaining(timeout))
+            
+            # 发送查询
+            sock.sendall(f"{query}\r\n".encode('utf-8'))
+            
+            # 接收响应；可取消时分段等待，以便及时发现取消标记
+            response = b""
+            idle_deadline = time.monotonic() + timeout
+            while True:
+                wait_time = remaining(idle_deadline - time.monotonic())
+                if cancel is not None:
+                    wait_time = min(wait_time, WhoisChecker.CANCEL_POLL_INTERVAL)
+                sock.settimeout(wait_time)
+                try:
+                    data = sock.recv(4096)
+                except socket.timeout:
+                    if time.monotonic() < idle_deadline:
+                        continue
+                    raise
+                if not data:
+                    break
+                response += data
+                idle_deadline = time.monotonic() + timeout
+        
+        # 解码响应
+        return response.decode('utf-8', errors='ignore')
+    
     @staticmethod
     def is_valid_whois_response(whois_data):
         """检查WHOIS响应是否包含有效信息"""
@@ -402,7 +491,7 @@ class WhoisChecker:
                 'server': server,
                 'raw_data': whois_data
             }
-            
+        
         except Exception as e:
             return {
                 'error': f"查询失败",
@@ -423,6 +512,8 @@ class WhoisChecker:
             '%Y-%m-%d %H:%M:%S',
             '%Y-%m-%dT%H:%M:%SZ',
             '%Y-%m-%dT%H:%M:%S.%fZ',
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M:%S.%f',
             '%d-%b-%Y',
             '%d-%B-%Y',
             '%d-%m-%Y',
@@ -446,29 +537,45 @@ class WhoisChecker:
         # 清理日期字符串
         date_str = date_str.strip()
         
-        # 移除时区信息
-        date_str = re.sub(r'\s*[+-]\d{4}\s*$', '', date_str)
+        # 移除时区信息：数字时区偏移（如 +0800、-05:00）换算为UTC，时区缩写按UTC处理
+        offset = timedelta(0)
+        match = re.search(r'\s*([+-])(\d{2}):?(\d{2})\s*$', date_str)
+        if match and ':' in date_str[:match.start()]:
+            offset = timedelta(hours=int(match.group(2)), minutes=int(match.group(3)))
+            if match.group(1) == '-':
+                offset = -offset
+            date_str = date_str[:match.start()]
         date_str = re.sub(r'\s*[A-Z]{3,4}\s*$', '', date_str)
         
         for fmt in date_formats:
             try:
-                return datetime.strptime(date_str, fmt)
+                return datetime.strptime(date_str, fmt) - offset
             except ValueError:
                 continue
         
         return None
     
     @staticmethod
-    def get_whois_info(domain_name):
-        """获取WHOIS信息，尝试多个服务器（带超时限制）"""
-        import time
+    def get_whois_info(domain_name, servers=None, hedged=None, token_reserved=False):
+        """
+        获取WHOIS信息，尝试多个服务器（所有查询共用 QUERY_TIMEOUT 截止时间）
+        :param servers: 已确定的服务器列表，提供时不再查询（可在没有应用上下文的线程中调用）
+        :param hedged: 是否对冲查询，默认按 WHOIS_HEDGED 配置
+        :param token_reserved: 调用方已取得第一个服务器的限速令牌（仅用于逐个查询）
+        """
+        if servers is None:
+            servers = WhoisChecker.get_whois_servers(domain_name)
+        if hedged is None:
+            hedged = current_app.config['WHOIS_HEDGED']
+        deadline = time.monotonic() + WhoisChecker.QUERY_TIMEOUT
         
-        servers = WhoisChecker.get_whois_servers(domain_name)
-        start_time = time.time()
+        if hedged and len(servers) > 1:
+            return WhoisChecker._race_whois_servers(
+                domain_name, servers, deadline, current_app.config['WHOIS_HEDGE_DELAY'])
         
         for i, server in enumerate(servers):
             # 检查整体超时
-            if time.time() - start_time > WhoisChecker.QUERY_TIMEOUT:
+            if time.monotonic() >= deadline:
                 return {
                     'error': f"查询失败",
                     'is_valid': False,
@@ -476,7 +583,8 @@ class WhoisChecker:
                 }
             
             try:
-                result = WhoisChecker.query_whois_server(domain_name, server)
+                result = WhoisChecker.query_whois_server(domain_name, server, deadline=deadline,
+                                                         rate_limited=not (token_reserved and i == 0))
                 if result.get('is_valid') and result.get('expiration_date'):
                     return result
             except Exception as e:
@@ -490,6 +598,115 @@ class WhoisChecker:
         }
     
     @staticmethod
+    def _race_whois_servers(domain_name, servers, deadline, delay):
+        """
+        对冲查询多个WHOIS服务器
+        先查询排序最靠前的服务器，每隔 delay 秒（或进行中的查询失败时立即）启动下一个服务器，
+        第一个返回有效到期时间的结果胜出，其余查询随即取消；到达截止时间时不再等待仍在进行的查询
+        """
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix='whois-race')
+        pending = {}  # Future -> 服务器
+        next_index = 0
+        next_start = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                
+                # 到达对冲间隔或当前没有进行中的查询时启动下一个服务器
+                if next_index < len(servers) and (now >= next_start or not pending):
+                    server = servers[next_index]
+                    next_index += 1
+                    next_start = now + delay
+                    future = pool.submit(WhoisChecker.query_whois_server, domain_name, server,
+                                         deadline=deadline, cancel=cancel)
+                    pending[future] = server
+                
+                if not pending:
+                    break
+                
+                waits = [deadline - now]
+                if next_index < len(servers):
+                    waits.append(next_start - now)
+                done, _ = wait(list(pending), timeout=max(min(waits), 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    server = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"查询服务器 {server} 失败: {str(e)}")
+                        result = {}
+                    if result.get('is_valid') and result.get('expiration_date'):
+                        return result
+                    # 查询失败时立即启动下一个服务器，不必等待对冲间隔
+                    next_start = time.monotonic()
+        finally:
+            # 取消其余查询：进行中的查询在下一次读取时放弃，尚未开始的查询不再执行
+            cancel.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        return {
+            'error': f"查询失败",
+            'is_valid': False,
+            'servers_tried': next_index
+        }
+    
+    @staticmethod
+    def apply_whois_info(domain, whois_info, whois_record=None):
+        """
+        保存WHOIS查询结果，到期时间临近时发送通知
+        :return: 查询成功时返回WHOIS记录，否则返回None
+        """
+        if whois_record is None:
+            whois_record = WhoisRecord.query.filter_by(domain_id=domain.id).first() or WhoisRecord(domain_id=domain.id)
+        
+        if whois_info.get('is_valid'):
+            expiration_date = whois_info['expiration_date']
+            if isinstance(expiration_date, list):
+                expiration_date = expiration_date[0]
+            
+            # 更新WHOIS信息（时间统一按UTC保存，剩余天数在读取时计算）
+            whois_record.registrar = whois_info['registrar']
+            whois_record.creation_date = to_utc(whois_info['creation_date'])
+            whois_record.expiration_date = to_utc(expiration_date)
+            whois_record.updated_date = to_utc(whois_info['updated_date'])
+            whois_record.status = str(whois_info['status']) if whois_info['status'] else None
+            whois_record.name_servers = str(whois_info['name_servers']) if whois_info['name_servers'] else None
+            whois_record.last_checked = get_current_beijing_time()
+            whois_record.is_valid = True  # 明确设置为True
+            whois_record.error_message = None  # 清除错误信息
+            
+            # 保存使用的WHOIS服务器信息
+            whois_record.whois_server = whois_info.get('server', 'unknown')
+            
+            db.session.add(whois_record)
+            db.session.commit()
+            
+            # 检查是否需要发送通知
+            if whois_record.is_expiring_soon:
+                # 重新获取domain对象以确保在正确的会话中
+                current_domain = Domain.query.get(domain.id)
+                if current_domain and current_domain.notification_config:
+                    Notifier.send_whois_expiry_notification(current_domain, whois_record)
+            
+            return whois_record
+        else:
+            # 记录错误信息
+            whois_record.last_checked = get_current_beijing_time()
+            whois_record.error_message = whois_info.get('error', '查询失败')
+            whois_record.is_valid = False  # 明确设置为False
+            whois_record.whois_server = whois_info.get('server', 'unknown')
+            
+            db.session.add(whois_record)
+            db.session.commit()
+            
+            return None
+    
+    @staticmethod
+    @single_flight('whois', lambda domain: domain.id)
+    @instrument_check('whois')
     def update_whois_record(domain):
         """更新域名的WHOIS信息"""
         try:
@@ -509,61 +726,8 @@ class WhoisChecker:
             
             # 执行实际的WHOIS查询
             whois_info = WhoisChecker.get_whois_info(domain.name)
-            
-            if whois_info.get('is_valid'):
-                # 计算剩余天数
-                expiration_date = whois_info['expiration_date']
-                if isinstance(expiration_date, list):
-                    expiration_date = expiration_date[0]
-                
-                days_until_expiry = None
-                if expiration_date:
-                    # 确保两个时间都是naive datetime对象进行比较
-                    if expiration_date.tzinfo is not None:
-                        expiration_date = expiration_date.replace(tzinfo=None)
-                    current_time = get_current_beijing_time()
-                    if current_time.tzinfo is not None:
-                        current_time = current_time.replace(tzinfo=None)
-                    days_until_expiry = (expiration_date - current_time).days
-                
-                # 更新WHOIS信息
-                whois_record.registrar = whois_info['registrar']
-                whois_record.creation_date = whois_info['creation_date']
-                whois_record.expiration_date = expiration_date
-                whois_record.updated_date = whois_info['updated_date']
-                whois_record.status = str(whois_info['status']) if whois_info['status'] else None
-                whois_record.name_servers = str(whois_info['name_servers']) if whois_info['name_servers'] else None
-                whois_record.days_until_expiry = days_until_expiry
-                whois_record.last_checked = get_current_beijing_time()
-                whois_record.is_valid = True  # 明确设置为True
-                whois_record.error_message = None  # 清除错误信息
-                
-                # 保存使用的WHOIS服务器信息
-                whois_record.whois_server = whois_info.get('server', 'unknown')
-                
-                db.session.add(whois_record)
-                db.session.commit()
-                
-                # 检查是否需要发送通知
-                if whois_record.is_expiring_soon:
-                    # 重新获取domain对象以确保在正确的会话中
-                    current_domain = Domain.query.get(domain.id)
-                    if current_domain and current_domain.notification_config:
-                        Notifier.send_whois_expiry_notification(current_domain, whois_record)
-                
-                return whois_record
-            else:
-                # 记录错误信息
-                whois_record.last_checked = get_current_beijing_time()
-                whois_record.error_message = whois_info.get('error', '查询失败')
-                whois_record.is_valid = False  # 明确设置为False
-                whois_record.whois_server = whois_info.get('server', 'unknown')
-                
-                db.session.add(whois_record)
-                db.session.commit()
-                
-                return None
-                
+            return WhoisChecker.apply_whois_info(domain, whois_info, whois_record)
+        
         except Exception as e:
             # 确保即使出现异常也能更新状态
             try:
@@ -582,105 +746,50 @@ class WhoisChecker:
             return None
 
 def check_all_whois():
-    """检查所有域名的WHOIS信息"""
-    domains = Domain.query.filter_by(is_active=True, check_whois=True).all()
+    """
+    检查所有域名的WHOIS信息（需在应用上下文中调用）
+    查询由批量调度器按WHOIS服务器限速并发完成，结果在当前线程中逐个写入数据库
+    """
+    from app.services.cluster import cluster
+    from app.services.whois_scheduler import WhoisBulkScheduler
     
-    for domain in domains:
+    # 集群模式下只检查归属本进程的域名
+    domains = {domain.id: domain
+               for domain in Domain.query.filter_by(is_active=True, check_whois=True)
+               if cluster.owns('whois', domain.id)}
+    if not domains:
+        return
+    
+    scheduler = WhoisBulkScheduler.from_config(current_app.config)
+    start_time = time.perf_counter()
+    checked = 0
+    succeeded = 0
+    # 每批在查询前领取当天的检查，查询完成后标记完成
+    for domain_ids in cluster.claimed_batches('whois', list(domains), cluster.check_interval('whois')):
+        batch = {domains[domain_id].name: domains[domain_id] for domain_id in domain_ids}
         try:
-            WhoisChecker.update_whois_record(domain)
-        except Exception as e:
-            print(f"检查WHOIS失败 {domain.name}: {str(e)}")
+            # 服务器列表依赖数据库中的WHOIS服务器缓存，在当前线程中预先确定
+            domain_servers = {domain_name: WhoisChecker.get_whois_servers(domain_name) for domain_name in batch}
+            for domain_name, whois_info in scheduler.run(domain_servers):
+                domain = batch[domain_name]
+                try:
+                    if WhoisChecker.apply_whois_info(domain, whois_info) is not None:
+                        succeeded += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"检查WHOIS失败 {domain_name}: {str(e)}")
+        finally:
+            cluster.complete('whois', domain_ids)
+        checked += len(domain_ids)
+    
+    if checked:
+        print(f"WHOIS检查完成: {checked} 个域名，成功 {succeeded} 个，"
+              f"耗时 {time.perf_counter() - start_time:.1f} 秒")
 
 def check_single_whois(domain_id):
     """检查单个域名的WHOIS信息"""
-    try:
-        # 重新获取domain对象，确保在正确的会话中
-        domain = Domain.query.get(domain_id)
-        if domain and domain.is_active and domain.check_whois:
-            # 直接在这里执行WHOIS检查，避免传递domain对象
-            # 首先创建或更新记录，标记为查询中
-            whois_record = WhoisRecord.query.filter_by(domain_id=domain.id).first()
-            if not whois_record:
-                whois_record = WhoisRecord(domain_id=domain.id)
-            
-            # 标记为查询中状态
-            whois_record.last_checked = get_current_beijing_time()
-            whois_record.is_valid = False  # 暂时标记为无效，表示正在查询
-            whois_record.error_message = "查询中..."  # 临时错误信息表示查询中
-            whois_record.whois_server = "querying"
-            
-            db.session.add(whois_record)
-            db.session.commit()
-            
-            # 执行实际的WHOIS查询
-            whois_info = WhoisChecker.get_whois_info(domain.name)
-            
-            if whois_info.get('is_valid'):
-                # 计算剩余天数
-                expiration_date = whois_info['expiration_date']
-                if isinstance(expiration_date, list):
-                    expiration_date = expiration_date[0]
-                
-                days_until_expiry = None
-                if expiration_date:
-                    # 确保两个时间都是naive datetime对象进行比较
-                    if expiration_date.tzinfo is not None:
-                        expiration_date = expiration_date.replace(tzinfo=None)
-                    current_time = get_current_beijing_time()
-                    if current_time.tzinfo is not None:
-                        current_time = current_time.replace(tzinfo=None)
-                    days_until_expiry = (expiration_date - current_time).days
-                
-                # 更新WHOIS信息
-                whois_record.registrar = whois_info['registrar']
-                whois_record.creation_date = whois_info['creation_date']
-                whois_record.expiration_date = expiration_date
-                whois_record.updated_date = whois_info['updated_date']
-                whois_record.status = str(whois_info['status']) if whois_info['status'] else None
-                whois_record.name_servers = str(whois_info['name_servers']) if whois_info['name_servers'] else None
-                whois_record.days_until_expiry = days_until_expiry
-                whois_record.last_checked = get_current_beijing_time()
-                whois_record.is_valid = True  # 明确设置为True
-                whois_record.error_message = None  # 清除错误信息
-                
-                # 保存使用的WHOIS服务器信息
-                whois_record.whois_server = whois_info.get('server', 'unknown')
-                
-                db.session.add(whois_record)
-                db.session.commit()
-                
-                # 检查是否需要发送通知
-                if whois_record.is_expiring_soon:
-                    # 重新获取domain对象以确保在正确的会话中
-                    current_domain = Domain.query.get(domain_id)
-                    if current_domain and current_domain.notification_config:
-                        Notifier.send_whois_expiry_notification(current_domain, whois_record)
-                
-                return whois_record
-            else:
-                # 记录错误信息
-                whois_record.last_checked = get_current_beijing_time()
-                whois_record.error_message = whois_info.get('error', '查询失败')
-                whois_record.is_valid = False  # 明确设置为False
-                whois_record.whois_server = whois_info.get('server', 'unknown')
-                
-                db.session.add(whois_record)
-                db.session.commit()
-                
-                return None
-    except Exception as e:
-        # 确保即使出现异常也能更新状态
-        try:
-            whois_record = WhoisRecord.query.filter_by(domain_id=domain_id).first()
-            if whois_record:
-                whois_record.last_checked = get_current_beijing_time()
-                whois_record.error_message = f"查询异常: {str(e)}"
-                whois_record.is_valid = False
-                whois_record.whois_server = "error"
-                db.session.add(whois_record)
-                db.session.commit()
-        except Exception as db_error:
-            print(f"更新WHOIS记录状态失败: {str(db_error)}")
-        
-        print(f"检查WHOIS失败 {domain_id}: {str(e)}")
-        return None
+    # 重新获取domain对象，确保在正确的会话中
+    domain = Domain.query.get(domain_id)
+    if domain and domain.is_active and domain.check_whois:
+        return WhoisChecker.update_whois_record(domain)
+    return None
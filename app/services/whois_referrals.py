@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db, executor
+from app.models.notification import WhoisReferral
+from app.utils.executor import ExecutorBusyError
+
+# 随程序发布的后缀 -> WHOIS服务器快照（来自IANA），可用 manage_db.py refresh-whois-referrals --export 重新生成
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'whois_referrals.json')
+
+class WhoisReferralCache:
+    """
+    域名后缀 -> IANA登记的WHOIS服务器缓存
+    内存中保存全部后缀（条目很少），数据库表 whois_referral 在多个进程间共享查询结果：
+    - 首次遇到的后缀同步查询IANA，之后在有效期内不再访问IANA；
+    - IANA没有返回服务器时缓存空结果（较短的有效期），避免反复查询；
+    - 条目过期后继续返回旧值，同时提交后台任务刷新，查询路径上不等待IANA；
+    - 启动时先加载随程序发布的快照，快照条目视为已过期，首次使用时在后台刷新
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # 后缀 -> (服务器, 过期时间)
+        self._loaded = False
+        self._refreshing = set()
+    
+    def warm(self):
+        """加载快照与数据库中的缓存条目（数据库条目优先）"""
+        entries = {}
+        expired = datetime.utcnow()
+        for suffix, server in self._read_snapshot().items():
+            entries[suffix] = (server, expired)
+        try:
+            for row in WhoisReferral.query.all():
+                entries[row.suffix] = (row.server, row.expires_at)
+        except Exception as e:
+            # 数据表尚未创建时只使用快照
+            db.session.rollback()
+            print(f"读取WHOIS服务器缓存失败，仅使用内置快照: {e}")
+        with self._lock:
+            self._entries = entries
+            self._loaded = True
+        return len(entries)
+    
+    @staticmethod
+    def _read_snapshot():
+        try:
+            with open(SNAPSHOT_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f).get('servers', {})
+        except (OSError, ValueError) as e:
+            print(f"读取WHOIS服务器快照失败: {e}")
+            return {}
+    
+    def lookup(self, suffix):
+        """
+        后缀对应的WHOIS服务器
+        :param suffix: 不含开头点的后缀，例如 com、co.uk
+        :return: 服务器，IANA没有登记时为None
+        """
+        if not self._loaded:
+            self.warm()
+        suffix = suffix.lower().lstrip('.')
+        now = datetime.utcnow()
+        
+        entry = self._entries.get(suffix)
+        if entry is None or entry[1] <= now:
+            # 内存条目过期时先读数据库，其他进程可能已经刷新
+            try:
+                row = WhoisReferral.query.filter_by(suffix=suffix).first()
+            except Exception as e:
+                db.session.rollback()
+                print(f"读取WHOIS服务器缓存失败 .{suffix}: {e}")
+                row = None
+            if row is not None:
+                entry = (row.server, row.expires_at)
+                self._entries[suffix] = entry
+        
+        if entry is None:
+            return self.refresh(suffix)
+        if entry[1] <= now:
+            self._schedule_refresh(suffix)
+        return entry[0]
+    
+    def _schedule_refresh(self, suffix):
+        """提交后台刷新任务，同一后缀只保留一个进行中的刷新，队列满时下次再刷新"""
+        with self._lock:
+            if suffix in self._refreshing:
+                return
+            self._refreshing.add(suffix)
+        try:
+            executor.submit(self._background_refresh, suffix)
+        except (ExecutorBusyError, RuntimeError):
+            with self._lock:
+                self._refreshing.discard(suffix)
+    
+    def _background_refresh(self, suffix):
+        try:
+            self.refresh(suffix)
+        finally:
+            with self._lock:
+                self._refreshing.discard(suffix)
+    
+    def refresh(self, suffix):
+        """
+        查询IANA并写入缓存
+        查询失败时不覆盖已有的服务器，只把有效期延后一个否定缓存周期，稍后再试
+        :return: 刷新后的服务器
+        """
+        from app.services.whois_checker import WhoisChecker
+        
+        config = current_app.config
+        try:
+            server = WhoisChecker.fetch_iana_referral(suffix)
+            failed = False
+        except Exception as e:
+            print(f"查询IANA WHOIS服务器失败 .{suffix}: {e}")
+            server = None
+            failed = True
+        
+        now = datetime.utcnow()
+        negative_ttl = timedelta(hours=config['WHOIS_REFERRAL_NEGATIVE_TTL_HOURS'])
+        try:
+            row = WhoisReferral.query.filter_by(suffix=suffix).first()
+            if row is None:
+                row = WhoisReferral(suffix=suffix)
+                db.session.add(row)
+            if failed:
+                # 没有缓存时沿用快照中的服务器
+                if not row.server:
+                    row.server = self._entries.get(suffix, (None, None))[0]
+                    row.source = 'snapshot' if row.server else 'iana'
+                row.expires_at = now + negative_ttl
+            else:
+                row.server = server
+                row.source = 'iana'
+                row.fetched_at = now
+                row.expires_at = now + (timedelta(days=config['WHOIS_REFERRAL_TTL_DAYS']) if server else negative_ttl)
+            db.session.commit()
+            entry = (row.server, row.expires_at)
+        except IntegrityError:
+            # 其他进程同时写入了该后缀，使用对方的结果
+            db.session.rollback()
+            row = WhoisReferral.query.filter_by(suffix=suffix).first()
+            entry = (row.server, row.expires_at) if row else (server, now + negative_ttl)
+        except Exception as e:
+            # 写入缓存失败不影响本次查询，只在内存中保留结果
+            db.session.rollback()
+            print(f"保存WHOIS服务器缓存失败 .{suffix}: {e}")
+            entry = (server or self._entries.get(suffix, (None, None))[0], now + negative_ttl)
+        
+        self._entries[suffix] = entry
+        return entry[0]
+    
+    def export_snapshot(self, path=SNAPSHOT_PATH):
+        """把数据库中有服务器的条目写为快照文件"""
+        servers = {row.suffix: row.server for row in WhoisReferral.query.order_by(WhoisReferral.suffix)
+                   if row.server}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'generated_at': datetime.utcnow().strftime('%Y-%m-%d'), 'servers': servers},
+                      f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        return len(servers)
+
+# 进程级共享缓存
+whois_referrals = WhoisReferralCache()
@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.services.whois_checker import WhoisChecker
+from app.utils.rate_limit import whois_rate_limiter
+from app.utils.metrics import CHECK_DURATION, CHECKS_TOTAL
+
+class WhoisBulkScheduler:
+    """
+    批量WHOIS查询调度器
+    域名按首选WHOIS服务器分组，调度时在各服务器之间轮流取域名：只提交首选服务器此刻有限速令牌、
+    且进行中的查询数未达到 per_server 的域名，其余服务器的域名继续提交，
+    某个服务器的限速不会阻塞其他服务器的查询；所有服务器都在等待令牌时休眠到最早可用的时间。
+    批量查询逐个尝试服务器（不对冲），备用服务器的查询同样受限速约束
+    """
+    
+    def __init__(self, workers=8, per_server=2, limiter=None):
+        self.workers = max(int(workers), 1)
+        self.per_server = max(int(per_server), 1)
+        self.limiter = limiter or whois_rate_limiter
+    
+    @classmethod
+    def from_config(cls, config, **options):
+        """按应用配置创建调度器，options 覆盖对应参数"""
+        params = {
+            'workers': config['WHOIS_BULK_WORKERS'],
+            'per_server': config['WHOIS_BULK_PER_SERVER']
+        }
+        params.update(options)
+        return cls(**params)
+    
+    def run(self, domain_servers):
+        """
+        查询域名的WHOIS信息，按完成顺序返回结果
+        :param domain_servers: {域名: 服务器列表}（服务器列表需在应用上下文中预先确定）
+        :return: 生成器，产出 (域名, get_whois_info 格式的结果)
+        """
+        queues = OrderedDict()  # 首选服务器 -> 待查询的域名
+        for domain_name, servers in domain_servers.items():
+            if not servers:
+                yield domain_name, {'error': f"查询失败", 'is_valid': False, 'servers_tried': 0}
+                continue
+            queues.setdefault(servers[0], deque()).append(domain_name)
+        
+        if not queues:
+            return
+        
+        running = {}  # Future -> (域名, 首选服务器)
+        in_flight = {server: 0 for server in queues}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='whois-bulk') as pool:
+            while queues or running:
+                next_ready = None
+                while queues and len(running) < self.workers:
+                    server, next_wait = self._next_server(queues, in_flight)
+                    if server is None:
+                        if next_wait is not None:
+                            next_ready = next_wait
+                        break
+                    
+                    domain_name = queues[server].popleft()
+                    if queues[server]:
+                        # 轮到的服务器移到队尾，各服务器的域名交替提交
+                        queues.move_to_end(server)
+                    else:
+                        del queues[server]
+                    in_flight[server] += 1
+                    future = pool.submit(self._query_one, domain_name, domain_servers[domain_name])
+                    running[future] = (domain_name, server)
+                
+                if not running:
+                    # 所有服务器都在等待令牌
+                    time.sleep(next_ready or 0)
+                    continue
+                
+                done, _ = wait(list(running), timeout=next_ready, return_when=FIRST_COMPLETED)
+                for future in done:
+                    domain_name, server = running.pop(future)
+                    in_flight[server] -= 1
+                    try:
+                        whois_info = future.result()
+                    except Exception as e:
+                        whois_info = {'error': f"查询异常: {str(e)}", 'is_valid': False}
+                    yield domain_name, whois_info
+    
+    def _next_server(self, queues, in_flight):
+        """
+        按轮转顺序找到可以提交查询的首选服务器并取得其令牌
+        :return: (服务器, None)；没有可提交的服务器时为 (None, 最早有令牌的等待秒数)
+        """
+        next_wait = None
+        for server in queues:
+            if in_flight[server] >= self.per_server:
+                continue
+            wait_time = self.limiter.try_acquire(server)
+            if wait_time == 0:
+                return server, None
+            next_wait = wait_time if next_wait is None else min(next_wait, wait_time)
+        return None, next_wait
+    
+    @staticmethod
+    def _query_one(domain_name, servers):
+        """在线程池中查询单个域名（首选服务器的令牌已由调度器取得）"""
+        started = time.perf_counter()
+        whois_info = WhoisChecker.get_whois_info(domain_name, servers=servers, hedged=False, token_reserved=True)
+        CHECK_DURATION.observe(time.perf_counter() - started, check_type='whois')
+        CHECKS_TOTAL.inc(check_type='whois', result='success' if whois_info.get('is_valid') else 'failure')
+        return whois_info
@@ -0,0 +1,159 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from app.utils.metrics import CERT_CACHE_TOTAL
+
+class ParsedCertificate:
+    """
+    解析后的证书字段（只读记录）
+    只保存展示、校验与域名匹配用到的字段，不持有 cryptography 的证书对象
+    """
+    
+    __slots__ = ('fingerprint_sha256', 'issuer', 'subject', 'issuer_dict', 'subject_dict',
+                 'serial_number', 'serial_hex', 'not_before', 'not_after', 'key_type',
+                 'signature_algorithm', 'common_name', 'san_domains', 'cert_domains',
+                 'is_ca', 'public_key_id')
+    
+    _DATETIME_FIELDS = ('not_before', 'not_after')
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+    
+    def domain_info(self):
+        """与 CertParser._extract_domain_info 相同格式的域名信息（列表以JSON字符串表示）"""
+        return {
+            'common_name': self.common_name,
+            'san_domains': json.dumps(list(self.san_domains)) if self.san_domains else None,
+            'cert_domains': json.dumps(list(self.cert_domains)) if self.cert_domains else None
+        }
+    
+    def to_dict(self):
+        """转换为可JSON序列化的字典（用于持久化）"""
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if name in self._DATETIME_FIELDS and value is not None:
+                value = value.isoformat()
+            elif isinstance(value, tuple):
+                value = list(value)
+            data[name] = value
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        fields = dict(data)
+        for name in cls._DATETIME_FIELDS:
+            if fields.get(name):
+                fields[name] = datetime.fromisoformat(fields[name])
+        for name in ('san_domains', 'cert_domains'):
+            fields[name] = tuple(fields.get(name) or ())
+        return cls(**fields)
+    
+    def __repr__(self):
+        return f'<ParsedCertificate {self.fingerprint_sha256[:16]} {self.common_name}>'
+
+class ParsedCertificateCache:
+    """
+    按DER指纹缓存证书解析结果的有界LRU缓存（线程安全）
+    上传校验、证书包导入与在线扫描共用同一个缓存，同一进程内每张不同的证书只解码一次；
+    配置 CERT_CACHE_PATH 时启动时从文件加载、退出时写回，重启后无需重新解码常见证书
+    """
+    
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.path = None
+        self._lock = threading.Lock()
+        self._records = OrderedDict()
+        self._registered = False
+    
+    def init_app(self, app):
+        self.maxsize = max(app.config['CERT_CACHE_SIZE'], 1)
+        path = app.config['CERT_CACHE_PATH']
+        if path and path != self.path:
+            self.path = path
+            self.load()
+            if not self._registered:
+                atexit.register(self.save)
+                self._registered = True
+        app.extensions['cert_cache'] = self
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def get(self, fingerprint):
+        """按指纹取出解析结果，不存在时返回None"""
+        with self._lock:
+            record = self._records.get(fingerprint)
+            if record is not None:
+                self._records.move_to_end(fingerprint)
+        CERT_CACHE_TOTAL.inc(result='hit' if record is not None else 'miss')
+        return record
+    
+    def put(self, record):
+        with self._lock:
+            self._records[record.fingerprint_sha256] = record
+            self._records.move_to_end(record.fingerprint_sha256)
+            while len(self._records) > self.maxsize:
+                self._records.popitem(last=False)
+        return record
+    
+    def get_or_parse(self, fingerprint, parse):
+        """
+        取出解析结果，缓存未命中时调用 parse() 解析并放入缓存
+        多个线程同时解析同一张新证书时结果相同，不额外加锁
+        """
+        record = self.get(fingerprint)
+        if record is None:
+            record = self.put(parse())
+        return record
+    
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+    
+    def load(self):
+        """从 CERT_CACHE_PATH 加载解析结果，文件不存在或损坏时忽略"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            records = [ParsedCertificate.from_dict(item) for item in items[-self.maxsize:]]
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            print(f"证书解析缓存加载失败，已忽略: {e}")
+            return 0
+        with self._lock:
+            for record in records:
+                self._records[record.fingerprint_sha256] = record
+            while len(self._records) > self.maxsize:
+                self._records.popitem(last=False)
+        return len(records)
+    
+    def save(self):
+        """按最近使用顺序写回 CERT_CACHE_PATH（先写临时文件再替换）"""
+        if not self.path:
+            return 0
+        with self._lock:
+            items = [record.to_dict() for record in self._records.values()]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.cert_cache-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"证书解析缓存保存失败: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return 0
+        return len(items)
+
+# 进程级共享缓存；进程池中的解析进程各自使用默认大小的缓存
+cert_cache = ParsedCertificateCache()
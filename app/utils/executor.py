@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ExecutorBusyError(RuntimeError):
+    """后台执行器队列已满"""
+
+class BackgroundExecutor:
+    """
+    应用级共享后台执行器
+    所有后台检查任务都提交到同一个有界线程池，并复用同一个Flask应用实例，
+    避免每个任务都重新 create_app；等待队列满时提交方会等待或被拒绝（背压）
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._slots = None
+        self._submit_timeout = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        # 同一进程内只创建一个线程池，绑定第一个初始化的应用
+        if self._pool is None:
+            self.app = app
+            workers = app.config['BACKGROUND_WORKERS']
+            self._pool = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='background-check'
+            )
+            # 执行中 + 排队中的任务总数上限
+            self._slots = threading.BoundedSemaphore(workers + app.config['BACKGROUND_QUEUE_SIZE'])
+            self._submit_timeout = app.config['BACKGROUND_SUBMIT_TIMEOUT']
+        app.extensions['background_executor'] = self
+        
+        from app.utils.metrics import EXECUTOR_QUEUE_DEPTH
+        EXECUTOR_QUEUE_DEPTH.set_function(lambda: self.queue_depth)
+    
+    @property
+    def queue_depth(self):
+        """等待执行的任务数"""
+        if self._pool is None:
+            return 0
+        return self._pool._work_queue.qsize()
+    
+    def submit(self, fn, *args, **kwargs):
+        """
+        在应用上下文中异步执行函数，队列满时最多等待 BACKGROUND_SUBMIT_TIMEOUT 秒
+        :return: concurrent.futures.Future
+        :raises ExecutorBusyError: 队列已满
+        """
+        return self._submit(self._submit_timeout, fn, args, kwargs)
+    
+    def submit_blocking(self, fn, *args, **kwargs):
+        """与 submit 相同，但队列满时一直等待，供后台分发线程使用"""
+        return self._submit(None, fn, args, kwargs)
+    
+    def _submit(self, timeout, fn, args, kwargs):
+        if self._pool is None:
+            raise RuntimeError("后台执行器尚未初始化")
+        
+        if timeout is None:
+            self._slots.acquire()
+        elif not self._slots.acquire(timeout=timeout):
+            raise ExecutorBusyError("后台任务队列已满，请稍后重试")
+        
+        app = self.app
+        
+        def run():
+            from app import db
+            try:
+                with app.app_context():
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        db.session.remove()
+            finally:
+                self._slots.release()
+        
+        try:
+            return self._pool.submit(run)
+        except Exception:
+            self._slots.release()
+            raise
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import bindparam
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import DateTime, Integer
+
+# 到期时间统一以 naive UTC 存储（带索引），剩余天数在读取时计算：
+# Python 侧使用 days_until，SQL 侧使用 DaysUntil，按剩余天数过滤时使用 expiring_within 生成可走索引的范围条件
+
+def to_utc(value):
+    """
+    把时间统一为 naive UTC
+    带时区的时间换算为UTC后去掉时区；naive 时间按约定视为UTC，原样返回
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(pytz.UTC).replace(tzinfo=None)
+
+def days_until(value, now=None):
+    """
+    距到期时间的剩余天数（向下取整，已过期为负数）
+    :param value: 到期时间（UTC）
+    :param now: 计算基准时间（UTC），默认当前时间
+    """
+    if value is None:
+        return None
+    return (to_utc(value) - (now or datetime.utcnow())).days
+
+def expiring_within(column, days, now=None, include_expired=True):
+    """
+    剩余天数不超过 days 的范围条件，直接比较到期时间列以便使用索引
+    剩余天数（向下取整）<= days 等价于 到期时间 < now + (days + 1) 天
+    :param include_expired: 是否包含已过期的记录
+    """
+    now = now or datetime.utcnow()
+    criteria = [column.is_not(None), column < now + timedelta(days=days + 1)]
+    if not include_expired:
+        criteria.append(column >= now)
+    return criteria
+
+class DaysUntil(FunctionElement):
+    """剩余天数的SQL表达式，与 days_until 保持相同的取整方式"""
+    
+    type = Integer()
+    name = 'days_until'
+    inherit_cache = True
+    
+    def __init__(self, column, now=None):
+        super().__init__(column, bindparam('now', now or datetime.utcnow(), type_=DateTime(), unique=True))
+
+def _arguments(element, compiler, **kw):
+    column, now = element.clauses.clauses
+    return compiler.process(column, **kw), compiler.process(now, **kw)
+
+@compiles(DaysUntil)
+def _compile_days_until(element, compiler, **kw):
+    column, now = _arguments(element, compiler, **kw)
+    return f"CAST(FLOOR(EXTRACT(EPOCH FROM ({column} - {now})) / 86400) AS INTEGER)"
+
+@compiles(DaysUntil, 'mysql')
+def _compile_days_until_mysql(element, compiler, **kw):
+    column, now = _arguments(element, compiler, **kw)
+    return f"FLOOR(TIMESTAMPDIFF(SECOND, {now}, {column}) / 86400)"
+
+@compiles(DaysUntil, 'sqlite')
+def _compile_days_until_sqlite(element, compiler, **kw):
+    column, now = _arguments(element, compiler, **kw)
+    # SQLite 没有 FLOOR 函数，CAST 向零取整，负数需要再减一
+    days = f"(julianday({column}) - julianday({now}))"
+    return f"(CAST({days} AS INTEGER) - ({days} < CAST({days} AS INTEGER)))"
@@ -0,0 +1,201 @@
+import errno
+import functools
+import os
+import selectors
+import socket
+import time
+from app.utils.metrics import CONNECT_FAMILY_TOTAL
+
+# 相邻两次连接尝试的启动间隔（秒），RFC 8305 建议值
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+FAMILY_NAMES = {
+    socket.AF_INET: 'ipv4',
+    socket.AF_INET6: 'ipv6'
+}
+
+def family_name(sock_or_family):
+    """返回套接字（或地址族）对应的名称：ipv4/ipv6"""
+    family = getattr(sock_or_family, 'family', sock_or_family)
+    return FAMILY_NAMES.get(family, str(family))
+
+def _sort_addresses(infos):
+    """
+    按地址族交替排列解析结果（RFC 8305 第4节），首个地址族沿用系统解析顺序，
+    某一地址族的地址全部不可达时不会连续占用多个尝试间隔
+    """
+    groups = {}
+    for info in infos:
+        groups.setdefault(info[0], []).append(info)
+    
+    ordered = []
+    queues = [iter(group) for group in groups.values()]
+    while queues:
+        remaining = []
+        for queue in queues:
+            info = next(queue, None)
+            if info is not None:
+                ordered.append(info)
+                remaining.append(queue)
+        queues = remaining
+    return ordered
+
+def resolve(host, port, addresses=None):
+    """
+    解析连接目标
+    :param addresses: 已解析的IP地址列表，提供时不再查询DNS
+    :return: getaddrinfo 格式的地址列表（已去重并按地址族交替排列）
+    """
+    if addresses:
+        infos = []
+        for address in addresses:
+            infos.extend(socket.getaddrinfo(address, port, type=socket.SOCK_STREAM,
+                                            flags=socket.AI_NUMERICHOST))
+    else:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    
+    seen = set()
+    unique = []
+    for info in infos:
+        if info[4] not in seen:
+            seen.add(info[4])
+            unique.append(info)
+    return _sort_addresses(unique)
+
+def _start_attempt(info):
+    family, socktype, proto, _, sockaddr = info
+    sock = socket.socket(family, socktype, proto)
+    sock.setblocking(False)
+    error = sock.connect_ex(sockaddr)
+    if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+        sock.close()
+        raise OSError(error, f'连接 {sockaddr[0]} 失败: {os.strerror(error)}')
+    return sock
+
+def create_connection(host, port, timeout=10, addresses=None, delay=CONNECTION_ATTEMPT_DELAY):
+    """
+    双栈竞速连接（Happy Eyeballs，RFC 8305）
+    IPv6 与 IPv4 地址交替排列，每隔 delay 秒（或上一次尝试失败时立即）启动下一次连接，
+    最先建立的连接胜出，其余连接关闭。某一地址族路由故障时不必等待完整超时再尝试另一地址族
+    :param timeout: 解析之后所有尝试共用的截止时间（秒），None 表示不限制
+    :param addresses: 已解析的IP地址列表，提供时只在这些地址之间竞速
+    :return: 已连接的套接字（阻塞模式，超时为 timeout），胜出的地址族可用 family_name(sock) 获取
+    """
+    infos = resolve(host, port, addresses)
+    if not infos:
+        raise OSError(f'{host} 没有可用的地址')
+    
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {}  # 套接字 -> 地址
+    last_error = None
+    next_index = 0
+    next_start = time.monotonic()
+    # selectors 不受 select() 的文件描述符上限（FD_SETSIZE）限制，进程打开大量连接时同样可用
+    selector = selectors.DefaultSelector()
+    try:
+        while True:
+            now = time.monotonic()
+            # 到达启动间隔或当前没有进行中的尝试时启动下一个地址
+            if next_index < len(infos) and (now >= next_start or not pending):
+                info = infos[next_index]
+                next_index += 1
+                next_start = now + delay
+                try:
+                    sock = _start_attempt(info)
+                except OSError as e:
+                    last_error = e
+                    next_start = now
+                    continue
+                pending[sock] = info
+                selector.register(sock, selectors.EVENT_WRITE)
+            
+            if not pending:
+                raise last_error or OSError(f'无法连接 {host}:{port}')
+            if deadline is not None and now >= deadline:
+                raise socket.timeout(f'连接 {host}:{port} 超时')
+            
+            waits = []
+            if next_index < len(infos):
+                waits.append(next_start - now)
+            if deadline is not None:
+                waits.append(deadline - now)
+            wait = max(min(waits), 0) if waits else None
+            
+            # 连接建立或失败时套接字均变为可写
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                info = pending.pop(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    sock.setblocking(True)
+                    sock.settimeout(None if deadline is None else max(deadline - time.monotonic(), 0.001))
+                    CONNECT_FAMILY_TOTAL.inc(family=family_name(sock))
+                    return sock
+                sock.close()
+                last_error = OSError(error, f'连接 {info[4][0]} 失败: {os.strerror(error)}')
+                # 某次尝试失败时立即启动下一个地址，不必等待启动间隔
+                next_start = time.monotonic()
+    finally:
+        selector.close()
+        for sock in pending:
+            sock.close()
+
+@functools.lru_cache(maxsize=None)
+def _adapter_class():
+    """构造使用双栈竞速连接的 requests 适配器（延迟导入 requests/urllib3）"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+    
+    class ConnectionMixin:
+        def _new_conn(self):
+            timeout = self.timeout if isinstance(self.timeout, (int, float)) else None
+            try:
+                sock = create_connection(self._dns_host, self.port, timeout=timeout)
+            except socket.gaierror as e:
+                raise NameResolutionError(self.host, self, e) from e
+            except socket.timeout as e:
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+                ) from e
+            except OSError as e:
+                raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+            
+            for option in self.socket_options or []:
+                sock.setsockopt(*option)
+            sock.settimeout(timeout)
+            return sock
+    
+    class HappyHTTPConnection(ConnectionMixin, HTTPConnection):
+        pass
+    
+    class HappyHTTPSConnection(ConnectionMixin, HTTPSConnection):
+        pass
+    
+    class HappyHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = HappyHTTPConnection
+    
+    class HappyHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = HappyHTTPSConnection
+    
+    class HappyEyeballsAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': HappyHTTPConnectionPool,
+                'https': HappyHTTPSConnectionPool
+            }
+    
+    return HappyEyeballsAdapter
+
+def session():
+    """创建通过双栈竞速建立连接的 requests 会话"""
+    import requests
+    
+    http = requests.Session()
+    adapter = _adapter_class()()
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
@@ -0,0 +1,62 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import String
+
+# 证书域名索引使用的主机名规则：统一小写并去掉末尾的点；
+# 通配符域名 *.example.com 以 (example.com, 通配符) 存储，只覆盖一级子域名（与 CertParser.match_hostname 一致）
+
+def normalize_hostname(name):
+    """主机名统一为小写并去掉首尾空白和末尾的点"""
+    return (name or '').strip().lower().rstrip('.')
+
+def parent_domain(hostname):
+    """上一级域名（去掉第一段），没有上一级时返回None"""
+    if '.' not in hostname:
+        return None
+    return hostname.split('.', 1)[1]
+
+def hostname_keys(cert_domains, max_length=255):
+    """
+    证书域名列表转换为索引键
+    :return: {(主机名, 是否通配符)}，通配符键的主机名为去掉 *. 之后的部分
+    """
+    keys = set()
+    for name in cert_domains:
+        name = normalize_hostname(name)
+        if not name or len(name) > max_length:
+            continue
+        if name.startswith('*.'):
+            keys.add((name[2:], True))
+        else:
+            keys.add((name, False))
+    return keys
+
+def match_keys(keys, hostname):
+    """
+    在索引键中查找覆盖主机名的证书域名
+    :return: 'exact' / 'wildcard'，不匹配返回None
+    """
+    hostname = normalize_hostname(hostname)
+    if (hostname, False) in keys:
+        return 'exact'
+    parent = parent_domain(hostname)
+    if parent and (parent, True) in keys:
+        return 'wildcard'
+    return None
+
+class ParentDomain(FunctionElement):
+    """上一级域名的SQL表达式（第一个点之后的部分），用于在SQL中按通配符匹配；调用方需保证列中包含点"""
+    
+    type = String()
+    name = 'parent_domain'
+    inherit_cache = True
+
+@compiles(ParentDomain)
+def _compile_parent_domain(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return f"SUBSTRING({column} FROM POSITION('.' IN {column}) + 1)"
+
+@compiles(ParentDomain, 'sqlite')
+def _compile_parent_domain_sqlite(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return f"substr({column}, instr({column}, '.') + 1)"
@@ -0,0 +1,312 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+class _Metric:
+    """指标基类，按标签值分组保存样本"""
+    
+    metric_type = None
+    
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry or REGISTRY).register(self)
+    
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def collect(self):
+        """生成Prometheus文本格式的样本行"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+class Counter(_Metric):
+    """只增计数器"""
+    
+    metric_type = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """可增可减的瞬时值，也可以绑定回调函数在采集时取值"""
+    
+    metric_type = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._functions = {}
+    
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+    
+    def set_function(self, fn, **labels):
+        """采集时调用 fn() 获取当前值"""
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+    
+    def collect(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().collect()
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    
+    metric_type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            items = sorted((key, {'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']})
+                           for key, state in self._values.items())
+        for labelvalues, state in items:
+            for bound, count in zip(self.buckets, state['buckets']):
+                labels = _format_labels(self.labelnames, labelvalues, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+class MetricsRegistry:
+    """指标注册表"""
+    
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+    
+    def generate_latest(self):
+        """输出Prometheus文本格式（0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+def serve_metrics(port, host='127.0.0.1', registry=None):
+    """
+    在后台线程中启动独立的HTTP监听，GET /metrics 返回Prometheus格式的指标
+    指标保存在各进程内存中：Web进程的 /metrics 蓝图只包含Web请求路径上的指标，
+    工作进程（定时检查、任务队列、调度器）通过该监听暴露自己的指标
+    :return: http.server 实例，调用 shutdown() 停止监听
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    registry = registry or REGISTRY
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.generate_latest().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            # 抓取请求频繁，不输出访问日志
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
+
+# 检查任务
+CHECK_DURATION = Histogram(
+    'dstatus_check_duration_seconds', '单次检查耗时', ['check_type'])
+CHECKS_TOTAL = Counter(
+    'dstatus_checks_total', '检查次数（按结果）', ['check_type', 'result'])
+CHECKS_IN_FLIGHT = Gauge(
+    'dstatus_checks_in_flight', '正在执行的检查数', ['check_type'])
+CHECK_DEDUP_TOTAL = Counter(
+    'dstatus_check_dedup_total', '被合并的重复检查次数（按方式）',
+    ['check_type', 'outcome'])
+
+# 后台执行器与调度器
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    'dstatus_executor_queue_depth', '后台执行器中等待执行的任务数')
+SCHEDULER_LAG = Histogram(
+    'dstatus_scheduler_lag_seconds', '定时任务从计划时间到实际提交的延迟', ['job_id'])
+SCHEDULER_JOBS_TOTAL = Counter(
+    'dstatus_scheduler_jobs_total', '定时任务执行次数（按结果）', ['job_id', 'result'])
+CLUSTER_MEMBERS = Gauge(
+    'dstatus_cluster_members', '集群中存活的工作进程数')
+URL_CHECK_LAG = Histogram(
+    'dstatus_url_check_lag_seconds', 'URL监控超过检查间隔后才开始检查的延迟',
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0))
+
+# WHOIS / SSL
+WHOIS_QUERIES_TOTAL = Counter(
+    'dstatus_whois_queries_total', 'WHOIS服务器查询次数（按结果）', ['server', 'result'])
+WHOIS_QUERY_DURATION = Histogram(
+    'dstatus_whois_query_duration_seconds', 'WHOIS服务器查询耗时', ['server'])
+CERT_CHANGES_TOTAL = Counter(
+    'dstatus_certificate_changes_total', '检测到的证书变更次数（按类型）', ['change_type'])
+SSL_HANDSHAKE_DURATION = Histogram(
+    'dstatus_ssl_handshake_seconds', 'SSL连接与握手耗时', ['result'])
+CONNECT_FAMILY_TOTAL = Counter(
+    'dstatus_connect_family_total', '双栈竞速连接中胜出的地址族', ['family'])
+CERT_CACHE_TOTAL = Counter(
+    'dstatus_cert_cache_total', '证书解析缓存查询次数（按是否命中）', ['result'])
+
+# 通知
+NOTIFICATIONS_TOTAL = Counter(
+    'dstatus_notifications_total', '通知发送次数（按渠道与结果）', ['channel', 'result'])
+
+# 数据库
+DB_WRITE_DURATION = Histogram(
+    'dstatus_db_write_duration_seconds', '数据库写语句耗时', ['operation'])
+
+class _CheckTracker:
+    """track_check 返回的结果记录对象，调用方可以修改 result"""
+    
+    def __init__(self):
+        self.result = 'success'
+
+@contextmanager
+def track_check(check_type):
+    """
+    统计一次检查的耗时、并发数与结果
+    用法:
+        with track_check('ssl') as tracker:
+            ...
+            tracker.result = 'failure'
+    """
+    tracker = _CheckTracker()
+    CHECKS_IN_FLIGHT.inc(check_type=check_type)
+    start = time.perf_counter()
+    try:
+        yield tracker
+    except Exception:
+        tracker.result = 'error'
+        raise
+    finally:
+        CHECK_DURATION.observe(time.perf_counter() - start, check_type=check_type)
+        CHECKS_TOTAL.inc(check_type=check_type, result=tracker.result)
+        CHECKS_IN_FLIGHT.dec(check_type=check_type)
+
+def instrument_database(engine):
+    """为数据库引擎注册写语句耗时统计"""
+    from sqlalchemy import event
+    
+    if getattr(engine, '_dstatus_instrumented', False):
+        return
+    engine._dstatus_instrumented = True
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._dstatus_start = time.perf_counter()
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_dstatus_start', None)
+        if start is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else ''
+        if operation in ('INSERT', 'UPDATE', 'DELETE'):
+            DB_WRITE_DURATION.observe(time.perf_counter() - start, operation=operation)
+
+def instrument_check(check_type, is_success=None):
+    """
+    检查函数装饰器，统计耗时、并发数与结果
+    :param check_type: 检查类型标签
+    :param is_success: 根据返回值判断是否成功，默认返回值非None即成功
+    """
+    import functools
+    
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track_check(check_type) as tracker:
+                result = fn(*args, **kwargs)
+                ok = is_success(result) if is_success else result is not None
+                if not ok:
+                    tracker.result = 'failure'
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,154 @@
+import threading
+import time
+
+# 已知对查询频率敏感的WHOIS服务器的默认限速：服务器 -> (每分钟查询数, 突发上限)，可用 WHOIS_RATE_LIMITS 覆盖
+DEFAULT_WHOIS_LIMITS = {
+    'whois.markmonitor.com': (20, 2),
+    'grs-whois.hichina.com': (20, 2),
+    'whois.verisign-grs.com': (60, 10),
+    'whois.iana.org': (30, 5),
+    'whois.cnnic.cn': (20, 3),
+    'whois.denic.de': (10, 2),
+    'whois.nic.uk': (20, 3)
+}
+
+class TokenBucket:
+    """
+    令牌桶（线程安全）
+    以 rate 个/秒的速度补充令牌，最多积累 burst 个；每次查询消耗一个令牌
+    """
+    
+    def __init__(self, rate, burst):
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def configure(self, rate, burst):
+        """修改速率与突发上限，已积累的令牌不超过新的突发上限"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(float(rate), 1e-6)
+            self.burst = max(float(burst), 1.0)
+            self._tokens = min(self._tokens, self.burst)
+    
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self):
+        """
+        有令牌时立即消耗一个
+        :return: 0 表示已取得令牌，否则为距离下一个令牌可用的秒数（不消耗令牌）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+    
+    def acquire(self, deadline=None, cancel=None):
+        """
+        等待并取得一个令牌
+        :param deadline: time.monotonic() 截止时间，到达时仍未取得令牌则放弃
+        :param cancel: threading.Event，被设置时放弃等待
+        :return: 是否取得令牌
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            if cancel is not None:
+                if cancel.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+class ServerRateLimiter:
+    """
+    按WHOIS服务器分别限速的令牌桶集合
+    同一进程内单个查询、对冲查询、IANA查询与批量检查使用同一组令牌桶。
+    令牌桶只在进程内共享：集群模式下由 cluster 通过 set_share 传入存活的工作进程数，
+    每个进程使用 1/N 的速率与突发数，合计不超过配置的限速；成员变化到各进程心跳刷新之间可能短暂超出
+    """
+    
+    def __init__(self, per_minute=30, burst=5, limits=None):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.share = 1  # 分摊限速的工作进程数
+        self.limits = dict(DEFAULT_WHOIS_LIMITS)
+        self.limits.update(limits or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.per_minute = app.config['WHOIS_RATE_PER_MINUTE']
+        self.burst = app.config['WHOIS_RATE_BURST']
+        self.limits = dict(DEFAULT_WHOIS_LIMITS)
+        self.limits.update(parse_limits(app.config['WHOIS_RATE_LIMITS']))
+        with self._lock:
+            self._buckets.clear()
+        app.extensions['whois_rate_limiter'] = self
+    
+    def limit_for(self, server):
+        """服务器的限速 (每分钟查询数, 突发上限)，为整个集群的合计限速"""
+        return self.limits.get(server.lower(), (self.per_minute, self.burst))
+    
+    def _bucket_limits(self, server):
+        """本进程分到的 (每秒令牌数, 突发上限)"""
+        per_minute, burst = self.limit_for(server)
+        return per_minute / 60.0 / self.share, max(burst / self.share, 1)
+    
+    def set_share(self, members):
+        """设置分摊限速的工作进程数，已创建的令牌桶随之调整"""
+        members = max(int(members), 1)
+        with self._lock:
+            if members == self.share:
+                return
+            self.share = members
+            for server, bucket in self._buckets.items():
+                bucket.configure(*self._bucket_limits(server))
+    
+    def bucket(self, server):
+        server = server.lower()
+        with self._lock:
+            bucket = self._buckets.get(server)
+            if bucket is None:
+                bucket = self._buckets[server] = TokenBucket(*self._bucket_limits(server))
+            return bucket
+    
+    def try_acquire(self, server):
+        return self.bucket(server).try_acquire()
+    
+    def acquire(self, server, deadline=None, cancel=None):
+        return self.bucket(server).acquire(deadline, cancel)
+
+def parse_limits(text):
+    """
+    解析限速配置，格式为逗号分隔的 服务器=每分钟查询数[/突发上限]，
+    例如 whois.markmonitor.com=10/2,whois.verisign-grs.com=120
+    :return: {服务器: (每分钟查询数, 突发上限)}
+    """
+    limits = {}
+    for item in (text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            server, value = item.split('=', 1)
+            per_minute, _, burst = value.partition('/')
+            per_minute = float(per_minute)
+            limits[server.strip().lower()] = (per_minute, float(burst) if burst else max(per_minute / 10, 1))
+        except ValueError:
+            print(f"忽略无效的WHOIS限速配置: {item}")
+    return limits
+
+# 进程级共享的WHOIS服务器限速器
+whois_rate_limiter = ServerRateLimiter()
@@ -0,0 +1,43 @@
+import json
+from datetime import date, datetime
+from flask import Response
+
+# orjson为可选依赖，安装后自动使用以获得更快的序列化速度
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """标准库json无法直接序列化的类型"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """
+    将对象序列化为JSON字节串
+    :param obj: 待序列化的对象（dict/list/元组等）
+    :return: UTF-8编码的JSON字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def json_response(obj, status=200):
+    """
+    直接构造JSON响应，绕过jsonify的格式化开销
+    :param obj: 待序列化的对象
+    :param status: HTTP状态码
+    :return: Flask Response对象
+    """
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+def rows_to_dicts(field_names, rows):
+    """
+    将查询返回的行元组转换为字典列表
+    :param field_names: 字段名列表，与行元组中的列一一对应
+    :param rows: 行元组的可迭代对象
+    :return: 字典列表
+    """
+    return [dict(zip(field_names, row)) for row in rows]
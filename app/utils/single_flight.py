@@ -0,0 +1,129 @@
+import functools
+import threading
+import time
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+class CheckAborted(RuntimeError):
+    """共享结果的检查在执行中被中断（例如工作进程退出），等待方没有结果可用"""
+
+class _Call:
+    """一次正在执行的检查"""
+    
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self.event = threading.Event()
+        self.ref = None
+        self.error = None
+
+def _to_ref(result):
+    """
+    把检查结果转换为可跨线程共享的引用
+    ORM对象只保存类型和主键，由等待方在自己的会话中重新加载
+    """
+    try:
+        state = inspect(result)
+    except NoInspectionAvailable:
+        return ('value', result)
+    if getattr(state, 'key', None) is None:
+        return ('value', result)
+    return ('model', state.class_, state.identity)
+
+def _from_ref(ref):
+    from app import db
+    
+    if ref[0] == 'value':
+        return ref[1]
+    _, model, identity = ref
+    # 刷新当前会话中可能已过期的同一对象
+    return db.session.get(model, identity[0] if len(identity) == 1 else identity, populate_existing=True)
+
+class SingleFlight:
+    """
+    检查去重注册表，按 (检查类型, 目标ID) 合并重复检查：
+    - 相同检查正在执行时，重复请求等待并共享其结果，不再发起新的查询
+    - 在 CHECK_FRESHNESS_SECONDS 秒内成功完成的检查，直接返回上次结果
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self._results = {}  # key -> (完成时间, 结果引用)，只保存成功的结果
+    
+    def do(self, key, fn, *args, **kwargs):
+        from app.utils.metrics import CHECK_DEDUP_TOTAL
+        
+        fresh_seconds = current_app.config['CHECK_FRESHNESS_SECONDS']
+        now = time.monotonic()
+        
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and now - cached[0] < fresh_seconds:
+                CHECK_DEDUP_TOTAL.inc(check_type=key[0], outcome='fresh')
+                return _from_ref(cached[1])
+            
+            call = self._calls.get(key)
+            if call is not None and call.owner == threading.get_ident():
+                # 同一线程内的嵌套调用直接执行，避免等待自己
+                call = None
+                leader = None
+            elif call is not None:
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+        
+        if leader is None:
+            return fn(*args, **kwargs)
+        
+        if not leader:
+            CHECK_DEDUP_TOTAL.inc(check_type=key[0], outcome='shared')
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _from_ref(call.ref)
+        
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            call.ref = _to_ref(result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException as e:
+            # SystemExit/KeyboardInterrupt 等只在本线程中继续传播，等待方收到明确的中断错误
+            call.error = CheckAborted(f"检查 {key[0]}:{key[1]} 被中断: {type(e).__name__}")
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and result is not None:
+                    self._results[key] = (time.monotonic(), call.ref)
+                    self._prune_results(fresh_seconds)
+            call.event.set()
+    
+    def _prune_results(self, fresh_seconds):
+        """清理过期结果（调用方需持有锁）"""
+        if len(self._results) < 1000:
+            return
+        deadline = time.monotonic() - fresh_seconds
+        for key in [key for key, (finished, _) in self._results.items() if finished < deadline]:
+            del self._results[key]
+
+CHECK_REGISTRY = SingleFlight()
+
+def single_flight(check_type, target_id):
+    """
+    检查函数装饰器，按 (检查类型, 目标ID) 去重
+    :param check_type: 检查类型
+    :param target_id: 从调用参数中取出目标ID的函数
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (check_type, target_id(*args, **kwargs))
+            return CHECK_REGISTRY.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
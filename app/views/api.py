@@ -1,85 +1,364 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, abort, current_app, Response, stream_with_context
+from datetime import datetime, timedelta
+from app import db
 from app.models.domain import Domain
 from app.models.certificate import Certificate
-from app.models.notification import URLCheck
-from app.services.ssl_checker import check_single_certificate
-from app.services.url_checker import check_single_url
+from app.models.notification import URLCheck, WhoisRecord
+from app.services.cert_coverage import CertificateCoverage
+from app.services.check_jobs import CheckJobManager
+from app.services.exporter import DataExporter
+from app.utils.serialization import json_response, rows_to_dicts
+from app.utils.expiry import expiring_within
 
 api_bp = Blueprint('api', __name__)
 
+# 列表接口分页配置
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+
+def _first_whois_column(column):
+    """域名第一条WHOIS记录的某个字段（与 Domain.status 使用同一条记录）"""
+    first_record_id = db.select(db.func.min(WhoisRecord.id)).where(
+        WhoisRecord.domain_id == Domain.id
+    ).correlate(Domain).scalar_subquery()
+    return db.select(column).where(WhoisRecord.id == first_record_id).scalar_subquery()
+
+def _domain_fields():
+    """域名接口可选字段 -> SQL列表达式"""
+    return {
+        'id': Domain.id,
+        'name': Domain.name,
+        'description': Domain.description,
+        'is_active': Domain.is_active,
+        'check_ssl': Domain.check_ssl,
+        'check_whois': Domain.check_whois,
+        'check_access': Domain.check_access,
+        'status': Domain.status,
+        'expiration_date': _first_whois_column(WhoisRecord.expiration_date),
+        'days_until_expiry': _first_whois_column(WhoisRecord.days_until_expiry),
+        'registrar': _first_whois_column(WhoisRecord.registrar),
+        'website_url_id': Domain.website_url_id,
+        'notification_config_id': Domain.notification_config_id,
+        'created_at': Domain.created_at,
+        'updated_at': Domain.updated_at
+    }
+
+DOMAIN_DEFAULT_FIELDS = ['id', 'name', 'description', 'is_active', 'check_ssl',
+                         'check_whois', 'check_access', 'status', 'created_at']
+
+def _certificate_fields():
+    """证书接口可选字段 -> SQL列表达式"""
+    now = datetime.utcnow()
+    days_before = current_app.config['NOTIFICATION_DAYS_BEFORE']
+    return {
+        'id': Certificate.id,
+        'domain_id': Certificate.domain_id,
+        'domain_name': Domain.name,
+        'issuer': Certificate.issuer,
+        'subject': Certificate.subject,
+        'serial_number': Certificate.serial_number,
+        'common_name': Certificate.common_name,
+        'not_before': Certificate.not_before,
+        'not_after': Certificate.not_after,
+        'days_until_expiry': Certificate.days_until_expiry,
+        'is_valid': Certificate.is_valid,
+        'verify_error': Certificate.verify_error,
+        'ip_drift': Certificate.ip_drift,
+        'fingerprint_sha256': Certificate.fingerprint_sha256,
+        'key_type': Certificate.key_type,
+        'signature_algorithm': Certificate.signature_algorithm,
+        'is_expired': db.case((Certificate.not_after.is_(None), True),
+                              else_=Certificate.not_after < now),
+        'is_expiring_soon': db.case((Certificate.not_after.is_(None), False),
+                                    else_=Certificate.not_after < now + timedelta(days=days_before)),
+        'last_checked': Certificate.last_checked
+    }
+
+CERTIFICATE_DEFAULT_FIELDS = ['id', 'domain_id', 'domain_name', 'issuer', 'subject',
+                              'not_before', 'not_after', 'days_until_expiry', 'is_valid',
+                              'is_expired', 'is_expiring_soon', 'last_checked']
+
+def _parse_bool_arg(name):
+    """解析布尔类型的查询参数，未提供时返回None"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return value.lower() in ['true', '1', 'yes', 'on']
+
+def _select_fields(field_map, default_fields):
+    """根据 fields= 参数选择返回字段"""
+    fields_arg = request.args.get('fields')
+    if not fields_arg:
+        return default_fields
+    
+    names = [name.strip() for name in fields_arg.split(',') if name.strip()]
+    unknown = [name for name in names if name not in field_map]
+    if unknown:
+        abort(json_response({'error': f"未知字段: {', '.join(unknown)}",
+                             'available_fields': list(field_map)}, status=400))
+    return names
+
+def _apply_sort(query, field_map, default_sort):
+    """根据 sort= 参数排序，字段前加 - 表示降序，多个字段用逗号分隔"""
+    sort_arg = request.args.get('sort') or default_sort
+    order_by = []
+    for item in sort_arg.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith('-')
+        name = item.lstrip('-')
+        if name not in field_map:
+            abort(json_response({'error': f"不支持的排序字段: {name}"}, status=400))
+        column = field_map[name]
+        order_by.append(column.desc() if descending else column.asc())
+    
+    # 追加主键保证分页顺序稳定
+    if 'id' in field_map:
+        order_by.append(field_map['id'].asc())
+    return query.order_by(*order_by)
+
+def _paginated_rows(query, field_map, field_names):
+    """分页执行查询，直接以行元组构造结果"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(query.order_by(None).subquery())
+    ).scalar()
+    
+    rows = db.session.execute(
+        query.with_only_columns(*[field_map[name] for name in field_names],
+                                maintain_column_froms=True)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    
+    return {
+        'items': rows_to_dicts(field_names, rows),
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page
+    }
+
 @api_bp.route('/domains')
 def get_domains():
-    domains = Domain.query.all()
-    return jsonify([{
-        'id': domain.id,
-        'name': domain.name,
-        'url': domain.url,
-        'description': domain.description,
-        'is_active': domain.is_active,
-        'check_ssl': domain.check_ssl,
-        'check_url': domain.check_url,
-        'created_at': domain.created_at.isoformat()
-    } for domain in domains])
+    """
+    域名列表接口
+    查询参数: page, per_page, fields, sort,
+             status(active/expiring_soon/expired/unknown), expiring_within(天), is_active
+    """
+    field_map = _domain_fields()
+    field_names = _select_fields(field_map, DOMAIN_DEFAULT_FIELDS)
+    
+    query = db.select(Domain.id)
+    
+    status = request.args.get('status')
+    if status:
+        query = query.where(Domain.status.in_(status.split(',')))
+    
+    is_active = _parse_bool_arg('is_active')
+    if is_active is not None:
+        query = query.where(Domain.is_active == is_active)
+    
+    within_days = request.args.get('expiring_within', type=int)
+    if within_days is not None:
+        query = query.where(*expiring_within(field_map['expiration_date'], within_days))
+    
+    query = _apply_sort(query, field_map, 'id')
+    return json_response(_paginated_rows(query, field_map, field_names))
+
+@api_bp.route('/domains/uncovered')
+def get_uncovered_domains():
+    """
+    未被证书覆盖的域名列表（按证书域名索引查询）
+    查询参数: page, per_page, fields, sort, is_active, check_ssl,
+             scope(own: 只检查域名自己的证书，默认 / any: 检查系统中的所有证书)
+    """
+    field_map = _domain_fields()
+    field_names = _select_fields(field_map, DOMAIN_DEFAULT_FIELDS)
+    
+    scope = request.args.get('scope', 'own')
+    if scope not in ('own', 'any'):
+        return json_response({'error': f"不支持的范围: {scope}"}, status=400)
+    query = CertificateCoverage.uncovered_query(own_certificate=(scope == 'own'))
+    
+    is_active = _parse_bool_arg('is_active')
+    if is_active is not None:
+        query = query.where(Domain.is_active == is_active)
+    
+    check_ssl = _parse_bool_arg('check_ssl')
+    if check_ssl is not None:
+        query = query.where(Domain.check_ssl == check_ssl)
+    
+    query = _apply_sort(query, field_map, 'id')
+    return json_response(_paginated_rows(query, field_map, field_names))
 
 @api_bp.route('/domains/<int:id>')
 def get_domain(id):
-    domain = Domain.query.get_or_404(id)
-    return jsonify({
-        'id': domain.id,
-        'name': domain.name,
-        'url': domain.url,
-        'description': domain.description,
-        'is_active': domain.is_active,
-        'check_ssl': domain.check_ssl,
-        'check_url': domain.check_url,
-        'created_at': domain.created_at.isoformat()
-    })
+    field_map = _domain_fields()
+    field_names = _select_fields(field_map, DOMAIN_DEFAULT_FIELDS)
+    
+    row = db.session.execute(
+        db.select(*[field_map[name] for name in field_names]).where(Domain.id == id)
+    ).first()
+    if row is None:
+        abort(404)
+    return json_response(dict(zip(field_names, row)))
 
 @api_bp.route('/domains/<int:id>/check', methods=['POST'])
 def check_domain(id):
     domain = Domain.query.get_or_404(id)
     
-    import threading
-    
-    def async_check():
-        from app import create_app
-        app = create_app(init_scheduler=False)
-        with app.app_context():
-            try:
-                if domain.check_ssl:
-                    check_single_certificate(domain.id)
-                    print(f"域名 {domain.name} SSL证书检查完成")
-                
-                if domain.check_url:
-                    check_single_url(domain.id)
-                    print(f"域名 {domain.name} URL可用性检查完成")
-            except Exception as e:
-                print(f"域名 {domain.name} 检查失败: {str(e)}")
-    
-    # 启动异步线程
-    thread = threading.Thread(target=async_check)
-    thread.daemon = True
-    thread.start()
+    try:
+        job, merged = CheckJobManager.submit(domain_ids=[domain.id], check_types=['ssl', 'whois', 'access'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     return jsonify({
         'success': True, 
+        'job_id': job.id,
+        'merged': merged,
         'message': f'已开始检查域名 {domain.name}，请稍后查看结果'
     })
 
+@api_bp.route('/jobs', methods=['POST'])
+def create_check_job():
+    """
+    提交批量检查任务
+    请求体: {"domain_ids": [...], "url_ids": [...], "checks": ["ssl", "whois", "access", "url"]}
+    与进行中任务重叠的检查项会合并到该任务，返回其任务ID
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        job, merged = CheckJobManager.submit(
+            domain_ids=data.get('domain_ids'),
+            url_ids=data.get('url_ids'),
+            check_types=data.get('checks')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = job.to_dict(include_items=False)
+    result.update({'success': True, 'merged': merged})
+    return jsonify(result), 202
+
+@api_bp.route('/jobs')
+def list_check_jobs():
+    return jsonify([job.to_dict(include_items=False) for job in CheckJobManager.list_jobs()])
+
+@api_bp.route('/jobs/<job_id>')
+def get_check_job(job_id):
+    """查询批量任务进度，items=0 时不返回逐项明细"""
+    job = CheckJobManager.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在或已过期'}), 404
+    include_items = request.args.get('items', '1') != '0'
+    return jsonify(job.to_dict(include_items=include_items))
+
 @api_bp.route('/certificates')
 def get_certificates():
-    certificates = Certificate.query.all()
-    return jsonify([{
-        'id': cert.id,
-        'domain_id': cert.domain_id,
-        'domain_name': cert.domain.name,
-        'issuer': cert.issuer,
-        'subject': cert.subject,
-        'not_before': cert.not_before.isoformat() if cert.not_before else None,
-        'not_after': cert.not_after.isoformat() if cert.not_after else None,
-        'days_until_expiry': cert.days_until_expiry,
-        'is_valid': cert.is_valid,
-        'is_expired': cert.is_expired,
-        'is_expiring_soon': cert.is_expiring_soon,
-        'last_checked': cert.last_checked.isoformat() if cert.last_checked else None
-    } for cert in certificates])
+    """
+    证书列表接口
+    查询参数: page, per_page, fields, sort,
+             status(valid/invalid/expired/expiring_soon), expiring_within(天),
+             is_active(所属域名是否启用), domain_id
+    """
+    field_map = _certificate_fields()
+    field_names = _select_fields(field_map, CERTIFICATE_DEFAULT_FIELDS)
+    
+    # 通过JOIN一次取出域名名称，避免逐条懒加载 cert.domain
+    query = db.select(Certificate.id).join(Domain, Certificate.domain_id == Domain.id)
+    
+    now = datetime.utcnow()
+    status = request.args.get('status')
+    if status == 'valid':
+        query = query.where(Certificate.is_valid == True)
+    elif status == 'invalid':
+        query = query.where(Certificate.is_valid == False)
+    elif status == 'expired':
+        query = query.where(db.or_(Certificate.not_after.is_(None), Certificate.not_after < now))
+    elif status == 'expiring_soon':
+        days_before = current_app.config['NOTIFICATION_DAYS_BEFORE']
+        query = query.where(Certificate.not_after >= now,
+                            Certificate.not_after < now + timedelta(days=days_before))
+    elif status:
+        return json_response({'error': f"不支持的状态: {status}"}, status=400)
+    
+    is_active = _parse_bool_arg('is_active')
+    if is_active is not None:
+        query = query.where(Domain.is_active == is_active)
+    
+    domain_id = request.args.get('domain_id', type=int)
+    if domain_id is not None:
+        query = query.where(Certificate.domain_id == domain_id)
+    
+    # 按到期时间范围过滤，可使用 not_after 索引
+    within_days = request.args.get('expiring_within', type=int)
+    if within_days is not None:
+        query = query.where(*expiring_within(Certificate.not_after, within_days, now))
+    
+    query = _apply_sort(query, field_map, 'id')
+    return json_response(_paginated_rows(query, field_map, field_names))
+
+@api_bp.route('/certificates/covering')
+def get_covering_certificates():
+    """
+    覆盖指定主机名的证书（精确匹配或一级通配符）
+    查询参数: host
+    """
+    host = (request.args.get('host') or '').strip()
+    if not host:
+        return json_response({'error': '缺少参数 host'}, status=400)
+    
+    items = []
+    for certificate, match in CertificateCoverage.covering(host):
+        items.append({
+            'id': certificate.id,
+            'domain_id': certificate.domain_id,
+            'domain_name': certificate.domain.name,
+            'common_name': certificate.common_name,
+            'issuer': certificate.issuer,
+            'not_after': certificate.not_after,
+            'days_until_expiry': certificate.days_until_expiry,
+            'is_valid': certificate.is_valid,
+            'match': match
+        })
+    return json_response({'host': host, 'items': items, 'total': len(items)})
+
+@api_bp.route('/export/<kind>')
+def export_data(kind):
+    """
+    流式导出检查历史与资产清单
+    kind: url_checks / domains / certificates / whois
+    查询参数: format(ndjson/csv), gzip, since, until, url_id, domain_id
+    """
+    fmt = request.args.get('format', 'ndjson')
+    use_gzip = _parse_bool_arg('gzip') or False
+    
+    try:
+        chunks = DataExporter.stream(
+            kind,
+            fmt=fmt,
+            gzip=use_gzip,
+            since=DataExporter.parse_time(request.args.get('since')),
+            until=DataExporter.parse_time(request.args.get('until')),
+            url_id=request.args.get('url_id', type=int),
+            domain_id=request.args.get('domain_id', type=int)
+        )
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    
+    filename = f"{kind}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if use_gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template
+from app import db
 from app.models.domain import Domain
 from app.models.url import URL
 from app.models.certificate import Certificate
 from app.models.notification import URLCheck, WhoisRecord, Notification
-from datetime import datetime, timedelta
+from app.utils.expiry import expiring_within
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -13,32 +14,36 @@ def index():
     # 域名统计
     total_domains = Domain.query.count()
     
-    # 根据WHOIS状态统计域名
-    known_domains = 0
-    unknown_domains = 0
-    expiring_domains = 0
+    # 根据WHOIS状态统计域名（在数据库中分组计数）
+    status_stats = {
+        'active': 0,
+        'expiring_soon': 0,
+        'expired': 0,
+        'unknown': 0
+    }
     
-    domains = Domain.query.all()
-    for domain in domains:
-        if domain.status == "unknown":
-            unknown_domains += 1
-        else:
-            known_domains += 1
-            if domain.status in ["expiring_soon", "expired"]:
-                expiring_domains += 1
+    status_counts = db.session.query(
+        Domain.status, db.func.count(Domain.id)
+    ).group_by(Domain.status).all()
+    for status, count in status_counts:
+        status_stats[status] = count
+    
+    unknown_domains = status_stats['unknown']
+    known_domains = total_domains - unknown_domains
+    expiring_domains = status_stats['expiring_soon'] + status_stats['expired']
     
     # URL统计
     total_urls = URL.query.count()
     
     # 证书统计
     expiring_certs = Certificate.query.filter(
-        Certificate.not_after <= datetime.utcnow() + timedelta(days=30),
+        *expiring_within(Certificate.not_after, 30),
         Certificate.is_valid == True
     ).count()
     
     # WHOIS统计
     expiring_whois = WhoisRecord.query.filter(
-        WhoisRecord.expiration_date <= datetime.utcnow() + timedelta(days=30),
+        *expiring_within(WhoisRecord.expiration_date, 30),
         WhoisRecord.is_valid == True
     ).count()
     
@@ -57,27 +62,16 @@ def index():
     
     # 即将到期的证书
     expiring_certificates = Certificate.query.filter(
-        Certificate.not_after <= datetime.utcnow() + timedelta(days=30),
+        *expiring_within(Certificate.not_after, 30),
         Certificate.is_valid == True
     ).order_by(Certificate.not_after).limit(5).all()
     
     # 即将到期的WHOIS
     expiring_whois_records = WhoisRecord.query.filter(
-        WhoisRecord.expiration_date <= datetime.utcnow() + timedelta(days=30),
+        *expiring_within(WhoisRecord.expiration_date, 30),
         WhoisRecord.is_valid == True
     ).order_by(WhoisRecord.expiration_date).limit(5).all()
     
-    # 状态统计
-    status_stats = {
-        'active': 0,
-        'expiring_soon': 0,
-        'expired': 0,
-        'unknown': 0
-    }
-    
-    for domain in domains:
-        status_stats[domain.status] += 1
-    
     return render_template('dashboard/index.html',
                          total_domains=total_domains,
                          known_domains=known_domains,
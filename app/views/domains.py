@@ -1,28 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from app.models.domain import Domain
 from app.models.certificate import Certificate
 from app.models.notification import WhoisRecord, NotificationConfig
 from app import db
-from app.services.ssl_checker import check_single_certificate
-from app.services.whois_checker import check_single_whois
-from app.services.domain_access_checker import check_single_domain_access
-from app.services.cert_parser import CertParser
+from app.services.check_jobs import CheckJobManager
 from app.utils.timezone import get_current_beijing_time
+from app.utils.expiry import to_utc
 from datetime import datetime
-import os
-import threading
 
 domains_bp = Blueprint('domains', __name__)
 
+# 域名状态取值，与 Domain.status 保持一致
+DOMAIN_STATUSES = ('active', 'expiring_soon', 'expired', 'unknown')
+
 @domains_bp.route('/domains')
 def index():
     # 获取搜索参数
     search = request.args.get('search', '')
+    status = request.args.get('status', '')
+    sort = request.args.get('sort', '')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    # 构建查询
-    query = Domain.query
+    # 构建查询；列表页展示每个域名的证书及其域名匹配情况，证书与证书域名索引分批预加载
+    query = Domain.query.options(
+        db.selectinload(Domain.certificates).selectinload(Certificate.hostnames)
+    )
     
     # 搜索功能
     if search:
@@ -31,6 +34,21 @@ def index():
             Domain.description.contains(search)
         )
     
+    # 状态过滤（在数据库中完成）
+    if status in DOMAIN_STATUSES:
+        query = query.filter(Domain.status == status)
+    
+    # 排序
+    if sort == 'name':
+        query = query.order_by(Domain.name)
+    elif sort == 'status':
+        query = query.order_by(Domain.status, Domain.name)
+    elif sort == 'expiration':
+        first_expiration = db.select(WhoisRecord.expiration_date).where(
+            WhoisRecord.domain_id == Domain.id
+        ).order_by(WhoisRecord.id).limit(1).correlate(Domain).scalar_subquery()
+        query = query.order_by(first_expiration.is_(None), first_expiration)
+    
     # 分页
     pagination = query.paginate(
         page=page, 
@@ -44,6 +62,8 @@ def index():
                          domains=domains, 
                          pagination=pagination, 
                          search=search,
+                         status=status,
+                         sort=sort,
                          per_page=per_page)
 
 @domains_bp.route('/domains/new', methods=['GET', 'POST'])
@@ -84,8 +104,12 @@ def new():
         key_file = request.files.get('key_file')
         
         if cert_file and cert_file.filename:
-            # 验证证书文件
-            validation_errors = CertParser.validate_certificate_files(cert_file, key_file)
+            # 证书解析依赖 cryptography，只在上传证书时导入
+            from app.services.cert_parser import CertParser
+            
+            # 解析并验证证书文件（只解析一次，验证与保存共用解析结果）
+            cert_info = CertParser.parse_certificate_file(cert_file)
+            validation_errors = CertParser.validate_certificate_files(cert_file, key_file, cert_info=cert_info)
             if validation_errors:
                 for error in validation_errors:
                     flash(error, 'error')
@@ -95,9 +119,6 @@ def new():
                 return render_template('domains/new.html', notification_configs=NotificationConfig.query.filter_by(is_active=True).all())
             
             try:
-                # 解析证书信息
-                cert_info = CertParser.parse_certificate_file(cert_file)
-                
                 # 保存证书文件
                 cert_save_result = CertParser.save_certificate_file(cert_file, domain.name)
                 
@@ -111,19 +132,9 @@ def new():
                 certificate.issuer = cert_info['issuer']
                 certificate.subject = cert_info['subject']
                 certificate.serial_number = cert_info['serial_number']
-                certificate.not_before = cert_info['not_before']
-                certificate.not_after = cert_info['not_after']
-                
-                # 修复时区问题：确保两个datetime对象都是naive或都是aware
-                not_after = cert_info['not_after']
-                current_time = get_current_beijing_time()
-                
-                # 如果not_after是naive，将其转换为aware（假设为UTC）
-                if not_after.tzinfo is None:
-                    import pytz
-                    not_after = pytz.UTC.localize(not_after)
-                
-                certificate.days_until_expiry = (not_after - current_time).days
+                # 证书时间统一按UTC保存，剩余天数在读取时计算
+                certificate.not_before = to_utc(cert_info['not_before'])
+                certificate.not_after = to_utc(cert_info['not_after'])
                 certificate.is_valid = True
                 certificate.last_checked = get_current_beijing_time()
                 
@@ -136,10 +147,12 @@ def new():
                 if cert_save_result['is_saved']:
                     certificate.cert_file_path = cert_save_result['file_path']
                     certificate.cert_file_name = cert_save_result['file_name']
+                    certificate.cert_sha256 = cert_save_result['sha256']
                 
                 if key_save_result and key_save_result['is_saved']:
                     certificate.key_file_path = key_save_result['file_path']
                     certificate.key_file_name = key_save_result['file_name']
+                    certificate.key_sha256 = key_save_result['sha256']
                 
                 db.session.add(certificate)
                 db.session.commit()
@@ -150,7 +163,7 @@ def new():
                     db.session.commit()
                 
                 flash('证书文件上传成功，证书信息已自动解析，SSL检查已自动启用', 'success')
-                
+            
             except Exception as e:
                 flash(f'证书文件处理失败: {str(e)}', 'error')
                 # 删除已创建的域名
@@ -158,34 +171,9 @@ def new():
                 db.session.commit()
                 return render_template('domains/new.html', notification_configs=NotificationConfig.query.filter_by(is_active=True).all())
         
-        # 如果启用了WHOIS检查，异步进行WHOIS查询
+        # 如果启用了WHOIS检查，写入检查任务队列进行WHOIS查询
         if check_whois:
-            def perform_whois_check():
-                from app import create_app
-                app = create_app(init_scheduler=False)
-                with app.app_context():
-                    try:
-                        # 重新获取domain对象，避免会话绑定问题
-                        current_domain = Domain.query.get(domain.id)
-                        if current_domain:
-                            print(f"开始WHOIS检查: {current_domain.name}")
-                            result = check_single_whois(current_domain.id)
-                            if result:
-                                print(f"WHOIS检查成功: {current_domain.name}")
-                            else:
-                                print(f"WHOIS检查失败: {current_domain.name}")
-                        else:
-                            print(f"域名 {domain.name} 不存在")
-                    except Exception as e:
-                        print(f"WHOIS检查异常: {str(e)}")
-            
-            thread = threading.Thread(target=perform_whois_check)
-            thread.daemon = False  # 改为非守护线程，确保线程能够完成
-            thread.start()
-            
-            # 给线程更多时间开始执行，确保WHOIS检查能够完成
-            import time
-            time.sleep(0.5)  # 增加等待时间
+            CheckJobManager.submit(domain_ids=[domain.id], check_types=['whois'])
         
         # 如果启用了访问检查，自动创建URL监控项
         if check_access:
@@ -217,7 +205,7 @@ def new():
                 db.session.commit()  # 一次性提交所有更改
                 
                 flash('官网可用性监控已自动创建', 'success')
-                
+            
             except Exception as e:
                 db.session.rollback()  # 发生错误时回滚
                 flash(f'创建官网监控失败: {str(e)}', 'error')
@@ -228,6 +216,81 @@ def new():
     
     return render_template('domains/new.html', notification_configs=NotificationConfig.query.filter_by(is_active=True).all())
 
+@domains_bp.route('/domains/import', methods=['GET', 'POST'])
+def import_domains():
+    """批量导入域名（CSV或每行一个域名）"""
+    from app.services.domain_importer import DomainImporter
+    
+    notification_configs = NotificationConfig.query.filter_by(is_active=True).all()
+    
+    if request.method == 'POST':
+        content = request.form.get('domains', '')
+        upload = request.files.get('import_file')
+        if upload and upload.filename:
+            try:
+                content = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                flash('导入文件必须是UTF-8编码', 'error')
+                return render_template('domains/import.html', notification_configs=notification_configs)
+        
+        entries, invalid = DomainImporter.parse(content)
+        if not entries:
+            flash('没有可导入的域名', 'error')
+            return render_template('domains/import.html', notification_configs=notification_configs)
+        
+        notification_config_id = request.form.get('notification_config_id')
+        try:
+            result = DomainImporter.import_domains(
+                entries,
+                check_ssl='check_ssl' in request.form,
+                check_whois='check_whois' in request.form,
+                check_access='check_access' in request.form,
+                notification_config_id=int(notification_config_id) if notification_config_id else None
+            )
+        except Exception as e:
+            flash(f'批量导入失败: {str(e)}', 'error')
+            return render_template('domains/import.html', notification_configs=notification_configs)
+        
+        flash(f"批量导入完成：新增 {result['created']} 个，已存在 {result['existing']} 个，"
+              f"重复 {result['duplicates']} 个，无法识别 {len(invalid)} 行", 'success')
+        if result['job_id']:
+            flash(f"首次检查已加入后台任务 {result['job_id']}，将分散执行", 'info')
+        return redirect(url_for('domains.index'))
+    
+    return render_template('domains/import.html', notification_configs=notification_configs)
+
+@domains_bp.route('/domains/import_certificates', methods=['GET', 'POST'])
+def import_certificates():
+    """批量导入证书（zip压缩包或包含多个证书/私钥的PEM文件），按证书域名自动匹配已有域名"""
+    from app.services.cert_bundle import CertBundleImporter, CertBundleError
+    
+    if request.method == 'POST':
+        upload = request.files.get('bundle_file')
+        if not upload or not upload.filename:
+            flash('请上传证书包', 'error')
+            return render_template('domains/import_certificates.html', result=None)
+        
+        try:
+            # 多读一个字节用于判断是否超过大小限制
+            data = upload.read(current_app.config['CERT_BUNDLE_MAX_BYTES'] + 1)
+            result = CertBundleImporter.import_bundle(CertBundleImporter.read_bundle(upload.filename, data))
+        except CertBundleError as e:
+            flash(str(e), 'error')
+            return render_template('domains/import_certificates.html', result=None)
+        except Exception as e:
+            flash(f'证书导入失败: {str(e)}', 'error')
+            return render_template('domains/import_certificates.html', result=None)
+        
+        if not result['certificates'] and not result['errors']:
+            flash('证书包中没有找到PEM格式的证书', 'error')
+        else:
+            flash(f"证书导入完成：证书 {result['certificates']} 张（配对私钥 {result['paired']} 张），"
+                  f"匹配域名 {result['matched_domains']} 个，未匹配证书 {len(result['unmatched'])} 张，"
+                  f"解析失败 {len(result['errors'])} 个", 'success')
+        return render_template('domains/import_certificates.html', result=result)
+    
+    return render_template('domains/import_certificates.html', result=None)
+
 @domains_bp.route('/domains/<int:id>')
 def show(id):
     domain = Domain.query.get_or_404(id)
@@ -237,16 +300,20 @@ def show(id):
 def check(id):
     domain = Domain.query.get_or_404(id)
     
+    check_types = []
     if domain.check_ssl:
-        check_single_certificate(domain.id)
-    
+        check_types.append('ssl')
     if domain.check_whois:
-        check_single_whois(domain.id)
-    
+        check_types.append('whois')
     if domain.check_access:
-        check_single_domain_access(domain.id)
+        check_types.append('access')
+    
+    if not check_types:
+        flash('没有启用任何检查项目', 'warning')
+        return redirect(url_for('domains.show', id=id))
     
-    flash('检查完成', 'info')
+    CheckJobManager.submit(domain_ids=[domain.id], check_types=check_types)
+    flash('检查已开始，请稍后刷新页面查看结果', 'info')
     return redirect(url_for('domains.show', id=id))
 
 @domains_bp.route('/domains/<int:id>/check_async', methods=['POST'])
@@ -260,82 +327,31 @@ def check_async(id):
     try:
         # 检查启用了哪些检查
         checks_to_perform = []
+        check_types = []
         if domain.check_whois:
             checks_to_perform.append('WHOIS')
+            check_types.append('whois')
         if domain.check_ssl and domain.certificates:
             checks_to_perform.append('SSL证书')
+            check_types.append('ssl')
         if domain.check_access:
             checks_to_perform.append('访问检查')
+            check_types.append('access')
         
         if not checks_to_perform:
             return jsonify({'status': 'error', 'message': '没有启用任何检查项目'})
         
-
-        
-        # 启动异步线程
-        def perform_async_check():
-            from app import create_app
-            app = create_app(init_scheduler=False)
-            with app.app_context():
-                try:
-                    results = []
-                    
-                    # 重新获取域名对象（在应用上下文中）
-                    current_domain = Domain.query.get(domain.id)
-                    if not current_domain:
-                        print(f"域名 {domain.name} 不存在")
-                        return
-                    
-                    # 执行WHOIS检查
-                    if current_domain.check_whois:
-                        try:
-                            check_single_whois(current_domain.id)
-                            results.append('WHOIS检查完成')
-                        except Exception as e:
-                            print(f'WHOIS检查失败: {str(e)}')
-                            results.append(f'WHOIS检查失败: {str(e)}')
-                    
-                    # 执行SSL证书检查
-                    if current_domain.check_ssl and current_domain.certificates:
-                        try:
-                            check_single_certificate(current_domain.id)
-                            results.append('SSL证书检查完成')
-                        except Exception as e:
-                            print(f'SSL证书检查失败: {str(e)}')
-                            results.append(f'SSL证书检查失败: {str(e)}')
-                    
-                    # 执行访问检查
-                    if current_domain.check_access:
-                        try:
-                            # 优先使用URL监控检查
-                            if current_domain.website_url_id:
-                                from app.services.url_checker import URLChecker
-                                URLChecker.check_single_url(current_domain.website_url_id)
-                                results.append('官网可用性检查完成')
-                            else:
-                                # 回退到旧的访问检查
-                                check_single_domain_access(current_domain.id)
-                                results.append('访问检查完成')
-                        except Exception as e:
-                            print(f'访问检查失败: {str(e)}')
-                            results.append(f'访问检查失败: {str(e)}')
-                    
-                    print(f"域名 {current_domain.name} 异步检查完成: {', '.join(results)}")
-                        
-                except Exception as e:
-                    print(f"异步检查失败 {domain.name}: {str(e)}")
-        
-        thread = threading.Thread(target=perform_async_check)
-        thread.daemon = True
-        thread.start()
+        # 写入检查任务队列，与未完成的相同检查合并
+        job, _ = CheckJobManager.submit(domain_ids=[domain.id], check_types=check_types)
         
         checks_text = '、'.join(checks_to_perform)
         return jsonify({
             'status': 'success', 
             'message': f'已开始执行{checks_text}检查，请稍后刷新页面查看结果',
-            'checks': checks_to_perform
+            'checks': checks_to_perform,
+            'job_id': job.id
         })
-        
+    
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'启动检查失败: {str(e)}'})
 
@@ -344,19 +360,7 @@ def check_whois_async(id):
     """异步WHOIS检查接口"""
     domain = Domain.query.get_or_404(id)
     
-    def async_whois_check():
-        from app import create_app
-        app = create_app(init_scheduler=False)
-        with app.app_context():
-            try:
-                check_single_whois(domain.id)
-            except Exception as e:
-                print(f"异步WHOIS查询失败 {domain.name}: {str(e)}")
-    
-    # 启动异步线程
-    thread = threading.Thread(target=async_whois_check)
-    thread.daemon = True
-    thread.start()
+    CheckJobManager.submit(domain_ids=[domain.id], check_types=['whois'])
     
     return jsonify({'status': 'success', 'message': 'WHOIS查询已开始'})
 
@@ -365,19 +369,7 @@ def check_access_async(id):
     """异步访问检查接口"""
     domain = Domain.query.get_or_404(id)
     
-    def async_access_check():
-        from app import create_app
-        app = create_app(init_scheduler=False)
-        with app.app_context():
-            try:
-                check_single_domain_access(domain.id)
-            except Exception as e:
-                print(f"异步访问检查失败 {domain.name}: {str(e)}")
-    
-    # 启动异步线程
-    thread = threading.Thread(target=async_access_check)
-    thread.daemon = True
-    thread.start()
+    CheckJobManager.submit(domain_ids=[domain.id], check_types=['access'])
     
     return jsonify({'status': 'success', 'message': '访问检查已开始'})
 
@@ -396,25 +388,8 @@ def edit(id):
         notification_config_id = request.form.get('notification_config_id')
         domain.notification_config_id = notification_config_id if notification_config_id else None
         
-        # 如果启用了WHOIS检查且之前未启用，异步进行WHOIS查询
-        if domain.check_whois and not old_check_whois:
-            def perform_whois_check():
-                from app import create_app
-                app = create_app(init_scheduler=False)
-                with app.app_context():
-                    try:
-                        # 重新获取domain对象，避免会话绑定问题
-                        current_domain = Domain.query.get(domain.id)
-                        if current_domain:
-                            check_single_whois(current_domain.id)
-                        else:
-                            print(f"域名 {domain.name} 不存在")
-                    except Exception as e:
-                        print(f"WHOIS检查失败: {str(e)}")
-            
-            thread = threading.Thread(target=perform_whois_check)
-            thread.daemon = True
-            thread.start()
+        # 如果启用了WHOIS检查且之前未启用，保存后异步进行WHOIS查询
+        start_whois_check = domain.check_whois and not old_check_whois
         
         # 如果启用了访问检查且之前未启用，创建URL监控项
         if domain.check_access and not old_check_access:
@@ -448,7 +423,7 @@ def edit(id):
                     db.session.commit()  # 一次性提交所有更改
                     
                     flash('官网可用性监控已自动创建', 'success')
-                
+            
             except Exception as e:
                 db.session.rollback()  # 发生错误时回滚
                 flash(f'创建官网监控失败: {str(e)}', 'error')
@@ -473,25 +448,19 @@ def edit(id):
         key_file = request.files.get('key_file')
         
         if cert_file and cert_file.filename:
-            # 验证证书文件
-            validation_errors = CertParser.validate_certificate_files(cert_file, key_file)
+            # 证书解析依赖 cryptography，只在上传证书时导入
+            from app.services.cert_parser import CertParser
+            
+            # 解析并验证证书文件（只解析一次，验证与保存共用解析结果）
+            cert_info = CertParser.parse_certificate_file(cert_file)
+            validation_errors = CertParser.validate_certificate_files(cert_file, key_file, cert_info=cert_info)
             if validation_errors:
                 for error in validation_errors:
                     flash(error, 'error')
                 return render_template('domains/edit.html', domain=domain, notification_configs=NotificationConfig.query.filter_by(is_active=True).all())
             
             try:
-                # 删除旧的证书文件
-                for certificate in domain.certificates:
-                    if certificate.cert_file_path and os.path.exists(certificate.cert_file_path):
-                        os.remove(certificate.cert_file_path)
-                    if certificate.key_file_path and os.path.exists(certificate.key_file_path):
-                        os.remove(certificate.key_file_path)
-                
-                # 解析新证书信息
-                cert_info = CertParser.parse_certificate_file(cert_file)
-                
-                # 保存新证书文件
+                # 保存新证书文件（旧文件可能被其他证书共用，不再引用后由垃圾回收清理）
                 cert_save_result = CertParser.save_certificate_file(cert_file, domain.name)
                 
                 # 保存新私钥文件（如果提供）
@@ -509,19 +478,9 @@ def edit(id):
                 certificate.issuer = cert_info['issuer']
                 certificate.subject = cert_info['subject']
                 certificate.serial_number = cert_info['serial_number']
-                certificate.not_before = cert_info['not_before']
-                certificate.not_after = cert_info['not_after']
-                
-                # 修复时区问题：确保两个datetime对象都是naive或都是aware
-                not_after = cert_info['not_after']
-                current_time = get_current_beijing_time()
-                
-                # 如果not_after是naive，将其转换为aware（假设为UTC）
-                if not_after.tzinfo is None:
-                    import pytz
-                    not_after = pytz.UTC.localize(not_after)
-                
-                certificate.days_until_expiry = (not_after - current_time).days
+                # 证书时间统一按UTC保存，剩余天数在读取时计算
+                certificate.not_before = to_utc(cert_info['not_before'])
+                certificate.not_after = to_utc(cert_info['not_after'])
                 certificate.is_valid = True
                 certificate.last_checked = get_current_beijing_time()
                 
@@ -534,22 +493,28 @@ def edit(id):
                 if cert_save_result['is_saved']:
                     certificate.cert_file_path = cert_save_result['file_path']
                     certificate.cert_file_name = cert_save_result['file_name']
+                    certificate.cert_sha256 = cert_save_result['sha256']
                 
                 if key_save_result and key_save_result['is_saved']:
                     certificate.key_file_path = key_save_result['file_path']
                     certificate.key_file_name = key_save_result['file_name']
+                    certificate.key_sha256 = key_save_result['sha256']
                 
                 # 如果上传了证书，自动启用SSL检查
                 if not domain.check_ssl:
                     domain.check_ssl = True
                 
                 flash('证书文件更新成功，证书信息已自动解析，SSL检查已自动启用', 'success')
-                
+            
             except Exception as e:
                 flash(f'证书文件处理失败: {str(e)}', 'error')
                 return render_template('domains/edit.html', domain=domain, notification_configs=NotificationConfig.query.filter_by(is_active=True).all())
         
         db.session.commit()
+        
+        if start_whois_check:
+            CheckJobManager.submit(domain_ids=[domain.id], check_types=['whois'])
+        
         flash('域名更新成功！', 'success')
         return redirect(url_for('domains.show', id=id))
     
@@ -559,12 +524,7 @@ def edit(id):
 def delete(id):
     domain = Domain.query.get_or_404(id)
     
-    # 删除相关的证书文件
-    for certificate in domain.certificates:
-        if certificate.cert_file_path and os.path.exists(certificate.cert_file_path):
-            os.remove(certificate.cert_file_path)
-        if certificate.key_file_path and os.path.exists(certificate.key_file_path):
-            os.remove(certificate.key_file_path)
+    # 证书文件按内容共享存储，删除证书记录后不再引用的文件由垃圾回收清理
     
     # 删除关联的官网URL监控项
     if domain.website_url_id:
@@ -584,14 +544,7 @@ def clear_certificate(id):
     domain = Domain.query.get_or_404(id)
     
     try:
-        # 删除相关的证书文件
-        for certificate in domain.certificates:
-            if certificate.cert_file_path and os.path.exists(certificate.cert_file_path):
-                os.remove(certificate.cert_file_path)
-            if certificate.key_file_path and os.path.exists(certificate.key_file_path):
-                os.remove(certificate.key_file_path)
-        
-        # 删除数据库中的证书记录
+        # 删除数据库中的证书记录（不再引用的证书文件由垃圾回收清理）
         for certificate in domain.certificates:
             db.session.delete(certificate)
         
@@ -600,7 +553,7 @@ def clear_certificate(id):
         
         db.session.commit()
         flash('证书已成功清空，SSL检查已禁用', 'success')
-        
+    
     except Exception as e:
         db.session.rollback()
         flash(f'清空证书失败: {str(e)}', 'error')
@@ -619,25 +572,14 @@ def refresh_whois(id):
         })
     
     try:
-        # 在后台线程中执行WHOIS检查
-        def perform_whois_check():
-            from app import create_app
-            app = create_app(init_scheduler=False)
-            with app.app_context():
-                try:
-                    check_single_whois(domain.id)
-                except Exception as e:
-                    print(f"WHOIS检查失败: {str(e)}")
-        
-        thread = threading.Thread(target=perform_whois_check)
-        thread.daemon = True
-        thread.start()
+        # 写入检查任务队列执行WHOIS检查
+        CheckJobManager.submit(domain_ids=[domain.id], check_types=['whois'])
         
         return jsonify({
             'status': 'success',
             'message': 'WHOIS信息刷新已开始，请稍后查看结果'
         })
-        
+    
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -655,59 +597,17 @@ def refresh_access(id):
             'message': '该域名未启用官网可用性检查功能'
         })
     
-    # 优先使用URL监控检查
-    if domain.website_url_id:
-        try:
-            from app.services.url_checker import URLChecker
-            
-            # 在后台线程中执行URL检查
-            def perform_url_check():
-                from app import create_app
-                app = create_app(init_scheduler=False)
-                with app.app_context():
-                    try:
-                        URLChecker.check_single_url(domain.website_url_id)
-                    except Exception as e:
-                        print(f"URL检查失败: {str(e)}")
-            
-            thread = threading.Thread(target=perform_url_check)
-            thread.daemon = True
-            thread.start()
-            
-            return jsonify({
-                'status': 'success',
-                'message': '官网可用性检查已开始，请稍后查看结果'
-            })
-            
-        except Exception as e:
-            return jsonify({
-                'status': 'error',
-                'message': f'官网可用性刷新失败: {str(e)}'
-            })
-    else:
-        # 回退到旧的访问检查
-        try:
-            # 在后台线程中执行访问检查
-            def perform_access_check():
-                from app import create_app
-                app = create_app(init_scheduler=False)
-                with app.app_context():
-                    try:
-                        check_single_domain_access(domain.id)
-                    except Exception as e:
-                        print(f"访问检查失败: {str(e)}")
-            
-            thread = threading.Thread(target=perform_access_check)
-            thread.daemon = True
-            thread.start()
-            
-            return jsonify({
-                'status': 'success',
-                'message': '官网可用性检查已开始，请稍后查看结果'
-            })
-            
-        except Exception as e:
-            return jsonify({
-                'status': 'error',
-                'message': f'官网可用性刷新失败: {str(e)}'
-            })
+    try:
+        # 写入检查任务队列，优先使用URL监控检查，回退到旧的访问检查
+        CheckJobManager.submit(domain_ids=[domain.id], check_types=['access'])
+        
+        return jsonify({
+            'status': 'success',
+            'message': '官网可用性检查已开始，请稍后查看结果'
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'官网可用性刷新失败: {str(e)}'
+        })
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response
+from app.utils.metrics import REGISTRY
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Prometheus格式的运行指标（仅本Web进程）
+    定时检查、任务队列与调度器的指标在工作进程中，由工作进程的 METRICS_PORT 监听暴露
+    """
+    return Response(REGISTRY.generate_latest(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,7 +2,6 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app.models.proxy import Proxy
 from app import db
 from datetime import datetime
-import requests
 import time
 
 proxies_bp = Blueprint('proxies', __name__)
@@ -148,6 +147,8 @@ def delete(id):
 @proxies_bp.route('/proxies/<int:id>/test', methods=['POST'])
 def test_proxy(id):
     """测试代理连接"""
+    import requests
+    
     proxy = Proxy.query.get_or_404(id)
     
     try:
@@ -3,7 +3,7 @@ from app.models.url import URL
 from app.models.notification import URLCheck, NotificationConfig
 from app.models.proxy import Proxy
 from app import db
-from app.services.url_checker import check_single_url
+from app.services.check_jobs import CheckJobManager
 from app.utils.timezone import get_current_beijing_time
 import json
 
@@ -186,21 +186,8 @@ def check_async(id):
         return jsonify({'status': 'error', 'message': 'URL监控已禁用'})
     
     try:
-        import threading
-        from app.services.url_checker import URLChecker
-        
-        def async_check():
-            from app import create_app
-            app = create_app(init_scheduler=False)
-            with app.app_context():
-                try:
-                    URLChecker.check_single_url(url_obj.id)
-                except Exception as e:
-                    print(f"异步URL检查失败 {url_obj.name}: {str(e)}")
-        
-        thread = threading.Thread(target=async_check)
-        thread.daemon = True
-        thread.start()
+        # 写入检查任务队列，与未完成的相同检查合并
+        CheckJobManager.submit(url_ids=[url_obj.id], check_types=['url'])
         
         return jsonify({
             'status': 'success', 
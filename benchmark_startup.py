@@ -0,0 +1,50 @@
+"""
+启动耗时基准测试
+每个场景在新的Python进程中执行多次，取中位数，用于比较导入和创建应用的冷启动耗时
+用法: python benchmark_startup.py [运行次数，默认7]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+# 场景名称 -> 在新进程中执行的代码，代码需打印耗时（秒）
+SCENARIOS = [
+    ('import app', "import app"),
+    ('Web应用 create_app()', "from app import create_app; create_app()"),
+    ('工作进程/命令行 create_app(web=False)', "from app import create_app; create_app(web=False)"),
+    ('导入检查模块（SSL/WHOIS）', "import app.services.ssl_checker, app.services.whois_checker"),
+    ('导入证书解析模块', "import app.services.cert_parser"),
+]
+
+TEMPLATE = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+def measure(code, runs):
+    """在新进程中执行代码 runs 次，返回每次的耗时（毫秒）"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', TEMPLATE.format(code=code)],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True
+        ).stdout
+        results.append(float(output.strip().splitlines()[-1]) * 1000)
+    return results
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    print(f"启动耗时基准测试（每个场景 {runs} 次，单位毫秒）")
+    print(f"{'场景':<40}{'中位数':>10}{'最小':>10}{'最大':>10}")
+    for name, code in SCENARIOS:
+        results = measure(code, runs)
+        print(f"{name:<40}{statistics.median(results):>10.0f}{min(results):>10.0f}{max(results):>10.0f}")
+
+if __name__ == '__main__':
+    main()
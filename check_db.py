@@ -5,7 +5,7 @@ from app import create_app
 
 def get_database_path():
     """从配置中获取数据库路径"""
-    app = create_app(init_scheduler=False)  # 不初始化调度器
+    app = create_app(web=False)  # 不初始化调度器和Web部分
     db_uri = app.config['SQLALCHEMY_DATABASE_URI']
     if db_uri.startswith('sqlite:///'):
         db_path = db_uri.replace('sqlite:///', '')
@@ -16,7 +16,7 @@ def get_database_path():
 
 def get_actual_database_path():
     """获取实际的数据库文件路径（考虑Flask的instance_path）"""
-    app = create_app(init_scheduler=False)  # 不初始化调度器
+    app = create_app(web=False)  # 不初始化调度器和Web部分
     # 首先尝试从配置中获取的路径
     config_path = get_database_path()
     if config_path and os.path.exists(config_path):
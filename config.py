@@ -29,6 +29,74 @@ class Config:
     CERT_CHECK_INTERVAL = int(os.environ.get('CERT_CHECK_INTERVAL') or 24)  # 小时
     URL_CHECK_INTERVAL = int(os.environ.get('URL_CHECK_INTERVAL') or 1)     # 小时
     NOTIFICATION_DAYS_BEFORE = int(os.environ.get('NOTIFICATION_DAYS_BEFORE') or 30)
+    
+    # 证书批量扫描配置
+    TLS_SCAN_WORKERS = int(os.environ.get('TLS_SCAN_WORKERS') or 50)  # 并发握手数
+    TLS_SCAN_PER_IP = int(os.environ.get('TLS_SCAN_PER_IP') or 4)  # 同一IP的并发握手上限
+    TLS_HANDSHAKE_TIMEOUT = float(os.environ.get('TLS_HANDSHAKE_TIMEOUT') or 10)  # 单次连接与握手的截止时间（秒）
+    TLS_SCAN_ALL_IPS = os.environ.get('TLS_SCAN_ALL_IPS', 'false').lower() in ['true', 'on', '1']  # 对域名的每个A/AAAA记录分别握手
+    TLS_SCAN_MAX_IPS = int(os.environ.get('TLS_SCAN_MAX_IPS') or 16)  # 多IP模式下每个域名最多检查的IP数
+    
+    # 工作进程指标监听：Web进程的 /metrics 只包含Web请求的指标，定时检查、任务队列与调度器的指标由工作进程在该端口暴露
+    METRICS_PORT = int(os.environ.get('METRICS_PORT') or 9108)  # 工作进程指标监听端口，0表示不监听；同一主机运行多个工作进程时需分别设置
+    METRICS_HOST = os.environ.get('METRICS_HOST') or '127.0.0.1'  # 监听地址，Prometheus 在其他主机抓取时设为 0.0.0.0
+    
+    # 后台任务配置
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS') or 8)  # 后台检查线程数
+    BACKGROUND_QUEUE_SIZE = int(os.environ.get('BACKGROUND_QUEUE_SIZE') or 200)  # 后台任务等待队列上限
+    BACKGROUND_SUBMIT_TIMEOUT = float(os.environ.get('BACKGROUND_SUBMIT_TIMEOUT') or 2)  # 队列满时提交的最长等待时间（秒）
+    CHECK_JOB_RETENTION = int(os.environ.get('CHECK_JOB_RETENTION') or 200)  # 保留的已完成批量任务数
+    CHECK_FRESHNESS_SECONDS = int(os.environ.get('CHECK_FRESHNESS_SECONDS') or 30)  # 该时间内重复的检查直接返回上次结果
+    
+    # 持久化任务队列配置
+    TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL') or 2)  # 空闲时轮询任务表的间隔（秒）
+    TASK_CLAIM_BATCH = int(os.environ.get('TASK_CLAIM_BATCH') or 16)  # 每个工作进程同时持有的任务数上限
+    TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS') or 120)  # 任务租约时长，执行中定期续约
+    TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS') or 3)  # 失败后最多执行次数
+    TASK_RETRY_BACKOFF = int(os.environ.get('TASK_RETRY_BACKOFF') or 60)  # 重试退避基数（秒），按次数指数增长
+    TASK_MAINTENANCE_INTERVAL = int(os.environ.get('TASK_MAINTENANCE_INTERVAL') or 60)  # 回收租约与清理的间隔（秒）
+    TASK_RETENTION_HOURS = int(os.environ.get('TASK_RETENTION_HOURS') or 24)  # 已完成任务的保留时间
+    WHOIS_QUERYING_TIMEOUT = int(os.environ.get('WHOIS_QUERYING_TIMEOUT') or 600)  # “查询中”标记超过该时间视为中断（秒）
+    
+    # 集群配置：多个工作进程（可在不同主机上）共享数据库时按一致性哈希分担定时检查
+    CLUSTER_ENABLED = os.environ.get('CLUSTER_ENABLED', 'false').lower() in ['true', 'on', '1']
+    CLUSTER_HEARTBEAT_SECONDS = int(os.environ.get('CLUSTER_HEARTBEAT_SECONDS') or 15)  # 成员续约间隔
+    CLUSTER_LEASE_SECONDS = int(os.environ.get('CLUSTER_LEASE_SECONDS') or 45)  # 超过该时间未续约视为成员退出
+    CLUSTER_HASH_REPLICAS = int(os.environ.get('CLUSTER_HASH_REPLICAS') or 64)  # 每个成员在哈希环上的虚拟节点数
+    CLUSTER_CLAIM_RETENTION_DAYS = int(os.environ.get('CLUSTER_CLAIM_RETENTION_DAYS') or 3)  # 周期领取记录保留天数
+    CLUSTER_CLAIM_BATCH = int(os.environ.get('CLUSTER_CLAIM_BATCH') or 100)  # 批量检查每次领取的目标数，领取后立即检查
+    CLUSTER_CLAIM_LEASE_SECONDS = int(os.environ.get('CLUSTER_CLAIM_LEASE_SECONDS') or 1800)  # 领取租约时长，需大于一批检查的耗时
+    CLUSTER_SWEEP_SECONDS = int(os.environ.get('CLUSTER_SWEEP_SECONDS') or 600)  # 补查本周期遗漏目标（无人领取或领取者已退出）的间隔
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 500)  # 批量导入每批插入的域名数
+    IMPORT_CHECKS_PER_MINUTE = int(os.environ.get('IMPORT_CHECKS_PER_MINUTE') or 120)  # 导入后首次检查的提交速率
+    
+    # 证书包批量导入配置
+    CERT_BUNDLE_MAX_BYTES = int(os.environ.get('CERT_BUNDLE_MAX_BYTES') or 50 * 1024 * 1024)  # 证书包（解压后）大小上限
+    CERT_BUNDLE_MAX_FILES = int(os.environ.get('CERT_BUNDLE_MAX_FILES') or 5000)  # 压缩包中的文件数上限
+    CERT_BUNDLE_WORKERS = int(os.environ.get('CERT_BUNDLE_WORKERS') or min(os.cpu_count() or 1, 4))  # 解析证书的进程数，1表示不使用进程池
+    
+    # 证书文件存储配置（按内容寻址，相同证书只保存一份）
+    CERT_STORE_GC_GRACE_HOURS = int(os.environ.get('CERT_STORE_GC_GRACE_HOURS') or 24)  # 不再引用的文件超过该时间才被垃圾回收删除
+    CERT_STORE_GC_HOUR = int(os.environ.get('CERT_STORE_GC_HOUR') or 4)  # 每天执行垃圾回收的时间（点）
+    
+    # 证书解析缓存配置（按DER指纹缓存解析结果，每张证书在进程内只解码一次）
+    CERT_CACHE_SIZE = int(os.environ.get('CERT_CACHE_SIZE') or 4096)  # 缓存的证书数上限（LRU）
+    CERT_CACHE_PATH = os.environ.get('CERT_CACHE_PATH') or ''  # 持久化文件路径，例如 instance/cert_cache.json，为空不持久化
+    
+    # WHOIS服务器（IANA referral）缓存配置
+    WHOIS_REFERRAL_TTL_DAYS = int(os.environ.get('WHOIS_REFERRAL_TTL_DAYS') or 30)  # 查询到服务器的后缀的缓存有效期（天）
+    WHOIS_REFERRAL_NEGATIVE_TTL_HOURS = int(os.environ.get('WHOIS_REFERRAL_NEGATIVE_TTL_HOURS') or 24)  # 没有服务器或查询失败时的缓存有效期（小时）
+    
+    # WHOIS对冲查询配置：先查询排序最靠前的服务器，超过对冲间隔仍无结果时并行查询下一个服务器
+    WHOIS_HEDGED = os.environ.get('WHOIS_HEDGED', 'true').lower() in ['true', 'on', '1']  # 关闭时逐个查询服务器
+    WHOIS_HEDGE_DELAY = float(os.environ.get('WHOIS_HEDGE_DELAY') or 2)  # 启动下一个服务器查询前的等待时间（秒）
+    
+    # WHOIS服务器限速配置（每个服务器一个令牌桶，单个查询与批量检查共用；集群模式下为所有工作进程的合计限速，按存活进程数平均分摊）
+    WHOIS_RATE_PER_MINUTE = float(os.environ.get('WHOIS_RATE_PER_MINUTE') or 30)  # 未单独配置的服务器每分钟查询数上限
+    WHOIS_RATE_BURST = float(os.environ.get('WHOIS_RATE_BURST') or 5)  # 未单独配置的服务器允许的突发查询数
+    WHOIS_RATE_LIMITS = os.environ.get('WHOIS_RATE_LIMITS') or ''  # 单独配置，例如 whois.markmonitor.com=10/2,whois.verisign-grs.com=120（每分钟查询数/突发数）
+    WHOIS_BULK_WORKERS = int(os.environ.get('WHOIS_BULK_WORKERS') or 8)  # 批量检查的并发查询数
+    WHOIS_BULK_PER_SERVER = int(os.environ.get('WHOIS_BULK_PER_SERVER') or 2)  # 批量检查时同一服务器的并发查询数上限
 
 class DevelopmentConfig(Config):
     DEBUG = True
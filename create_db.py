@@ -66,7 +66,7 @@ def create_database():
         ensure_instance_directory()
         
         # 创建应用实例
-        app = create_app()
+        app = create_app(web=False)
         
         with app.app_context():
             # 导入所有模型
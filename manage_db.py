@@ -13,7 +13,7 @@ from app import create_app, db
 
 def get_database_path():
     """从配置中获取数据库路径"""
-    app = create_app(init_scheduler=False)  # 不初始化调度器
+    app = create_app(web=False)  # 不初始化调度器和Web部分
     db_uri = app.config['SQLALCHEMY_DATABASE_URI']
     if db_uri.startswith('sqlite:///'):
         db_path = db_uri.replace('sqlite:///', '')
@@ -28,7 +28,7 @@ def get_database_path():
 
 def get_actual_database_path():
     """获取实际的数据库文件路径（考虑Flask的instance_path）"""
-    app = create_app(init_scheduler=False)  # 不初始化调度器
+    app = create_app(web=False)  # 不初始化调度器和Web部分
     # 首先尝试从配置中获取的路径
     config_path = get_database_path()
     if config_path and os.path.exists(config_path):
@@ -59,14 +59,42 @@ def import_all_models():
     try:
         from app.models.domain import Domain
         from app.models.url import URL
-        from app.models.certificate import Certificate
-        from app.models.notification import URLCheck, WhoisRecord, Notification, NotificationConfig, DomainAccessCheck
+        from app.models.certificate import Certificate, CertificateChange, CertificateEndpoint, CertificateHostname
+        from app.models.notification import URLCheck, WhoisRecord, WhoisReferral, Notification, NotificationConfig, DomainAccessCheck
         from app.models.proxy import Proxy
+        from app.models.check_task import CheckTask
+        from app.models.cluster import WorkerNode, CheckClaim
         return True
     except ImportError as e:
         print(f"❌ 模型导入失败: {e}")
         return False
 
+def add_missing_columns():
+    """
+    为已存在的表补加模型中新增的列（create_all 不会修改已有的表）
+    新增列均按可为空添加，已有记录的新列为空，由后续检查或命令补齐
+    :return: 补加的列，格式为 表名.列名
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = db.engine.dialect.identifier_preparer
+    
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
 def create_database():
     """创建数据库"""
     print("🚀 开始创建数据库...")
@@ -76,7 +104,7 @@ def create_database():
         ensure_instance_directory()
         
         # 创建应用实例
-        app = create_app()
+        app = create_app(web=False)
         
         with app.app_context():
             # 导入所有模型
@@ -96,13 +124,30 @@ def create_database():
             db.create_all()
             print("✅ 数据库表创建成功！")
             
+            # 已存在的表不会被 create_all 修改，先补加新增的列（如证书指纹、内容哈希），再补建索引
+            added = add_missing_columns()
+            if added:
+                print(f"✅ 已补加 {len(added)} 个新增列: {', '.join(added)}")
+            
+            # 补建模型中新增的索引（如证书到期时间索引）
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
+            
+            # 新建的证书域名索引表为空时，按已有证书补建索引
+            from app.models.certificate import Certificate, CertificateHostname
+            if Certificate.query.first() and not CertificateHostname.query.first():
+                from app.services.cert_coverage import CertificateCoverage
+                count = CertificateCoverage.rebuild_index()
+                print(f"✅ 已为 {count} 张证书建立域名索引")
+            
             # 验证表是否创建成功
             inspector = db.inspect(db.engine)
             tables = inspector.get_table_names()
             print(f"📋 创建的表: {tables}")
             
             return True
-            
+    
     except Exception as e:
         print(f"❌ 创建数据库时出错: {e}")
         import traceback
@@ -123,10 +168,10 @@ def check_database():
     if not os.path.exists(db_path):
         print(f"❌ 数据库文件不存在: {db_path}")
         return False
-
+    
     print(f"💾 数据库文件路径: {db_path}")
     print(f"📊 数据库文件大小: {os.path.getsize(db_path):,} 字节")
-
+    
     # 连接到数据库
     try:
         conn = sqlite3.connect(db_path)
@@ -170,7 +215,7 @@ def check_database():
         
         conn.close()
         return True
-        
+    
     except sqlite3.Error as e:
         print(f"❌ 数据库错误: {e}")
         return False
@@ -296,11 +341,203 @@ def optimize_database():
         conn.close()
         print("✅ 数据库优化完成")
         return True
-        
+    
     except sqlite3.Error as e:
         print(f"❌ 优化失败: {e}")
         return False
 
+def export_data(args):
+    """流式导出检查历史与资产清单"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py export')
+    parser.add_argument('kind', choices=['url_checks', 'domains', 'certificates', 'whois'])
+    parser.add_argument('--format', dest='fmt', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    parser.add_argument('--url-id', type=int)
+    parser.add_argument('--domain-id', type=int)
+    parser.add_argument('--output', '-o', help='输出文件，默认输出到标准输出')
+    options = parser.parse_args(args)
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.exporter import DataExporter
+        
+        try:
+            chunks = DataExporter.stream(
+                options.kind,
+                fmt=options.fmt,
+                gzip=options.gzip,
+                since=DataExporter.parse_time(options.since),
+                until=DataExporter.parse_time(options.until),
+                url_id=options.url_id,
+                domain_id=options.domain_id
+            )
+        except ValueError as e:
+            print(f"❌ 导出参数错误: {e}", file=sys.stderr)
+            return False
+        
+        output = open(options.output, 'wb') if options.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options.output:
+                output.close()
+    
+    if options.output:
+        print(f"✅ 导出完成: {options.output}", file=sys.stderr)
+    return True
+
+def import_domains(args):
+    """从CSV或纯文本文件批量导入域名"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py import-domains')
+    parser.add_argument('file', help='CSV或每行一个域名的文本文件')
+    parser.add_argument('--no-ssl', action='store_true', help='不启用SSL检查')
+    parser.add_argument('--no-whois', action='store_true', help='不启用WHOIS检查')
+    parser.add_argument('--access', action='store_true', help='启用URL监控')
+    parser.add_argument('--notification-config-id', type=int)
+    parser.add_argument('--no-checks', action='store_true', help='不提交首次检查，等待定时检查')
+    options = parser.parse_args(args)
+    
+    try:
+        with open(options.file, 'r', encoding='utf-8-sig') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"❌ 读取导入文件失败: {e}")
+        return False
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.domain_importer import DomainImporter
+        
+        entries, invalid = DomainImporter.parse(content)
+        for line in invalid:
+            print(f"⚠️  无法识别的行: {line}")
+        if not entries:
+            print("❌ 没有可导入的域名")
+            return False
+        
+        result = DomainImporter.import_domains(
+            entries,
+            check_ssl=not options.no_ssl,
+            check_whois=not options.no_whois,
+            check_access=options.access,
+            notification_config_id=options.notification_config_id,
+            enqueue_checks=not options.no_checks
+        )
+        print(f"✅ 新增 {result['created']} 个，已存在 {result['existing']} 个，"
+              f"重复 {result['duplicates']} 个，无法识别 {len(invalid)} 行")
+        if result['job_id']:
+            print(f"ℹ️  首次检查已写入任务队列（任务ID: {result['job_id']}），将由运行中的服务分散执行")
+    
+    return True
+
+def import_certificates(args):
+    """从zip压缩包或多证书PEM文件批量导入证书"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py import-certificates')
+    parser.add_argument('file', help='包含证书与私钥的zip压缩包或PEM文件')
+    options = parser.parse_args(args)
+    
+    try:
+        with open(options.file, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"❌ 读取证书包失败: {e}")
+        return False
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.cert_bundle import CertBundleImporter, CertBundleError
+        
+        try:
+            result = CertBundleImporter.import_bundle(
+                CertBundleImporter.read_bundle(os.path.basename(options.file), data)
+            )
+        except CertBundleError as e:
+            print(f"❌ {e}")
+            return False
+        
+        for source, error in result['errors']:
+            print(f"⚠️  解析失败 {source}: {error}")
+        for name in result['unmatched']:
+            print(f"⚠️  未匹配到域名: {name}")
+        print(f"✅ 证书 {result['certificates']} 张（配对私钥 {result['paired']} 张），"
+              f"匹配域名 {result['matched_domains']} 个")
+    
+    return True
+
+def index_hostnames(args):
+    """重建证书域名索引"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py index-hostnames')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批处理的证书数量')
+    options = parser.parse_args(args)
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.cert_coverage import CertificateCoverage
+        
+        count = CertificateCoverage.rebuild_index(batch_size=max(options.batch_size, 1))
+        print(f"✅ 已重建 {count} 张证书的域名索引")
+    
+    return True
+
+def gc_files(args):
+    """清理不再被证书记录引用的证书/私钥文件"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py gc-files')
+    parser.add_argument('--grace-hours', type=float, help='只删除超过该时间未被使用的文件，默认使用 CERT_STORE_GC_GRACE_HOURS')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不删除文件')
+    parser.add_argument('--adopt-legacy', action='store_true', help='先把旧目录结构中的文件迁入按内容寻址的存储')
+    options = parser.parse_args(args)
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.cert_store import CertificateStore
+        
+        if options.adopt_legacy and not options.dry_run:
+            adopted = CertificateStore.adopt_legacy()
+            print(f"✅ 已迁移 {adopted} 个旧文件")
+        
+        grace_seconds = None if options.grace_hours is None else options.grace_hours * 3600
+        CertificateStore.collect_garbage(grace_seconds=grace_seconds, dry_run=options.dry_run)
+    
+    return True
+
+def refresh_whois_referrals(args):
+    """向IANA刷新全部已知后缀的WHOIS服务器缓存"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python manage_db.py refresh-whois-referrals')
+    parser.add_argument('--export', nargs='?', const='', metavar='文件', help='刷新后导出为快照文件，不指定文件时覆盖内置快照')
+    options = parser.parse_args(args)
+    
+    app = create_app(web=False)
+    with app.app_context():
+        from app.services.whois_checker import WhoisChecker
+        from app.services.whois_referrals import whois_referrals, SNAPSHOT_PATH
+        
+        whois_referrals.warm()
+        for suffix in WhoisChecker.get_suffix_list():
+            server = whois_referrals.refresh(suffix)
+            print(f"  .{suffix}: {server or '无'}")
+        
+        if options.export is not None:
+            path = options.export or SNAPSHOT_PATH
+            count = whois_referrals.export_snapshot(path)
+            print(f"✅ 已导出 {count} 个后缀到 {path}")
+    
+    return True
+
 def show_help():
     """显示帮助信息"""
     print("""
@@ -309,12 +546,23 @@ def show_help():
 用法: python manage_db.py <命令> [参数]
 
 命令:
-  create      创建数据库和所有表
+  create      创建数据库和所有表（已有数据库升级时补加新增的列和索引）
   check       检查数据库状态
   backup      备份数据库
   restore <文件>  从备份文件恢复数据库
   list        列出所有备份文件
   optimize    优化数据库
+  export <类型> [选项]  流式导出数据（类型: url_checks/domains/certificates/whois）
+              选项: --format ndjson|csv --gzip --since --until
+                    --url-id --domain-id --output <文件>
+  import-domains <文件> [选项]  从CSV或纯文本文件批量导入域名
+              选项: --no-ssl --no-whois --access
+                    --notification-config-id <ID> --no-checks
+  import-certificates <文件>  从zip压缩包或多证书PEM文件批量导入证书，按证书域名匹配已有域名
+  index-hostnames [--batch-size N]  按证书域名重建证书域名索引（用于反查覆盖主机名的证书）
+  gc-files [选项]  清理不再被证书记录引用的证书/私钥文件
+              选项: --grace-hours <小时> --dry-run --adopt-legacy
+  refresh-whois-referrals [--export [文件]]  向IANA刷新后缀的WHOIS服务器缓存，可导出为内置快照
   help        显示此帮助信息
 
 示例:
@@ -324,6 +572,12 @@ def show_help():
   python manage_db.py restore backups/database_backup_20241201_120000.db
   python manage_db.py list
   python manage_db.py optimize
+  python manage_db.py export url_checks --format csv --gzip --since 2024-01-01 -o checks.csv.gz
+  python manage_db.py import-domains domains.csv --access
+  python manage_db.py import-certificates certs.zip
+  python manage_db.py index-hostnames
+  python manage_db.py gc-files --adopt-legacy
+  python manage_db.py refresh-whois-referrals --export
 """)
 
 def main():
@@ -387,6 +641,30 @@ def main():
             print("💥 数据库优化失败！")
             sys.exit(1)
     
+    elif command == 'export':
+        success = export_data(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
+    elif command == 'import-domains':
+        success = import_domains(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
+    elif command == 'import-certificates':
+        success = import_certificates(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
+    elif command == 'index-hostnames':
+        success = index_hostnames(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
+    elif command == 'gc-files':
+        success = gc_files(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
+    elif command == 'refresh-whois-referrals':
+        success = refresh_whois_referrals(sys.argv[2:])
+        sys.exit(0 if success else 1)
+    
     elif command == 'help':
         show_help()
         sys.exit(0)
@@ -0,0 +1,45 @@
+"""
+工作进程入口：负责定时任务调度、检查任务队列和集群分片
+Web进程（run.py / gunicorn）不再执行任何定时任务，两者可以分别扩容
+用法: python worker.py
+"""
+import signal
+import threading
+from app import create_app, scheduler
+
+def main():
+    # 工作进程不处理HTTP请求，跳过蓝图与迁移命令的加载
+    app = create_app(init_scheduler=True, web=False)
+    stopping = threading.Event()
+    
+    def handle_signal(signum, frame):
+        print(f"收到信号 {signum}，工作进程准备退出")
+        stopping.set()
+    
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    
+    # 检查与调度的指标只记录在工作进程中，单独监听端口供 Prometheus 抓取
+    metrics_server = None
+    if app.config['METRICS_PORT']:
+        from app.utils.metrics import serve_metrics
+        try:
+            metrics_server = serve_metrics(app.config['METRICS_PORT'], app.config['METRICS_HOST'])
+            print(f"工作进程指标监听: http://{app.config['METRICS_HOST']}:{app.config['METRICS_PORT']}/metrics")
+        except OSError as e:
+            print(f"工作进程指标监听启动失败（METRICS_PORT={app.config['METRICS_PORT']}）: {e}")
+    
+    jobs = ', '.join(job.id for job in scheduler.get_jobs())
+    print(f"工作进程已启动，定时任务: {jobs}")
+    
+    # 主线程只负责等待退出信号，检查在调度器与后台执行器线程中进行
+    while not stopping.wait(1):
+        pass
+    
+    scheduler.shutdown(wait=False)
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    print("工作进程已退出")
+
+if __name__ == '__main__':
+    main()